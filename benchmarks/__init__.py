@@ -0,0 +1,42 @@
+"""lorebook_lite 的基准测试
+
+在插件目录下以模块方式运行，如 ``python -m benchmarks.parser_bench``。
+未安装 AstrBot 时使用 stubs 目录中的最小实现，只需安装 requirements.txt 中的依赖。
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+from types import ModuleType
+
+# 插件根目录，core 包可直接作为顶层包导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 未安装 AstrBot 时使用的替身模块
+STUBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+
+
+def setup_path(force_stubs: bool = False) -> None:
+    """将插件根目录加入导入路径，未安装 AstrBot 时加入替身模块
+
+    Args:
+        force_stubs: 是否总是使用替身模块，加载插件本身时需要，
+            避免真实的 AstrBot 注册插件与事件处理器
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if force_stubs or importlib.util.find_spec("astrbot") is None:
+        sys.path.insert(0, STUBS)
+
+
+def import_plugin() -> ModuleType:
+    """以包的形式导入插件的 main 模块
+
+    Returns:
+        main 模块
+    """
+    setup_path(force_stubs=True)
+    parent = os.path.dirname(ROOT)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{os.path.basename(ROOT)}.main")
@@ -0,0 +1,341 @@
+"""LorePlugin 端到端负载测试
+
+在真实的 asyncio 事件循环上模拟多个会话的消息事件，依次经过
+on_message → on_llm_req → on_llm_res，统计事件循环延迟、各钩子延迟与内存增长。
+
+用法::
+
+    python -m benchmarks.load_harness
+    python -m benchmarks.load_harness --sessions 200 --group-size 10 --rate 500
+    python -m benchmarks.load_harness --rate 0 --messages 20000 --llm-ratio 0.5
+    python -m benchmarks.load_harness --lorebook my_lorebook.yaml --include-ai
+    python -m benchmarks.load_harness --rate 0 --batch --batch-delay 2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+import yaml  # type: ignore
+
+from . import import_plugin
+from .measure import isolated_workdir, percentile
+from .synthetic import PRESETS, generate_lorebook, generate_messages, load_workload
+
+main_module = import_plugin()
+
+from astrbot.api.event import AstrMessageEvent  # noqa: E402
+from astrbot.api.star import Context  # noqa: E402
+from astrbot.core.config.astrbot_config import AstrBotConfig  # noqa: E402
+from astrbot.core.provider.entities import LLMResponse, ProviderRequest  # noqa: E402
+
+LorePlugin = main_module.LorePlugin
+
+# 负载测试使用的lorebook名称
+LOREBOOK_NAME = "load_harness"
+# 事件循环延迟的采样间隔（秒）
+LAG_INTERVAL = 0.01
+
+
+@dataclass(slots=True)
+class FakeConversation:
+    persona_id: str | None
+
+
+class FakeConversationManager:
+    """每个会话使用同一个人格的对话管理器"""
+
+    def __init__(self, persona_id: str | None):
+        self.persona_id = persona_id
+
+    async def get_curr_conversation_id(self, umo: str) -> str:
+        return f"{umo}:conversation"
+
+    async def get_conversation(self, umo: str, cid: str) -> FakeConversation:
+        return FakeConversation(self.persona_id)
+
+
+class FakeProviderManager:
+    """只提供人格列表的模型提供商管理器"""
+
+    def __init__(self, personas: list[dict[str, Any]]):
+        self.personas = personas
+        self.selected_default_persona = personas[0] if personas else None
+
+
+class FakeContext(Context):
+    def __init__(self, personas: list[dict[str, Any]]):
+        self.provider_manager = FakeProviderManager(personas)
+        self.conversation_manager = FakeConversationManager(None)
+
+
+class FakeEvent(AstrMessageEvent):
+    """群聊消息事件"""
+
+    def __init__(self, group: str, sender: str, message: str):
+        self.unified_msg_origin = f"bench:GroupMessage:{group}"
+        self._sender = sender
+        self._message = message
+
+    def get_sender_id(self) -> str:
+        return self._sender
+
+    def get_sender_name(self) -> str:
+        return self._sender
+
+    def get_message_str(self) -> str:
+        return self._message
+
+
+@dataclass(slots=True)
+class LoadReport:
+    """负载测试结果，时间单位为秒，内存单位为字节"""
+
+    messages: int = 0
+    llm_calls: int = 0
+    seconds: float = 0.0
+    # 各钩子每次调用的耗时
+    hooks: dict[str, list[float]] = field(default_factory=dict)
+    # 事件循环延迟采样
+    loop_lag: list[float] = field(default_factory=list)
+    # 内存时间线：(经过时间, 常驻内存, 会话数, 待注入结果数)
+    memory: list[tuple[float, int, int, int]] = field(default_factory=list)
+
+    def record(self, hook: str, seconds: float) -> None:
+        self.hooks.setdefault(hook, []).append(seconds)
+
+    def to_dict(self) -> dict[str, Any]:
+        lag = sorted(self.loop_lag)
+        return {
+            "messages": self.messages,
+            "llm_calls": self.llm_calls,
+            "seconds": self.seconds,
+            "throughput": self.messages / self.seconds if self.seconds else 0.0,
+            "hooks": {
+                hook: _latency_summary(sorted(values))
+                for hook, values in self.hooks.items()
+            },
+            "loop_lag": _latency_summary(lag),
+            "memory": self.memory,
+        }
+
+    def format(self) -> str:
+        data = self.to_dict()
+        lines = [
+            f"消息 {self.messages} 条，LLM调用 {self.llm_calls} 次，"
+            f"耗时 {self.seconds:.2f}s，{data['throughput']:.1f} 条/秒"
+        ]
+        for hook, s in data["hooks"].items():
+            lines.append(f"{hook:<12} {_format_latency(s)}")
+        lines.append(f"{'事件循环延迟':<10} {_format_latency(data['loop_lag'])}")
+        if self.memory:
+            first, last = self.memory[0], self.memory[-1]
+            lines.append(
+                f"常驻内存 {first[1] / 1048576:.1f}MiB → {last[1] / 1048576:.1f}MiB"
+                f"（+{(last[1] - first[1]) / 1048576:.1f}MiB），"
+                f"会话 {last[2]}，待注入结果 {last[3]}"
+            )
+        return "\n".join(lines)
+
+
+def _latency_summary(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+def _format_latency(s: dict[str, float]) -> str:
+    return (
+        f"{s['count']:>7} 次 p50 {s['p50'] * 1000:>8.3f}ms "
+        f"p99 {s['p99'] * 1000:>8.3f}ms max {s['max'] * 1000:>8.3f}ms"
+    )
+
+
+def _rss_bytes() -> int:
+    """当前进程的常驻内存，无法读取 /proc 时使用历史峰值"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # Linux 以KiB为单位，macOS 以字节为单位
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def _monitor(
+    plugin: LorePlugin, report: LoadReport, start: float, sample_every: float
+) -> None:
+    """采样事件循环延迟与内存"""
+    loop = asyncio.get_running_loop()
+    next_sample = start
+    while True:
+        before = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        report.loop_lag.append(max(0.0, loop.time() - before - LAG_INTERVAL))
+        now = time.perf_counter()
+        if now >= next_sample:
+            pending = sum(len(results) for results in plugin.res_map.values())
+            report.memory.append(
+                (now - start, _rss_bytes(), len(plugin.lore_sessions), pending)
+            )
+            next_sample = now + sample_every
+
+
+async def _timed(report: LoadReport, hook: str, coro) -> None:
+    start = time.perf_counter()
+    await coro
+    report.record(hook, time.perf_counter() - start)
+
+
+async def _conversation(
+    plugin: LorePlugin,
+    report: LoadReport,
+    event: FakeEvent,
+    llm: bool,
+    llm_latency: float,
+) -> None:
+    """处理一条消息，需要时模拟一次LLM调用"""
+    await _timed(report, "on_message", plugin.on_message(event))
+    report.messages += 1
+    if not llm:
+        return
+    request = ProviderRequest(prompt=event.get_message_str())
+    await _timed(report, "on_llm_req", plugin.on_llm_req(event, request))
+    if llm_latency:
+        await asyncio.sleep(llm_latency)
+    response = LLMResponse(completion_text=f"收到: {request.prompt[-64:]}")
+    await _timed(report, "on_llm_res", plugin.on_llm_res(event, response))
+    report.llm_calls += 1
+
+
+async def run_load(args: argparse.Namespace, messages: list[str]) -> LoadReport:
+    """按参数运行负载测试
+
+    Args:
+        args: 命令行参数
+        messages: 消息语料，按顺序循环使用
+
+    Returns:
+        测试结果
+    """
+    personas = [{"name": "bench", "prompt": "你是一个测试用的人格。"}]
+    config = AstrBotConfig(
+        lorebook_name=LOREBOOK_NAME,
+        scan_depth=args.scan_depth,
+        include_ai=args.include_ai,
+        random_seed="load_harness",
+        metrics_sample_every=args.metrics_sample_every,
+        trace_file=args.trace or "",
+        batch_matching=args.batch,
+        batch_delay=args.batch_delay,
+    )
+    plugin = LorePlugin(FakeContext(personas), config)
+    await plugin.initialize()
+
+    rng = random.Random(0)
+    report = LoadReport()
+    start = time.perf_counter()
+    monitor = asyncio.create_task(_monitor(plugin, report, start, args.sample_every))
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(args.concurrency)
+    tasks: set[asyncio.Task] = set()
+
+    async def limited(coro) -> None:
+        async with limit:
+            await coro
+
+    tick = loop.time()
+    for i in range(args.messages):
+        group = rng.randrange(args.sessions)
+        sender = f"{group}_{rng.randrange(args.group_size)}"
+        event = FakeEvent(str(group), sender, messages[i % len(messages)])
+        coro = _conversation(
+            plugin, report, event, rng.random() < args.llm_ratio, args.llm_latency
+        )
+        task = asyncio.create_task(limited(coro))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if args.rate:
+            tick += 1 / args.rate
+            await asyncio.sleep(max(0.0, tick - loop.time()))
+        elif len(tasks) >= args.concurrency:
+            await asyncio.sleep(0)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    report.seconds = time.perf_counter() - start
+    monitor.cancel()
+    pending = sum(len(results) for results in plugin.res_map.values())
+    report.memory.append(
+        (report.seconds, _rss_bytes(), len(plugin.lore_sessions), pending)
+    )
+    await plugin.terminate()
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="LorePlugin 端到端负载测试")
+    parser.add_argument("--preset", choices=list(PRESETS), default="medium")
+    parser.add_argument("--lorebook", help="使用指定的lorebook文件代替合成lorebook")
+    parser.add_argument("--save-share", type=float, default=0.05, help="存档触发器比例")
+    parser.add_argument("--sessions", type=int, default=50, help="群聊（会话）数量")
+    parser.add_argument("--group-size", type=int, default=5, help="每个群的发言人数")
+    parser.add_argument("--messages", type=int, default=5000, help="消息总数")
+    parser.add_argument("--rate", type=float, default=500, help="每秒消息数，0为不限速")
+    parser.add_argument("--concurrency", type=int, default=256, help="最大并发事件数")
+    parser.add_argument("--llm-ratio", type=float, default=0.3, help="触发LLM调用的比例")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="模拟LLM耗时（秒）")
+    parser.add_argument("--hit-rate", type=float, default=0.3, help="命中消息比例")
+    parser.add_argument("--scan-depth", type=int, default=1)
+    parser.add_argument("--include-ai", action="store_true", help="扫描AI回复")
+    parser.add_argument("--metrics-sample-every", type=int, default=10)
+    parser.add_argument("--sample-every", type=float, default=1.0, help="内存采样间隔")
+    parser.add_argument("--batch", action="store_true", help="启用跨会话批量匹配")
+    parser.add_argument(
+        "--batch-delay", type=float, default=0, help="批量匹配的收集时间（毫秒）"
+    )
+    parser.add_argument("--trace", help="记录消息轨迹，可用 benchmarks.replay 回放")
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    args = parser.parse_args(argv)
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.lorebook:
+        workload = load_workload(args.lorebook)
+    else:
+        spec = replace(PRESETS[args.preset], save_share=args.save_share)
+        workload = generate_lorebook(spec, args.preset)
+    messages = generate_messages(workload, min(args.messages, 10000), args.hit_rate)
+
+    with isolated_workdir() as workdir:
+        # 插件从工作目录下的 data/lorebooks 读取lorebook
+        lorebook_dir = os.path.join(workdir, "data", "lorebooks")
+        os.makedirs(lorebook_dir)
+        lorebook_path = os.path.join(lorebook_dir, f"{LOREBOOK_NAME}.yaml")
+        with open(lorebook_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(workload.data, f, allow_unicode=True)
+        report = asyncio.run(run_load(args, messages))
+
+    print(report.format())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""计时与内存测量"""
+
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import asdict, dataclass
+from typing import Any
+
+
+@dataclass(slots=True)
+class BenchResult:
+    """一项基准测试的结果，时间单位为秒，内存单位为字节"""
+
+    name: str
+    operations: int
+    seconds: float
+    p50: float
+    p99: float
+    peak_memory: int
+
+    @property
+    def throughput(self) -> float:
+        """每秒操作数"""
+        return self.operations / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["throughput"] = self.throughput
+        return data
+
+    def format(self) -> str:
+        return (
+            f"{self.name:<36} {self.operations:>7} 次 "
+            f"{self.throughput:>11.1f} 次/秒 "
+            f"p50 {self.p50 * 1e6:>9.1f}us p99 {self.p99 * 1e6:>9.1f}us "
+            f"峰值内存 {self.peak_memory / 1024:>9.1f}KiB"
+        )
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """计算已排序数据的分位数（最近秩法）
+
+    Args:
+        values: 升序排列的数据
+        q: 分位，0到1之间
+
+    Returns:
+        分位数，数据为空时为0
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+    return values[index]
+
+
+def measure(
+    name: str,
+    setup: Callable[[], Callable[[Any], Any]],
+    items: Sequence[Any],
+    warmup: int = 100,
+) -> BenchResult:
+    """测量操作的吞吐量、延迟分位数与峰值内存
+
+    计时与内存分别在两次独立的运行中测量，避免 tracemalloc 影响计时。
+
+    Args:
+        name: 测试名称
+        setup: 创建初始状态并返回单次操作的函数，每次运行调用一次
+        items: 每次操作的输入
+        warmup: 预热的操作次数，用于填充编译缓存
+
+    Returns:
+        测试结果
+    """
+    operation = setup()
+    for item in items[:warmup]:
+        operation(item)
+
+    operation = setup()
+    latencies = []
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for item in items:
+        op_start = perf_counter()
+        operation(item)
+        latencies.append(perf_counter() - op_start)
+    seconds = perf_counter() - start
+    latencies.sort()
+
+    tracemalloc.start()
+    try:
+        operation = setup()
+        for item in items:
+            operation(item)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return BenchResult(
+        name,
+        len(items),
+        seconds,
+        percentile(latencies, 0.5),
+        percentile(latencies, 0.99),
+        peak,
+    )
+
+
+@contextlib.contextmanager
+def isolated_workdir() -> Iterator[str]:
+    """在临时目录中运行，避免存档文件写入插件目录"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="lorebook_bench_") as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
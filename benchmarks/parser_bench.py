@@ -0,0 +1,158 @@
+"""LoreParser 基准测试
+
+用法::
+
+    python -m benchmarks.parser_bench                    # 预设规模与示例lorebook
+    python -m benchmarks.parser_bench --preset large --messages 5000
+    python -m benchmarks.parser_bench --triggers 500 --keywords 10 --regex-share 0.3
+    python -m benchmarks.parser_bench --corpus messages.txt --json result.json
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import Any
+
+from . import setup_path
+from .measure import BenchResult, isolated_workdir, measure
+from .synthetic import (
+    PRESETS,
+    LorebookSpec,
+    Workload,
+    generate_lorebook,
+    generate_messages,
+    load_corpus,
+    load_examples,
+)
+
+setup_path()
+
+from core.clock import FrozenClock  # noqa: E402
+from core.lorebook import Lorebook  # noqa: E402
+from core.parser import LoreParser  # noqa: E402
+
+# 固定的会话时间，保证结果可复现
+BENCH_TIME = datetime(2024, 1, 1, 12, 0)
+
+
+def make_parser(lorebook: Lorebook, scan_depth: int = 1) -> LoreParser:
+    """创建结果可复现的解析器"""
+    parser = LoreParser(
+        lorebook, scan_depth, seed=0, clock=FrozenClock(BENCH_TIME)
+    )
+    parser.sender = "bench_user"
+    parser.sender_name = "bench_user"
+    parser.session = "bench"
+    return parser
+
+
+def bench_workload(
+    workload: Workload, messages: list[str], scan_depth: int = 1
+) -> list[BenchResult]:
+    """对一份lorebook运行 process_chat 与 parse_placeholder 测试
+
+    Args:
+        workload: 工作负载
+        messages: 消息语料
+        scan_depth: 扫描深度
+
+    Returns:
+        测试结果列表
+    """
+    start = time.perf_counter()
+    lorebook = Lorebook(workload.data)
+    compile_seconds = time.perf_counter() - start
+    print(f"{workload.name}: 编译 {compile_seconds * 1000:.2f}ms", file=sys.stderr)
+
+    def chat_setup():
+        parser = make_parser(lorebook, scan_depth)
+
+        def operation(message: str) -> None:
+            parser.add_message(message)
+            parser.process_chat()
+            # 每条消息都得到LLM回复时的计数重置
+            parser.reset_trigger_count()
+
+        return operation
+
+    def render_setup():
+        return make_parser(lorebook, scan_depth).parse_placeholder
+
+    contents = [trigger.content for trigger in lorebook.triggers + lorebook.notes]
+    templates = [contents[i % len(contents)] for i in range(len(messages))]
+
+    results = [measure(f"{workload.name}/process_chat", chat_setup, messages)]
+    if contents:
+        results.append(
+            measure(f"{workload.name}/parse_placeholder", render_setup, templates)
+        )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="LoreParser 基准测试")
+    parser.add_argument(
+        "--preset",
+        choices=[*PRESETS, "all", "none"],
+        default="all",
+        help="合成lorebook的预设规模",
+    )
+    parser.add_argument("--triggers", type=int, help="自定义：触发器数量")
+    parser.add_argument("--keywords", type=int, default=5, help="每个触发器的关键词数")
+    parser.add_argument("--regex-share", type=float, default=0.1, help="正则触发器比例")
+    parser.add_argument("--depth", type=int, default=2, help="模板嵌套深度")
+    parser.add_argument("--variables", type=int, default=20, help="世界变量数量")
+    parser.add_argument("--no-examples", action="store_true", help="不测试示例lorebook")
+    parser.add_argument("--messages", type=int, default=500, help="合成消息数量")
+    parser.add_argument("--hit-rate", type=float, default=0.3, help="命中消息比例")
+    parser.add_argument("--corpus", help="录制的消息语料，每行一条")
+    parser.add_argument("--scan-depth", type=int, default=1, help="扫描深度")
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    workloads: list[Workload] = []
+    if args.triggers is not None:
+        spec = LorebookSpec(
+            triggers=args.triggers,
+            keywords=args.keywords,
+            regex_share=args.regex_share,
+            depth=args.depth,
+            variables=args.variables,
+        )
+        workloads.append(generate_lorebook(spec, "custom"))
+    elif args.preset != "none":
+        names = PRESETS if args.preset == "all" else [args.preset]
+        workloads.extend(
+            generate_lorebook(PRESETS[name], name) for name in names
+        )
+    if not args.no_examples:
+        workloads.extend(load_examples())
+
+    corpus = load_corpus(args.corpus) if args.corpus else None
+    results: list[BenchResult] = []
+    with isolated_workdir():
+        for workload in workloads:
+            messages = corpus or generate_messages(
+                workload, args.messages, args.hit_rate
+            )
+            for result in bench_workload(workload, messages, args.scan_depth):
+                print(result.format())
+                results.append(result)
+
+    if args.json:
+        data: dict[str, Any] = {
+            "argv": sys.argv[1:] if argv is None else argv,
+            "results": [result.to_dict() for result in results],
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""性能回归检查
+
+基准结果按提交与工作负载保存在JSON文件中，新结果与基线比较，
+吞吐量或峰值内存超出阈值时以非零状态退出，可用于CI。
+
+用法::
+
+    python -m benchmarks.regression run                    # 运行并保存到当前提交
+    python -m benchmarks.regression check                  # 运行、保存并与上一次保存的提交比较
+    python -m benchmarks.regression check --baseline abc1234 --threshold 0.05
+    python -m benchmarks.regression compare abc1234 def5678
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from . import ROOT
+from .measure import isolated_workdir, measure
+from .parser_bench import make_parser
+from .synthetic import PRESETS, generate_lorebook, generate_messages
+
+from core.lorebook import Lorebook  # noqa: E402  (parser_bench 已设置导入路径)
+
+# 默认的结果文件
+DEFAULT_STORE = os.path.join(ROOT, "benchmarks", "results.json")
+
+
+@dataclass(slots=True)
+class WorkloadResult:
+    """一个工作负载多次运行的结果"""
+
+    throughput: list[float]  # 每次运行的吞吐量（次/秒）
+    peak_memory: int  # 各次运行中最小的峰值内存（字节）
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.throughput)
+
+
+def _construct_workload() -> tuple[Callable[[], Callable[[Any], Any]], list]:
+    lorebook = Lorebook(generate_lorebook(PRESETS["medium"], "medium").data)
+
+    def setup():
+        return lambda _: make_parser(lorebook)
+
+    return setup, list(range(200))
+
+
+def _chat_workload(preset: str, count: int):
+    def factory():
+        workload = generate_lorebook(PRESETS[preset], preset)
+        lorebook = Lorebook(workload.data)
+        messages = generate_messages(workload, count)
+
+        def setup():
+            parser = make_parser(lorebook)
+
+            def operation(message: str) -> None:
+                parser.add_message(message)
+                parser.process_chat()
+                parser.reset_trigger_count()
+
+            return operation
+
+        return setup, messages
+
+    return factory
+
+
+def _save_load_workload():
+    lorebook = Lorebook(generate_lorebook(PRESETS["medium"], "medium").data)
+    template = "{buildin::save(world)} {buildin::load(world)}"
+
+    def setup():
+        parser = make_parser(lorebook)
+        return lambda _: parser.parse_placeholder(template)
+
+    return setup, list(range(200))
+
+
+# 工作负载名称及其构造函数，构造函数返回(setup, 输入列表)
+WORKLOADS: dict[str, Callable[[], tuple[Callable, list]]] = {
+    "construct": _construct_workload,
+    "process_chat:small": _chat_workload("small", 500),
+    "process_chat:medium": _chat_workload("medium", 100),
+    "save_load": _save_load_workload,
+}
+
+
+def run_workloads(names: list[str], repeat: int) -> dict[str, WorkloadResult]:
+    """运行工作负载
+
+    Args:
+        names: 工作负载名称
+        repeat: 每个工作负载的运行次数
+
+    Returns:
+        各工作负载的结果
+    """
+    results = {}
+    with isolated_workdir():
+        for name in names:
+            setup, items = WORKLOADS[name]()
+            runs = [measure(name, setup, items, warmup=20) for _ in range(repeat)]
+            results[name] = WorkloadResult(
+                [run.throughput for run in runs],
+                min(run.peak_memory for run in runs),
+            )
+            print(
+                f"{name:<24} 中位数 {results[name].median:>11.1f} 次/秒 "
+                f"峰值内存 {results[name].peak_memory / 1024:>9.1f}KiB",
+                file=sys.stderr,
+            )
+    return results
+
+
+def current_commit() -> str:
+    """当前提交的短哈希，工作区有未提交的修改时加上 -dirty 后缀"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def load_store(path: str) -> dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(path: str, commit: str, results: dict[str, WorkloadResult]) -> None:
+    """以提交为键保存结果，同一提交的同名工作负载会被覆盖"""
+    store = load_store(path)
+    entry = store.setdefault(commit, {"timestamp": 0, "workloads": {}})
+    entry["timestamp"] = time.time()
+    for name, result in results.items():
+        entry["workloads"][name] = {
+            "throughput": result.throughput,
+            "peak_memory": result.peak_memory,
+        }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False, indent=2)
+
+
+def stored_results(store: dict[str, Any], commit: str) -> dict[str, WorkloadResult]:
+    if commit not in store:
+        raise SystemExit(f"结果文件中没有提交 {commit}")
+    return {
+        name: WorkloadResult(data["throughput"], data["peak_memory"])
+        for name, data in store[commit]["workloads"].items()
+    }
+
+
+def latest_commit(store: dict[str, Any], exclude: str) -> str | None:
+    """最近保存的、不同于 exclude 的提交"""
+    commits = sorted(
+        (commit for commit in store if commit != exclude),
+        key=lambda commit: store[commit]["timestamp"],
+    )
+    return commits[-1] if commits else None
+
+
+def mann_whitney_p(slower: list[float], faster: list[float]) -> float:
+    """单侧 Mann-Whitney U 检验，正态近似
+
+    Args:
+        slower: 假设较小的样本
+        faster: 假设较大的样本
+
+    Returns:
+        slower 并不小于 faster 的概率，越小越能确定 slower 确实较小
+    """
+    n1, n2 = len(slower), len(faster)
+    if not n1 or not n2:
+        return 1.0
+    u = sum(
+        1.0 if a < b else 0.5 if a == b else 0.0 for a in slower for b in faster
+    )
+    mean = n1 * n2 / 2
+    sigma = math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12)
+    if sigma == 0:
+        return 1.0
+    # 连续性校正
+    z = (u - mean - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@dataclass(slots=True)
+class Comparison:
+    name: str
+    change: float  # 吞吐量中位数的相对变化，负数表示变慢
+    p_value: float
+    memory_change: float  # 峰值内存的相对变化，正数表示增加
+    regressed: bool
+
+    def format(self) -> str:
+        mark = "回归" if self.regressed else "正常"
+        return (
+            f"[{mark}] {self.name:<24} 吞吐量 {self.change:+7.1%} (p={self.p_value:.3f}) "
+            f"峰值内存 {self.memory_change:+7.1%}"
+        )
+
+
+def compare(
+    baseline: dict[str, WorkloadResult],
+    current: dict[str, WorkloadResult],
+    threshold: float,
+    memory_threshold: float,
+    alpha: float,
+) -> list[Comparison]:
+    """比较两组结果
+
+    吞吐量中位数下降超过 threshold，且显著性检验的 p 值小于 alpha 时视为回归，
+    避免把噪声判为回归；峰值内存增长超过 memory_threshold 时视为回归。
+
+    Args:
+        baseline: 基线结果
+        current: 新结果
+        threshold: 吞吐量允许的相对下降
+        memory_threshold: 峰值内存允许的相对增长
+        alpha: 显著性水平
+
+    Returns:
+        两组结果中共有的工作负载的比较结果
+    """
+    comparisons = []
+    for name in current:
+        if name not in baseline:
+            continue
+        base, new = baseline[name], current[name]
+        change = new.median / base.median - 1 if base.median else 0.0
+        p_value = mann_whitney_p(new.throughput, base.throughput)
+        memory_change = (
+            new.peak_memory / base.peak_memory - 1 if base.peak_memory else 0.0
+        )
+        regressed = (change < -threshold and p_value < alpha) or (
+            memory_change > memory_threshold
+        )
+        comparisons.append(
+            Comparison(name, change, p_value, memory_change, regressed)
+        )
+    return comparisons
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="性能回归检查")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="结果文件")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--repeat", type=int, default=5, help="每个工作负载的运行次数")
+        p.add_argument(
+            "--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS)
+        )
+        p.add_argument("--commit", help="保存结果使用的键，默认为当前提交")
+
+    def add_compare_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--threshold", type=float, default=0.1, help="吞吐量允许的下降比例")
+        p.add_argument(
+            "--memory-threshold", type=float, default=0.2, help="峰值内存允许的增长比例"
+        )
+        p.add_argument("--alpha", type=float, default=0.05, help="显著性水平")
+
+    add_run_args(sub.add_parser("run", help="运行并保存结果"))
+    check = sub.add_parser("check", help="运行、保存并与基线比较")
+    add_run_args(check)
+    add_compare_args(check)
+    check.add_argument("--baseline", help="基线提交，默认为最近保存的其他提交")
+    compare_parser = sub.add_parser("compare", help="比较两个已保存的提交")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    add_compare_args(compare_parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    store = load_store(args.store)
+
+    if args.command == "compare":
+        baseline = stored_results(store, args.baseline)
+        current = stored_results(store, args.current)
+    else:
+        commit = args.commit or current_commit()
+        current = run_workloads(args.workloads, args.repeat)
+        save_results(args.store, commit, current)
+        print(f"结果已保存到 {args.store} ({commit})")
+        if args.command == "run":
+            return 0
+        baseline_commit = args.baseline or latest_commit(store, commit)
+        if baseline_commit is None:
+            print("没有可比较的基线")
+            return 0
+        print(f"基线: {baseline_commit}")
+        baseline = stored_results(store, baseline_commit)
+
+    comparisons = compare(
+        baseline, current, args.threshold, args.memory_threshold, args.alpha
+    )
+    for comparison in comparisons:
+        print(comparison.format())
+    return 1 if any(comparison.regressed for comparison in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""回放消息轨迹
+
+将插件配置 trace_file 记录的轨迹逐条送入新建的解析器，统计 process_chat 的延迟分布，
+并按耗时列出开销最大的触发器。结果可导出后与另一版本的输出比较，检查行为是否一致。
+
+用法::
+
+    python -m benchmarks.replay trace.jsonl.gz --lorebook data/lorebooks/my.yaml
+    python -m benchmarks.replay trace.jsonl.gz --lorebook my.yaml --realtime --speed 10
+    python -m benchmarks.replay trace.jsonl.gz --lorebook my.yaml --output new.jsonl
+    python -m benchmarks.replay trace.jsonl.gz --lorebook my.yaml --diff old.jsonl
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+
+import yaml  # type: ignore
+
+from . import setup_path
+from .measure import isolated_workdir, percentile
+
+setup_path()
+
+from core.clock import FrozenClock  # noqa: E402
+from core.lorebook import Lorebook  # noqa: E402
+from core.metrics import TriggerMetrics  # noqa: E402
+from core.parser import LoreParser, derive_seed  # noqa: E402
+from core.recorder import read_trace  # noqa: E402
+
+# 回放时派生会话随机数种子使用的主种子
+REPLAY_SEED = "replay"
+# 差异报告中最多列出的消息数
+MAX_DIFFS = 10
+
+
+def replay(
+    events: list[dict],
+    lorebook: Lorebook,
+    scan_depth: int = 1,
+    include_ai: bool = False,
+    realtime: bool = False,
+    speed: float = 1.0,
+) -> tuple[list[float], list[dict], TriggerMetrics]:
+    """回放轨迹
+
+    每个会话使用新建的解析器，随机数种子由会话哈希派生，时钟固定为事件的记录时间，
+    同一轨迹与同一版本的引擎总能得到相同的输出。
+
+    Args:
+        events: 轨迹事件
+        lorebook: 编译后的lorebook
+        scan_depth: 扫描深度
+        include_ai: 是否将LLM回复加入消息历史
+        realtime: 是否按记录的时间间隔回放
+        speed: 实时回放的倍速
+
+    Returns:
+        (每条消息的 process_chat 耗时, 每条消息的处理结果, 触发器统计)
+    """
+    metrics = TriggerMetrics(1)
+    sessions: dict[str, tuple[LoreParser, FrozenClock]] = {}
+    latencies: list[float] = []
+    outputs: list[dict] = []
+    origin = events[0]["t"] if events else 0.0
+    started = time.perf_counter()
+
+    for event in events:
+        if realtime:
+            delay = (event["t"] - origin) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        at = datetime.fromtimestamp(event["t"])
+        session = event["session"]
+        if session not in sessions:
+            clock = FrozenClock(at)
+            parser = LoreParser(
+                lorebook,
+                scan_depth,
+                seed=derive_seed(REPLAY_SEED, session),
+                clock=clock,
+                metrics=metrics,
+            )
+            parser.session = session
+            sessions[session] = (parser, clock)
+        parser, clock = sessions[session]
+        clock.set(at)
+
+        match event["type"]:
+            case "message":
+                parser.sender = parser.sender_name = event["sender"]
+                parser.add_message(event["text"])
+                start = time.perf_counter()
+                result = parser.process_chat()
+                latencies.append(time.perf_counter() - start)
+                outputs.append({"session": session, **asdict(result)})
+            case "llm_res":
+                if include_ai:
+                    parser.add_message(event["text"])
+                parser.reset_trigger_count()
+
+    return latencies, outputs, metrics
+
+
+def diff_outputs(baseline: list[dict], current: list[dict]) -> list[str]:
+    """比较两次回放的输出
+
+    Returns:
+        差异描述，最多 MAX_DIFFS 条
+    """
+    diffs = []
+    if len(baseline) != len(current):
+        diffs.append(f"消息数不同: {len(baseline)} != {len(current)}")
+    for index, (old, new) in enumerate(zip(baseline, current)):
+        if old != new:
+            changed = [key for key in new if old.get(key) != new[key]]
+            diffs.append(f"第{index}条消息 ({new['session']}): {', '.join(changed)}")
+            if len(diffs) >= MAX_DIFFS:
+                break
+    return diffs
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="回放消息轨迹")
+    parser.add_argument("trace", help="轨迹文件")
+    parser.add_argument("--lorebook", required=True, help="lorebook文件")
+    parser.add_argument("--scan-depth", type=int, default=1)
+    parser.add_argument("--include-ai", action="store_true", help="扫描LLM回复")
+    parser.add_argument("--realtime", action="store_true", help="按记录的时间间隔回放")
+    parser.add_argument("--speed", type=float, default=1.0, help="实时回放的倍速")
+    parser.add_argument("--top", type=int, default=10, help="列出的触发器数量")
+    parser.add_argument("--output", help="将每条消息的处理结果写入文件")
+    parser.add_argument("--diff", help="与之前导出的处理结果比较，不一致时以状态码1退出")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with open(args.lorebook, "r", encoding="utf-8") as f:
+        lorebook = Lorebook(yaml.safe_load(f) or {})
+    events = list(read_trace(args.trace))
+
+    # 在临时目录中回放，存档操作不会覆盖真实的存档
+    with isolated_workdir():
+        start = time.perf_counter()
+        latencies, outputs, metrics = replay(
+            events,
+            lorebook,
+            args.scan_depth,
+            args.include_ai,
+            args.realtime,
+            args.speed,
+        )
+        seconds = time.perf_counter() - start
+
+    latencies.sort()
+    busy = sum(latencies)
+    print(
+        f"事件 {len(events)} 个，消息 {len(latencies)} 条，会话 "
+        f"{len({event['session'] for event in events})} 个，耗时 {seconds:.2f}s"
+    )
+    if latencies:
+        print(
+            f"process_chat: {len(latencies) / busy if busy else 0:.1f} 条/秒 "
+            f"p50 {percentile(latencies, 0.5) * 1e6:.1f}us "
+            f"p99 {percentile(latencies, 0.99) * 1e6:.1f}us "
+            f"max {latencies[-1] * 1e6:.1f}us"
+        )
+    print(metrics.summary(args.top))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for output in outputs:
+                f.write(json.dumps(output, ensure_ascii=False) + "\n")
+
+    if args.diff:
+        with open(args.diff, "r", encoding="utf-8") as f:
+            baseline = [json.loads(line) for line in f if line.strip()]
+        diffs = diff_outputs(baseline, outputs)
+        if diffs:
+            print("输出不一致:")
+            for diff in diffs:
+                print(f"- {diff}")
+            return 1
+        print("输出一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""astrbot.api 的最小替身，仅供基准测试使用"""
+
+import logging
+
+logger = logging.getLogger("astrbot")
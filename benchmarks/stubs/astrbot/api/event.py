@@ -0,0 +1,49 @@
+"""astrbot.api.event 的最小替身，装饰器只返回原函数"""
+
+import enum
+
+
+class AstrMessageEvent:
+    """消息事件基类"""
+
+    def plain_result(self, text: str) -> str:
+        return text
+
+
+class _CommandGroup:
+    def __init__(self, function):
+        self.function = function
+
+    def command(self, name: str, *args, **kwargs):
+        return _identity
+
+
+def _identity(function):
+    return function
+
+
+class _Filter:
+    class PermissionType(enum.Enum):
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    def command(self, name: str, *args, **kwargs):
+        return _identity
+
+    def command_group(self, name: str, *args, **kwargs):
+        return _CommandGroup
+
+    def permission_type(self, permission, *args, **kwargs):
+        return _identity
+
+    def event_message_type(self, message_type, *args, **kwargs):
+        return _identity
+
+    def on_llm_request(self, *args, **kwargs):
+        return _identity
+
+    def on_llm_response(self, *args, **kwargs):
+        return _identity
+
+
+filter = _Filter()
@@ -0,0 +1,17 @@
+"""astrbot.api.star 的最小替身"""
+
+
+class Context:
+    """插件上下文"""
+
+
+class Star:
+    def __init__(self, context: Context):
+        self.context = context
+
+
+def register(*args, **kwargs):
+    def decorator(cls):
+        return cls
+
+    return decorator
@@ -0,0 +1,2 @@
+class AstrBotConfig(dict):
+    """插件配置，行为与字典相同"""
@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ProviderRequest:
+    prompt: str = ""
+
+
+@dataclass
+class LLMResponse:
+    completion_text: str = ""
@@ -0,0 +1,5 @@
+import enum
+
+
+class EventMessageType(enum.Enum):
+    ALL = "all"
@@ -0,0 +1,181 @@
+"""合成lorebook与消息语料生成器"""
+
+import glob
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Any
+
+import yaml  # type: ignore
+
+from . import ROOT
+
+# 合成关键词使用的字符，包含中文以覆盖多字节匹配
+_SYLLABLES = (
+    "al be co da el fi go ha in jo ka lu mo ne or pa qu ri su ta "
+    "风 火 水 土 剑 盾 龙 城 星 月 林 海"
+).split()
+
+
+@dataclass(slots=True)
+class LorebookSpec:
+    """合成lorebook的参数"""
+
+    triggers: int = 100  # 触发器数量
+    keywords: int = 5  # 每个关键词触发器的关键词数
+    regex_share: float = 0.1  # 正则触发器所占比例
+    depth: int = 2  # 内容模板的占位符嵌套深度
+    variables: int = 20  # 世界变量数量
+    conditional_share: float = 0.2  # 带触发条件的触发器比例
+    listener_share: float = 0.05  # 监听器触发器比例
+    save_share: float = 0.0  # 触发时保存世界状态的触发器比例
+    seed: int = 0
+
+
+@dataclass(slots=True)
+class Workload:
+    """一份lorebook及能够命中其触发器的短语"""
+
+    name: str
+    data: dict[str, Any]
+    # 能够命中触发器的短语，用于生成消息语料
+    phrases: list[str] = field(default_factory=list)
+
+
+# 预设的合成规模
+PRESETS: dict[str, LorebookSpec] = {
+    "small": LorebookSpec(triggers=20, keywords=3, variables=5),
+    "medium": LorebookSpec(triggers=200, keywords=5, variables=50),
+    "large": LorebookSpec(triggers=1000, keywords=8, depth=3, variables=200),
+}
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(3))
+
+
+def _nested(depth: int, var: str) -> str:
+    """生成嵌套深度为 depth 的模板"""
+    text = f"{{var::get(world.{var})}}"
+    for level in range(depth - 1):
+        text = f"{{var::add({text},{level + 1})}}"
+    return text
+
+
+def generate_lorebook(spec: LorebookSpec, name: str = "synthetic") -> Workload:
+    """按参数生成合成lorebook
+
+    Args:
+        spec: 生成参数
+        name: 工作负载名称
+
+    Returns:
+        合成的工作负载
+    """
+    rng = random.Random(spec.seed)
+    variables = [f"v{i}" for i in range(max(1, spec.variables))]
+    world_state = {var: str(rng.randint(0, 100)) for var in variables}
+    triggers = []
+    phrases = []
+    for i in range(spec.triggers):
+        var = rng.choice(variables)
+        trigger: dict[str, Any] = {
+            "name": f"t{i}",
+            "priority": rng.randint(0, 10),
+            "probability": 1.0,
+            "position": rng.choice(["sys_start", "sys_end", "user_start", "user_end"]),
+            "content": f"条目{i}: {_nested(spec.depth, var)} "
+            f"{{var::inc(world.{rng.choice(variables)})}}",
+        }
+        roll = rng.random()
+        if roll < spec.listener_share:
+            trigger["type"] = "listener"
+            trigger["max_trig"] = 1
+        elif roll < spec.listener_share + spec.regex_share:
+            word = _word(rng)
+            trigger["type"] = "regex"
+            trigger["match"] = f"{word}\\s*\\d+"
+            phrases.append(f"{word} {rng.randint(0, 99)}")
+        else:
+            words = [_word(rng) for _ in range(max(1, spec.keywords))]
+            trigger["type"] = "keywords"
+            trigger["match"] = ",".join(words)
+            phrases.extend(words)
+        if spec.save_share and rng.random() < spec.save_share:
+            trigger["content"] += " {buildin::save(world)}"
+        if rng.random() < spec.conditional_share:
+            trigger["conditional"] = f"{{var::get(world.{var})}} >= 0"
+        triggers.append(trigger)
+    return Workload(name, {"world_state": world_state, "trigger": triggers}, phrases)
+
+
+def load_workload(path: str) -> Workload:
+    """读取lorebook文件作为工作负载
+
+    Args:
+        path: lorebook文件路径
+
+    Returns:
+        工作负载，命中短语取自关键词触发器的关键词
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    phrases = [
+        word.strip()
+        for trigger in data.get("trigger", [])
+        if trigger.get("type", "keywords") == "keywords" and trigger.get("match")
+        for word in str(trigger["match"]).split(",")
+        if word.strip()
+    ]
+    return Workload(os.path.splitext(os.path.basename(path))[0], data, phrases)
+
+
+def load_examples() -> list[Workload]:
+    """读取 examples 目录中的lorebook作为固定基准
+
+    Returns:
+        工作负载列表
+    """
+    workloads = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.yaml"))):
+        workload = load_workload(path)
+        workload.name = f"example:{workload.name}"
+        workloads.append(workload)
+    return workloads
+
+
+def generate_messages(
+    workload: Workload, count: int, hit_rate: float = 0.3, seed: int = 0
+) -> list[str]:
+    """生成消息语料
+
+    Args:
+        workload: 工作负载
+        count: 消息数量
+        hit_rate: 含有命中短语的消息比例
+        seed: 随机数种子
+
+    Returns:
+        消息列表
+    """
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = [_word(rng) for _ in range(rng.randint(3, 12))]
+        if workload.phrases and rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(workload.phrases))
+        messages.append(" ".join(words))
+    return messages
+
+
+def load_corpus(path: str) -> list[str]:
+    """读取录制的消息语料，每行一条消息
+
+    Args:
+        path: 语料文件路径
+
+    Returns:
+        规范化空白后的非空消息列表
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [" ".join(line.split()) for line in f if line.strip()]
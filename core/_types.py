@@ -1,5 +1,13 @@
 import uuid
 from dataclasses import dataclass, field
+from typing import Any
+
+from .condition import Condition, compile_cond, condition_reads  # type: ignore
+from .normalize import MATCH_FORMS  # type: ignore
+from .template import Template, compile_template  # type: ignore
+
+# 回复触发器的插入位置，位于这些位置的触发器匹配LLM回复而不是用户消息
+RESPONSE_POSITIONS = ("res_start", "res_end")
 
 
 @dataclass(slots=True)
@@ -18,16 +26,43 @@ class Trigger:
     probability: float = 1.0
     actions: list[str] = field(default_factory=list)
     max_trig: int = -1  # -1 表示无限制
+    match_on: str = "text"  # 匹配的消息形式，见 normalize.MATCH_FORMS
+    # 编译后的触发条件，由conditional生成
+    cond: Condition | None = field(default=None, init=False, repr=False)
+    # 条件在编译期确定的变量读取集合，为None时条件不可缓存
+    cond_reads: frozenset[str] | None = field(default=None, init=False, repr=False)
+    # 编译后的内容与动作模板
+    template: Template = field(init=False, repr=False)
+    action_templates: tuple[Template, ...] = field(init=False, repr=False)
+    # 在lorebook中按优先级排序后的下标，作者注释为-1
+    order: int = field(default=-1, init=False, repr=False)
 
     def __post_init__(self):
         self.probability = max(0, min(self.probability, 1))
 
-        if self.position not in ["sys_start", "user_start", "sys_end", "user_end"]:
+        if self.conditional:
+            self.cond = compile_cond(self.conditional)
+            self.cond_reads = condition_reads(self.cond)
+        self.template = compile_template(str(self.content))
+        self.action_templates = tuple(
+            compile_template(str(action)) for action in self.actions
+        )
+
+        if self.position not in [
+            "sys_start",
+            "user_start",
+            "sys_end",
+            "user_end",
+            *RESPONSE_POSITIONS,
+        ]:
             self.position = "sys_start"
 
         if self.type not in ["regex", "keywords", "listener"]:
             self.type = "keywords"
 
+        if self.match_on not in MATCH_FORMS:
+            self.match_on = "text"
+
     def __repr__(self):
         return self.__str__()
 
@@ -36,10 +71,49 @@ class Trigger:
             f"Trigger(name={self.name}, type={self.type}, content='{self.content if len(self.content) < 15 else self.content[:15]}', "
             f"match={self.match}, conditional={self.conditional}, priority={self.priority}, "
             f"block={self.block}, use_logic={self.use_logic}, position={self.position}, "
-            f"probability={self.probability}, actions={self.actions}, max_trig={self.max_trig})"
+            f"probability={self.probability}, actions={self.actions}, max_trig={self.max_trig}, "
+            f"match_on={self.match_on})"
         )
 
 
+@dataclass(slots=True, frozen=True, repr=False)
+class TemplateValue:
+    """含占位符的变量值，在写入时标记，读取时渲染
+
+    普通值直接保存原值，读取时无需再扫描占位符。
+    """
+
+    template: Template
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __str__(self):
+        return self.template.source
+
+    def __repr__(self):
+        return f"TemplateValue({self.template.source!r})"
+
+
+def flag_value(value: Any) -> Any:
+    """标记变量值，含有占位符的字符串转换为 TemplateValue
+
+    Args:
+        value: 原始变量值
+
+    Returns:
+        标记后的变量值
+    """
+    if type(value) is str and "{" in value:
+        template = compile_template(value)
+        if template.plan:
+            return TemplateValue(template)
+    return value
+
+
 @dataclass(slots=True)
 class LoreResult:
     """定义触发结果"""
@@ -50,3 +124,19 @@ class LoreResult:
     user_end: list[str] = field(default_factory=list)
     res_start: list[str] = field(default_factory=list)
     res_end: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """返回各位置的条目数与字符数，用于调试日志"""
+        parts = []
+        for position in (
+            "sys_start",
+            "user_start",
+            "sys_end",
+            "user_end",
+            *RESPONSE_POSITIONS,
+        ):
+            lines = getattr(self, position)
+            if lines:
+                size = sum(len(line) for line in lines)
+                parts.append(f"{position}={len(lines)}项/{size}字")
+        return " ".join(parts) or "无注入"
@@ -0,0 +1,111 @@
+import asyncio
+from collections.abc import Sequence
+
+from .matcher import TriggerIndex  # type: ignore
+from .normalize import Message  # type: ignore
+
+# 等待扫描的会话消息：(匹配索引, 消息窗口, 结果)
+Pending = tuple[TriggerIndex, tuple[Message, ...], "asyncio.Future[set[int]]"]
+
+
+class MatchBatcher:
+    """跨会话的批量匹配
+
+    同一轮事件循环中到达的各会话消息合并为一批，对共享的匹配索引一次扫描，
+    再把各会话的候选触发器交回对应会话的解析器。批量较大时在工作线程中扫描，
+    不阻塞事件循环。
+    """
+
+    __slots__ = (
+        "max_batch",
+        "delay",
+        "thread_min",
+        "_pending",
+        "_handle",
+        "_tasks",
+    )
+
+    def __init__(
+        self, max_batch: int = 256, delay: float = 0.0, thread_min: int = 8
+    ):
+        """初始化批量匹配
+
+        Args:
+            max_batch: 每批最多的会话消息数，达到后立即扫描
+            delay: 收集一批消息的等待时间（秒），0表示只收集同一轮事件循环中的消息
+            thread_min: 一批消息数达到该值时在工作线程中扫描，较小的批次直接扫描
+        """
+        self.max_batch = max(1, max_batch)
+        self.delay = delay
+        self.thread_min = thread_min
+        self._pending: list[Pending] = []
+        self._handle: asyncio.Handle | None = None
+        # 正在扫描的批次，保留引用避免任务被回收
+        self._tasks: set[asyncio.Task] = set()
+
+    async def candidates(
+        self, index: TriggerIndex, messages: Sequence[Message]
+    ) -> set[int]:
+        """等待一个会话的消息完成匹配
+
+        Args:
+            index: 会话使用的lorebook的匹配索引
+            messages: 会话的消息列表，提交时复制
+
+        Returns:
+            匹配任意一条消息的触发器下标
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[set[int]] = loop.create_future()
+        self._pending.append((index, tuple(messages), future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._handle is None:
+            self._handle = (
+                loop.call_later(self.delay, self._flush)
+                if self.delay
+                else loop.call_soon(self._flush)
+            )
+        return await future
+
+    def _flush(self) -> None:
+        """提交当前收集的一批消息"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._scan(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _scan(self, batch: list[Pending]) -> None:
+        """扫描一批消息，并按会话返回结果"""
+        try:
+            if len(batch) >= self.thread_min:
+                results = await asyncio.to_thread(_scan_batch, batch)
+            else:
+                results = _scan_batch(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), found in zip(batch, results):
+            if not future.done():
+                future.set_result(found)
+
+
+def _scan_batch(batch: list[Pending]) -> list[set[int]]:
+    """按匹配索引分组扫描，使用不同lorebook的会话各自扫描"""
+    groups: dict[int, tuple[TriggerIndex, list[int]]] = {}
+    for position, (index, _, _) in enumerate(batch):
+        groups.setdefault(id(index), (index, []))[1].append(position)
+
+    results: list[set[int]] = [set()] * len(batch)
+    for index, positions in groups.values():
+        windows = [batch[position][1] for position in positions]
+        found = index.candidates_batch(windows)
+        for position, candidates in zip(positions, found):
+            results[position] = candidates
+    return results
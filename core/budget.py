@@ -0,0 +1,150 @@
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from astrbot.api import logger
+
+
+class Budget:
+    """单条消息的处理预算
+
+    每执行一个占位符调用或处理一个候选触发器消耗一步。超出步数或时间上限后，
+    剩余的触发器与作者注释不再处理，模板中剩余的占位符渲染为空文本。
+    """
+
+    __slots__ = ("max_steps", "max_seconds", "steps", "exhausted", "_deadline")
+
+    def __init__(self, max_steps: int = 0, max_seconds: float = 0.0):
+        """初始化预算
+
+        Args:
+            max_steps: 每条消息的最大步数，0表示不限制
+            max_seconds: 每条消息的最长处理时间（秒），0表示不限制
+        """
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.steps = 0
+        self.exhausted = False
+        self._deadline: float | None = None
+
+    def start(self) -> None:
+        """开始处理一条新消息"""
+        self.steps = 0
+        self.exhausted = False
+        self._deadline = (
+            time.perf_counter() + self.max_seconds if self.max_seconds else None
+        )
+
+    def spend(self, steps: int = 1) -> bool:
+        """消耗预算
+
+        Args:
+            steps: 消耗的步数
+
+        Returns:
+            预算是否已耗尽
+        """
+        if self.exhausted:
+            return True
+        self.steps += steps
+        if (self.max_steps and self.steps > self.max_steps) or (
+            self._deadline is not None and time.perf_counter() > self._deadline
+        ):
+            self.exhausted = True
+        return self.exhausted
+
+
+@dataclass(slots=True)
+class _BreakerState:
+    cost: float = 0.0  # 单次处理耗时的指数移动平均（秒）
+    samples: int = 0  # 已记录的次数
+    trips: int = 0  # 连续熔断次数，决定下次的停用时长
+    open_until: float = 0.0  # 停用截止时间，0表示未停用
+
+
+class CircuitBreaker:
+    """触发器熔断器，由所有会话共享
+
+    触发器的平均处理耗时超过阈值时暂时停用，停用时长随连续熔断次数指数增长；
+    停用结束后重新启用，若耗时仍超过阈值则再次停用。
+    """
+
+    __slots__ = (
+        "threshold",
+        "base_backoff",
+        "max_backoff",
+        "min_samples",
+        "_alpha",
+        "_clock",
+        "_states",
+    )
+
+    def __init__(
+        self,
+        threshold: float,
+        window: int = 20,
+        base_backoff: float = 30.0,
+        max_backoff: float = 1800.0,
+        min_samples: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化熔断器
+
+        Args:
+            threshold: 平均处理耗时的阈值（秒）
+            window: 移动平均的窗口大小（次）
+            base_backoff: 首次停用的时长（秒）
+            max_backoff: 最长停用时长（秒）
+            min_samples: 记录次数达到该值后才会熔断，避免首次处理的偶然耗时
+            clock: 计算停用时长使用的时钟
+        """
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_samples = min_samples
+        self._alpha = 2 / (window + 1)
+        self._clock = clock
+        self._states: dict[str, _BreakerState] = {}
+
+    def allow(self, name: str) -> bool:
+        """触发器当前是否可用"""
+        state = self._states.get(name)
+        if state is None or not state.open_until:
+            return True
+        if self._clock() < state.open_until:
+            return False
+        state.open_until = 0.0
+        logger.info(f"lorebook | 触发器 {name} 重新启用")
+        return True
+
+    def record(self, name: str, seconds: float) -> None:
+        """记录触发器一次处理的耗时
+
+        Args:
+            name: 触发器名称
+            seconds: 耗时（秒）
+        """
+        state = self._states.get(name)
+        if state is None:
+            state = self._states[name] = _BreakerState(seconds)
+        else:
+            state.cost += self._alpha * (seconds - state.cost)
+        state.samples += 1
+
+        if state.cost > self.threshold and state.samples >= self.min_samples:
+            state.trips += 1
+            backoff = min(self.base_backoff * 2 ** (state.trips - 1), self.max_backoff)
+            state.open_until = self._clock() + backoff
+            logger.warning(
+                f"lorebook | 触发器 {name} 平均耗时 {state.cost * 1000:.1f}ms "
+                f"超过阈值，停用 {backoff:.0f}s"
+            )
+            # 重新启用后按新的耗时判断
+            state.cost = self.threshold
+        elif state.cost < self.threshold / 2:
+            state.trips = 0
+
+    def disabled(self) -> list[str]:
+        """当前停用的触发器"""
+        now = self._clock()
+        return [name for name, state in self._states.items() if state.open_until > now]
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """时钟基类，为会话提供当前的真实时间"""
+
+    __slots__ = ()
+
+    def now(self) -> datetime:
+        """返回当前时间"""
+        raise NotImplementedError
+
+
+class RealClock(Clock):
+    """系统时钟"""
+
+    __slots__ = ()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class FrozenClock(Clock):
+    """固定时钟，只在调用 advance 或 set 时改变，可用于测试与基准测试"""
+
+    __slots__ = ("_now",)
+
+    def __init__(self, at: datetime | None = None):
+        """初始化固定时钟
+
+        Args:
+            at: 固定的时间，默认为创建时的系统时间
+        """
+        self._now = at if at is not None else datetime.now()
+
+    def now(self) -> datetime:
+        return self._now
+
+    def set(self, at: datetime) -> None:
+        """设置时间"""
+        self._now = at
+
+    def advance(self, delta: timedelta) -> None:
+        """将时间向后推进"""
+        self._now += delta
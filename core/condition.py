@@ -0,0 +1,334 @@
+import operator
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from .registry import TIME_REFS  # type: ignore
+from .template import compile_template, iter_calls  # type: ignore
+
+# 比较运算符，双字符运算符在前，保证 "<=" 不会被识别为 "<"
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,  # 等于
+    "!=": operator.ne,  # 不等于
+    "<=": operator.le,  # 小于等于
+    ">=": operator.ge,  # 大于等于
+    "<": operator.lt,  # 小于
+    ">": operator.gt,  # 大于
+}
+
+# 用于判断操作数中是否含有占位符
+DYNAMIC_PATTERN = re.compile(r"\{[a-zA-Z0-9_]+::")
+# 操作数仅为一次变量读取时，求值时直接绑定变量值，无需渲染
+VAR_REF_PATTERN = re.compile(r"\{var::get\(\s*([^(){}\[\]\s,\"']+)\s*\)\}")
+
+# 渲染函数类型：接收含占位符的文本，返回渲染后的文本；为None时表示文本已渲染
+Render = Callable[[str], str] | None
+# 变量查找函数类型：接收"scope.name"形式的引用，返回数值或字符串形式的变量值
+Lookup = Callable[[str], int | float | str] | None
+
+
+def try_numeric(value: str) -> int | float | str:
+    """尝试将值转换为数值类型
+
+    Args:
+        value: 要转换的字符串值
+
+    Returns:
+        转换后的值，可能是整数、浮点数或原始字符串
+    """
+    try:
+        # 尝试整数转换
+        if value.isdigit() or (value.startswith("-") and value[1:].isdigit()):
+            return int(value)
+
+        # 尝试浮点数转换
+        float_val = float(value)
+        # 如果是整数值的浮点数，转换为整数
+        return int(float_val) if float_val.is_integer() else float_val
+    except (ValueError, AttributeError, OverflowError):
+        # 转换失败则返回原始字符串
+        return value
+
+
+def _literal_truth(text: str) -> bool:
+    """判断不含运算符的常量文本的真值"""
+    lowered = text.lower()
+    if lowered == "true" or text == "1":
+        return True
+    if lowered == "false" or text == "0" or text == "":
+        return False
+    # 非空条件视为真
+    return True
+
+
+@dataclass(slots=True, frozen=True)
+class Operand:
+    """比较运算的操作数，常量在编译时完成数值转换"""
+
+    text: str
+    value: int | float | str
+    dynamic: bool
+    ref: str | None = None  # 操作数为 {var::get(ref)} 时的变量引用
+
+    def resolve(
+        self, render: Render = None, lookup: Lookup = None
+    ) -> int | float | str:
+        if not self.dynamic or render is None:
+            return self.value
+        if self.ref is not None and lookup is not None:
+            value = lookup(self.ref)
+            return value if type(value) is not str else try_numeric(value.strip())
+        return try_numeric(render(self.text).strip())
+
+
+@dataclass(slots=True, frozen=True)
+class Const:
+    """常量条件"""
+
+    value: bool
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        return self.value
+
+
+@dataclass(slots=True, frozen=True)
+class Truthy:
+    """含占位符的单个操作数，渲染后按条件表达式求值"""
+
+    text: str
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        if render is None:
+            return _literal_truth(self.text)
+        # 渲染结果按原样求值，不再二次渲染
+        return compile_cond(render(self.text)).evaluate()
+
+
+@dataclass(slots=True, frozen=True)
+class Not:
+    """逻辑非"""
+
+    operand: "Condition"
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        return not self.operand.evaluate(render, lookup)
+
+
+@dataclass(slots=True, frozen=True)
+class And:
+    """逻辑与"""
+
+    operands: tuple["Condition", ...]
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        return all(cond.evaluate(render, lookup) for cond in self.operands)
+
+
+@dataclass(slots=True, frozen=True)
+class Or:
+    """逻辑或"""
+
+    operands: tuple["Condition", ...]
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        return any(cond.evaluate(render, lookup) for cond in self.operands)
+
+
+@dataclass(slots=True, frozen=True)
+class Compare:
+    """比较运算"""
+
+    op: str
+    left: Operand
+    right: Operand
+
+    def evaluate(self, render: Render = None, lookup: Lookup = None) -> bool:
+        try:
+            left = self.left.resolve(render, lookup)
+            right = self.right.resolve(render, lookup)
+            return OPERATORS[self.op](left, right)
+        except Exception:
+            # 任何异常情况下返回False（如字符串与数字比较大小）
+            return False
+
+
+Condition = Const | Truthy | Not | And | Or | Compare
+
+
+def _split_top(text: str, sep: str) -> list[str]:
+    """按顶层分隔符切分文本，占位符 {...} 内部的分隔符会被忽略
+
+    Args:
+        text: 待切分的文本
+        sep: 分隔符，如 "&&"、"||"
+
+    Returns:
+        切分后的片段列表
+    """
+    parts = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "{":
+            depth += 1
+        elif c == "}" and depth > 0:
+            depth -= 1
+        elif depth == 0 and text.startswith(sep, i):
+            parts.append(text[start:i])
+            i += len(sep)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _find_operator(text: str) -> tuple[int, str] | None:
+    """查找第一个顶层比较运算符
+
+    Returns:
+        (位置, 运算符)元组，未找到时返回None
+    """
+    depth = 0
+    for i, c in enumerate(text):
+        if c == "{":
+            depth += 1
+        elif c == "}" and depth > 0:
+            depth -= 1
+        elif depth == 0 and c in "=!<>":
+            two = text[i : i + 2]
+            if two in OPERATORS:
+                return i, two
+            if c in OPERATORS:
+                return i, c
+    return None
+
+
+def _make_operand(text: str) -> Operand:
+    text = text.strip()
+    ref = VAR_REF_PATTERN.fullmatch(text)
+    return Operand(
+        text,
+        try_numeric(text),
+        bool(DYNAMIC_PATTERN.search(text)),
+        ref.group(1) if ref else None,
+    )
+
+
+def _compile_unary(text: str) -> Condition:
+    text = text.strip()
+    # 处理非逻辑（!），"!=" 是比较运算符而非取反
+    if text.startswith("!") and not text.startswith("!="):
+        return Not(_compile_unary(text[1:]))
+
+    found = _find_operator(text)
+    if found is not None:
+        pos, op = found
+        return Compare(
+            op, _make_operand(text[:pos]), _make_operand(text[pos + len(op) :])
+        )
+
+    if DYNAMIC_PATTERN.search(text):
+        return Truthy(text)
+    return Const(_literal_truth(text))
+
+
+@lru_cache(maxsize=1024)
+def compile_cond(condition: str) -> Condition:
+    """将条件表达式编译为谓词树
+
+    运算符优先级从低到高为 ||、&&、!、比较运算。
+    不含占位符的操作数在编译时完成数值转换，求值时只需渲染占位符并比较。
+
+    Args:
+        condition: 条件表达式字符串
+
+    Returns:
+        编译后的条件对象，通过 evaluate(render, lookup) 求值，
+        render 用于渲染操作数中的占位符，lookup 用于直接读取变量值
+    """
+    condition = str(condition).strip()
+    if not condition:
+        return Const(False)
+
+    or_parts = []
+    for or_part in _split_top(condition, "||"):
+        if not or_part.strip():
+            continue
+        and_parts = tuple(
+            _compile_unary(part)
+            for part in _split_top(or_part, "&&")
+            if part.strip()
+        )
+        or_parts.append(and_parts[0] if len(and_parts) == 1 else And(and_parts))
+
+    if not or_parts:
+        return Const(False)
+    return or_parts[0] if len(or_parts) == 1 else Or(tuple(or_parts))
+
+
+def _text_reads(text: str) -> frozenset[str] | None:
+    """含占位符的文本读取的变量引用，调用了非纯函数时返回None"""
+    template = compile_template(text)
+    if template.reads is None:
+        return None
+    for call in iter_calls(template):
+        spec = call.spec
+        if spec is None:
+            return None
+        if spec.pure:
+            continue
+        # 只读取当前时间的非纯函数视为读取时间伪变量
+        refs = spec.reads(call.args or ()) if spec.reads else None
+        if refs is None or not set(refs) <= TIME_REFS:
+            return None
+    return template.reads
+
+
+def condition_reads(cond: Condition) -> frozenset[str] | None:
+    """提取条件读取的变量引用
+
+    返回的引用为"scope.name"形式，读取时间的条件还包含 TIME_REFS 中的伪变量引用。
+    这是编译期可以确定的读取集合，变量值本身含有占位符时的间接读取需要在求值时记录。
+
+    Args:
+        cond: 编译后的条件
+
+    Returns:
+        变量引用集合；条件调用了除读取时间以外的非纯函数（如随机数）或未知函数，
+        求值结果不只由变量与时间决定时返回None
+    """
+    match cond:
+        case Const():
+            return frozenset()
+        case Truthy(text):
+            return _text_reads(text)
+        case Not(operand):
+            return condition_reads(operand)
+        case And(operands) | Or(operands):
+            reads: set[str] = set()
+            for operand in operands:
+                refs = condition_reads(operand)
+                if refs is None:
+                    return None
+                reads |= refs
+            return frozenset(reads)
+        case Compare(_, left, right):
+            reads = set()
+            for operand in (left, right):
+                if not operand.dynamic:
+                    continue
+                if operand.ref is not None:
+                    ref = operand.ref
+                    reads.add(ref if "." in ref else f"world.{ref}")
+                    continue
+                refs = _text_reads(operand.text)
+                if refs is None:
+                    return None
+                reads |= refs
+            return frozenset(reads)
+    return None
@@ -0,0 +1,56 @@
+import logging
+from collections.abc import Callable, Iterable
+
+from astrbot.api import logger
+
+# 调试摘要的最大长度
+MAX_SUMMARY_LENGTH = 300
+# 摘要中最多列出的名称数量
+MAX_SUMMARY_NAMES = 10
+
+
+def debug_enabled() -> bool:
+    """是否启用了调试日志"""
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def debug(message: Callable[[], str]) -> None:
+    """惰性输出调试日志，只有启用调试日志时才会生成日志内容
+
+    Args:
+        message: 生成日志内容的函数
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(clip(message()))
+
+
+def clip(text: str, limit: int = MAX_SUMMARY_LENGTH) -> str:
+    """截断过长的文本
+
+    Args:
+        text: 原始文本
+        limit: 最大长度
+
+    Returns:
+        截断后的文本，超出部分以省略号及总长度表示
+    """
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(共{len(text)}字)"
+
+
+def summarize_names(names: Iterable[str], limit: int = MAX_SUMMARY_NAMES) -> str:
+    """列出前若干个名称
+
+    Args:
+        names: 名称
+        limit: 最多列出的数量
+
+    Returns:
+        以逗号连接的名称，超出部分以数量表示
+    """
+    names = list(names)
+    shown = ",".join(names[:limit])
+    if len(names) > limit:
+        shown += f"…(+{len(names) - limit})"
+    return shown
@@ -0,0 +1,582 @@
+import heapq
+import random
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from math import ceil, comb, log
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时使用纯Python实现
+    np = None
+
+# 组合骰子表示法中的单项，骰子项或固定值
+DICE_PATTERN = re.compile(r"([+-]?\d*d\d+(?:[kubrtl]\d+|adv|dis)?)|([+-]?\d+)")
+# 单个骰子项：数量、面数，以及可选的修饰符
+TERM_PATTERN = re.compile(r"(\d*)d(\d+)(?:([kubrtl])(\d+)|(adv|dis))?")
+
+# 骰子数量达到该值时使用numpy批量统计结果
+BULK_THRESHOLD = 64
+# 重投累加的最大轮数，避免连续重投导致循环过长
+MAX_EXPLODE_ROUNDS = 100
+# 调试日志中最多列出的骰子结果数
+MAX_DETAIL_ROLLS = 20
+# 计算概率分布时，结果取值个数的上限
+MAX_DIST_SIZE = 10000
+# 计算保留高/低位分布时的计算量上限
+MAX_KEEP_WORK = 10**7
+# 计算重投累加分布时的计算量上限（乘加次数）
+MAX_EXPLODE_WORK = 2 * 10**6
+# 未安装 numpy 时，每次卷积的计算量上限（乘加次数）
+MAX_PY_CONVOLVE_WORK = 10**6
+# 重投累加分布中概率低于该值的部分和被舍去
+EXPLODE_EPSILON = 1e-15
+
+
+@dataclass(slots=True)
+class DiceLimits:
+    """骰子表达式的上限，防止lorebook或用户输入的表达式占用过多时间"""
+
+    max_count: int = 1000  # 单个表达式中骰子总数上限
+    max_faces: int = 1000000  # 骰子面数上限
+
+
+DICE_LIMITS = DiceLimits()
+
+
+def set_dice_limits(max_count: int | None = None, max_faces: int | None = None):
+    """设置骰子表达式的上限
+
+    Args:
+        max_count: 单个表达式中骰子总数上限
+        max_faces: 骰子面数上限
+    """
+    if max_count is not None and max_count > 0:
+        DICE_LIMITS.max_count = max_count
+    if max_faces is not None and max_faces > 0:
+        DICE_LIMITS.max_faces = max_faces
+
+
+@dataclass(slots=True, frozen=True)
+class DiceTerm:
+    """编译后的骰子项
+
+    kind 为修饰符：None(普通), "k"/"l"(保留高/低位), "u"/"b"(上/下界),
+    "r"(重投累加), "t"(重投), "adv"/"dis"(优势/劣势)
+    """
+
+    sign: int
+    num: int
+    faces: int
+    kind: str | None = None
+    value: int = 0
+
+
+@dataclass(slots=True, frozen=True)
+class DicePlan:
+    """编译后的骰子表达式"""
+
+    notation: str
+    terms: tuple[DiceTerm, ...]
+    modifier: int = 0  # 固定值修正之和
+    count: int = 0  # 骰子总数（不含重投）
+    max_faces: int = 0
+
+
+def _compile_term(expr: str, sign: int = 1) -> DiceTerm:
+    """编译单个骰子项
+
+    Raises:
+        ValueError: 当骰子项格式无效时抛出
+    """
+    match = TERM_PATTERN.fullmatch(expr)
+    if match is None:
+        raise ValueError(f"无法解析'{expr}'")
+    num_str, faces_str, kind, value_str, adv = match.groups()
+    num = int(num_str) if num_str else 1
+    faces = int(faces_str)
+    if num <= 0 or faces <= 0:
+        raise ValueError("骰子数量和面数必须为正数")
+
+    value = int(value_str) if value_str else 0
+    match kind or adv:
+        case "k" | "l":
+            if value <= 0:
+                raise ValueError("骰子数量、面数和保留数量都必须为正数")
+            if value > num:
+                raise ValueError("保留数量不能大于骰子数量")
+        case "r" | "t":
+            if value < 1 or value > faces:
+                raise ValueError(f"重投阈值必须在1到{faces}之间")
+            if kind == "r" and value == 1:
+                raise ValueError("重投累加阈值必须大于1")
+    return DiceTerm(sign, num, faces, kind or adv, value)
+
+
+@lru_cache(maxsize=1024)
+def compile_dice(notation: str) -> DicePlan:
+    """将骰子表示法编译为投掷计划，结果会被缓存
+
+    支持 3d6、2d20adv、3d6u4、3d6b2、3d6r5、3d6t2、4d6k3、4d6l2，
+    以及由它们与固定值组成的组合表达式，如 2d6+1d4+3。
+
+    Args:
+        notation: 骰子表示法字符串
+
+    Returns:
+        投掷计划
+
+    Raises:
+        ValueError: 当骰子表示法格式无效时抛出
+    """
+    notation = notation.strip().lower()
+    terms: list[DiceTerm] = []
+    modifier = 0
+    # 处理组合骰子表示法，如 2d6+1d4+3
+    if "+" in notation or ("-" in notation and not notation.startswith("-")):
+        for dice, number in DICE_PATTERN.findall(notation):
+            if number:
+                modifier += int(number)
+                continue
+            sign = -1 if dice.startswith("-") else 1
+            terms.append(_compile_term(dice.lstrip("+-"), sign))
+    else:
+        if notation.startswith("-"):
+            raise ValueError("骰子数量和面数必须为正数")
+        terms.append(_compile_term(notation))
+
+    return DicePlan(
+        notation=notation,
+        terms=tuple(terms),
+        modifier=modifier,
+        count=sum(term.num for term in terms),
+        max_faces=max((term.faces for term in terms), default=0),
+    )
+
+
+def _draw(rng: random.Random, num: int, faces: int) -> Any:
+    """投掷 num 个 faces 面骰子，数量较多且numpy可用时返回numpy数组
+
+    结果总是取自会话的随机数生成器，是否安装numpy不影响相同种子下的结果。
+    """
+    if num == 1:
+        return [rng.randint(1, faces)]
+    rolls = rng.choices(range(1, faces + 1), k=num)
+    if np is not None and num >= BULK_THRESHOLD:
+        return np.array(rolls)
+    return rolls
+
+
+def _total(rolls: Any) -> int:
+    """求骰子结果之和"""
+    if type(rolls) is list:
+        return sum(rolls)
+    return int(rolls.sum())
+
+
+def _count_at_least(rolls: Any, value: int) -> int:
+    """统计结果大于等于 value 的骰子数"""
+    if type(rolls) is list:
+        return sum(1 for r in rolls if r >= value)
+    return int((rolls >= value).sum())
+
+
+def _summary(rolls: Any) -> str:
+    """生成调试日志用的骰子结果摘要"""
+    shown = [str(int(r)) for r in rolls[:MAX_DETAIL_ROLLS]]
+    if len(rolls) > MAX_DETAIL_ROLLS:
+        shown.append(f"...(共{len(rolls)}个)")
+    return ",".join(shown)
+
+
+def _roll_term(
+    term: DiceTerm, rng: random.Random, details: list[str] | None
+) -> int:
+    """投掷单个骰子项
+
+    Args:
+        term: 骰子项
+        rng: 随机数生成器
+        details: 调试信息列表，为None时不生成调试信息
+
+    Returns:
+        骰子项结果（未计入符号）
+    """
+    num, faces, kind, value = term.num, term.faces, term.kind, term.value
+    rolls = _draw(rng, num, faces)
+    bulk = type(rolls) is not list
+    if details is not None:
+        label = f"{num}d{faces}{kind or ''}{value or ''}"
+        details.append(f"{label}[{_summary(rolls)}]")
+
+    match kind:
+        case "k" | "l":
+            # 保留高位或低位
+            if bulk:
+                if kind == "k":
+                    kept = np.partition(rolls, num - value)[num - value :]
+                else:
+                    kept = np.partition(rolls, value - 1)[:value]
+            else:
+                pick = heapq.nlargest if kind == "k" else heapq.nsmallest
+                kept = pick(value, rolls)
+            result = _total(kept)
+        case "u":
+            # 上界：超过上界的结果按上界计
+            result = int(
+                np.minimum(rolls, value).sum()
+                if bulk
+                else sum(min(r, value) for r in rolls)
+            )
+        case "b":
+            # 下界：低于下界的结果按下界计
+            result = int(
+                np.maximum(rolls, value).sum()
+                if bulk
+                else sum(max(r, value) for r in rolls)
+            )
+        case "t":
+            # 重投：小于等于阈值时重投一次
+            if bulk:
+                low = rolls[rolls <= value]
+            else:
+                low = [r for r in rolls if r <= value]
+            result = _total(rolls) - _total(low)
+            if len(low):
+                rerolls = _draw(rng, len(low), faces)
+                result += _total(rerolls)
+                if details is not None:
+                    details.append(f"重投[{_summary(rerolls)}]")
+        case "r":
+            # 重投累加：大于等于阈值时重投并累加，按轮批量投掷
+            result = _total(rolls)
+            active = _count_at_least(rolls, value)
+            rounds = 0
+            while active and rounds < MAX_EXPLODE_ROUNDS:
+                extra = _draw(rng, active, faces)
+                result += _total(extra)
+                active = _count_at_least(extra, value)
+                rounds += 1
+                if details is not None:
+                    details.append(f"累加[{_summary(extra)}]")
+        case "adv" | "dis":
+            # 优势/劣势：每个骰子投两次取较高/较低值
+            second = _draw(rng, num, faces)
+            if bulk:
+                pick_np = np.maximum if kind == "adv" else np.minimum
+                result = int(pick_np(rolls, second).sum())
+            else:
+                pick = max if kind == "adv" else min
+                result = sum(pick(a, b) for a, b in zip(rolls, second))
+            if details is not None:
+                details.append(f"[{_summary(second)}]")
+        case _:
+            result = _total(rolls)
+
+    return result
+
+
+def roll_dice(
+    plan: DicePlan, rng: random.Random, details: list[str] | None = None
+) -> int:
+    """按投掷计划掷骰
+
+    Args:
+        plan: 投掷计划
+        rng: 随机数生成器
+        details: 调试信息列表，为None时不生成调试信息
+
+    Returns:
+        掷骰结果
+
+    Raises:
+        ValueError: 当骰子数量或面数超过上限时抛出
+    """
+    if plan.count > DICE_LIMITS.max_count:
+        raise ValueError(f"骰子数量不能超过{DICE_LIMITS.max_count}")
+    if plan.max_faces > DICE_LIMITS.max_faces:
+        raise ValueError(f"骰子面数不能超过{DICE_LIMITS.max_faces}")
+
+    total = plan.modifier
+    for term in plan.terms:
+        total += term.sign * _roll_term(term, rng, details)
+    return total
+
+
+@dataclass(slots=True, frozen=True)
+class DiceDistribution:
+    """骰子表达式结果的概率分布
+
+    probs[i] 为结果等于 offset + i 的概率，cdf[i] 为结果小于等于 offset + i 的概率。
+    """
+
+    offset: int
+    probs: tuple[float, ...]
+    cdf: tuple[float, ...]
+    mean: float
+
+    def _at_most(self, value: int) -> float:
+        """结果小于等于 value 的概率"""
+        index = value - self.offset
+        if index < 0:
+            return 0.0
+        if index >= len(self.cdf):
+            return 1.0
+        return self.cdf[index]
+
+    def prob(self, op: str, target: int | float) -> float:
+        """计算结果满足 "结果 op target" 的概率
+
+        Args:
+            op: 比较运算符，可选值: ==, !=, <, <=, >, >=
+            target: 比较目标
+
+        Returns:
+            概率
+
+        Raises:
+            ValueError: 当运算符无效时抛出
+        """
+        # 结果均为整数，非整数目标按取整后的边界计算
+        floor = int(target // 1)
+        exact = floor == target
+        match op:
+            case "<=":
+                p = self._at_most(floor)
+            case "<":
+                p = self._at_most(floor - 1 if exact else floor)
+            case ">":
+                p = 1 - self._at_most(floor)
+            case ">=":
+                p = 1 - self._at_most(floor - 1 if exact else floor)
+            case "==":
+                p = self._at_most(floor) - self._at_most(floor - 1) if exact else 0.0
+            case "!=":
+                p = 1 - self.prob("==", target)
+            case _:
+                raise ValueError(f"未知比较运算符: {op}")
+        return min(1.0, max(0.0, p))
+
+
+def _convolve(a: list[float], b: list[float]) -> list[float]:
+    """计算两个概率分布的卷积
+
+    Raises:
+        ValueError: 未安装 numpy 且计算量超过上限时抛出
+    """
+    if np is not None:
+        return np.convolve(a, b).tolist()
+    # 纯Python卷积在事件循环中同步执行，按计算量而非结果大小限制
+    if len(a) * len(b) > MAX_PY_CONVOLVE_WORK:
+        raise ValueError("骰子表达式过于复杂，无法计算分布")
+    result = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+
+def _convolve_power(die: list[float], num: int) -> list[float]:
+    """计算单个骰子分布的 num 次卷积（平方求幂）"""
+    result = [1.0]
+    base = die
+    while num:
+        if num & 1:
+            result = _convolve(result, base)
+        num >>= 1
+        if num:
+            base = _convolve(base, base)
+    return result
+
+
+def _single_die(term: DiceTerm) -> tuple[int, list[float]]:
+    """计算单个骰子的结果分布
+
+    Returns:
+        (最小值, 概率列表)
+    """
+    faces, value = term.faces, term.value
+    uniform = 1 / faces
+    match term.kind:
+        case "u":
+            # 上界：大于上界的结果并入上界
+            probs: dict[int, float] = defaultdict(float)
+            for v in range(1, faces + 1):
+                probs[min(v, value)] += uniform
+        case "b":
+            probs = defaultdict(float)
+            for v in range(1, faces + 1):
+                probs[max(v, value)] += uniform
+        case "t":
+            # 重投：小于等于阈值时按重投结果计
+            low = min(value, faces) * uniform
+            probs = {
+                v: low * uniform + (uniform if v > value else 0.0)
+                for v in range(1, faces + 1)
+            }
+        case "adv":
+            square = faces * faces
+            probs = {v: (2 * v - 1) / square for v in range(1, faces + 1)}
+        case "dis":
+            square = faces * faces
+            probs = {
+                v: (2 * (faces - v) + 1) / square for v in range(1, faces + 1)
+            }
+        case "r":
+            probs = _explode_die(faces, value)
+        case _:
+            return 1, [uniform] * faces
+
+    low = min(probs)
+    dense = [0.0] * (max(probs) - low + 1)
+    for v, p in probs.items():
+        dense[v - low] += p
+    return low, dense
+
+
+def _explode_die(faces: int, threshold: int) -> dict[int, float]:
+    """计算重投累加骰子的结果分布，与投掷时一致，最多累加 MAX_EXPLODE_ROUNDS 轮
+
+    每轮将正在累加的部分和与单个骰子的分布卷积，概率可忽略的部分和被舍去。
+    结果取值个数或计算量超过上限时在计算前或计算过程中抛出异常。
+
+    Raises:
+        ValueError: 当分布过大或计算量过大时抛出
+    """
+    uniform = 1 / faces
+    threshold = max(threshold, 1)
+    if threshold > faces:
+        return dict.fromkeys(range(1, faces + 1), uniform)
+
+    # 剩余概率低于 EXPLODE_EPSILON 前需要的轮数，决定结果取值个数的上界
+    explode = (faces - threshold + 1) * uniform
+    rounds = MAX_EXPLODE_ROUNDS + 1
+    if explode < 1:
+        rounds = min(rounds, ceil(log(EXPLODE_EPSILON) / log(explode)) + 1)
+    if faces * rounds > MAX_DIST_SIZE:
+        raise ValueError("骰子表达式过于复杂，无法计算分布")
+
+    stop = [uniform] * (threshold - 1)  # 结束累加的面值 1..threshold-1
+    again = [uniform] * (faces - threshold + 1)  # 继续累加的面值 threshold..faces
+    probs: dict[int, float] = defaultdict(float)
+    # 正在累加的部分和，pending[i] 为部分和等于 low + i 的概率
+    low, pending = 0, [1.0]
+    work = 0
+    for round_index in range(MAX_EXPLODE_ROUNDS + 1):
+        work += len(pending) * faces
+        if work > MAX_EXPLODE_WORK:
+            raise ValueError("骰子表达式过于复杂，无法计算分布")
+        if round_index == MAX_EXPLODE_ROUNDS:
+            # 最后一轮的结果不再累加
+            for i, p in enumerate(_convolve(pending, stop + again)):
+                probs[low + 1 + i] += p
+            break
+        if stop:
+            for i, p in enumerate(_convolve(pending, stop)):
+                probs[low + 1 + i] += p
+        pending = _convolve(pending, again)
+        low += threshold
+
+        # 舍去两端概率可忽略的部分和
+        start, end = 0, len(pending)
+        while start < end and pending[start] < EXPLODE_EPSILON:
+            start += 1
+        while end > start and pending[end - 1] < EXPLODE_EPSILON:
+            end -= 1
+        pending = pending[start:end]
+        low += start
+        if sum(pending) < EXPLODE_EPSILON:
+            break
+        if len(pending) > MAX_DIST_SIZE:
+            raise ValueError("骰子表达式过于复杂，无法计算分布")
+    return probs
+
+
+def _keep_dist(term: DiceTerm) -> tuple[int, list[float]]:
+    """计算保留高/低位骰子项的结果分布
+
+    按面值从优先保留到优先丢弃的顺序依次确定掷出该面值的骰子数，
+    已确定的骰子达到保留数量后，保留部分之和即已确定。
+
+    Returns:
+        (最小值, 概率列表)
+    """
+    num, faces, keep = term.num, term.faces, term.value
+    if faces * faces * keep**3 > MAX_KEEP_WORK:
+        raise ValueError("骰子表达式过于复杂，无法计算分布")
+    order = range(faces, 0, -1) if term.kind == "k" else range(1, faces + 1)
+
+    final: dict[int, float] = defaultdict(float)
+    # 状态为(已确定的骰子数, 保留部分之和)
+    states: dict[tuple[int, int], float] = {(0, 0): 1.0}
+    for left, v in zip(range(faces, 0, -1), order):
+        q = 1 / left  # 剩余骰子掷出当前面值的条件概率
+        nxt: dict[tuple[int, int], float] = defaultdict(float)
+        for (placed, total), p in states.items():
+            rest = num - placed
+            need = keep - placed
+            if left == 1:
+                final[total + v * need] += p
+                continue
+            acc = 0.0
+            for c in range(need):
+                pc = comb(rest, c) * q**c * (1 - q) ** (rest - c)
+                acc += pc
+                nxt[(placed + c, total + v * c)] += p * pc
+            final[total + v * need] += p * max(0.0, 1 - acc)
+        states = nxt
+
+    low = min(final)
+    dense = [0.0] * (max(final) - low + 1)
+    for v, p in final.items():
+        dense[v - low] = p
+    return low, dense
+
+
+@lru_cache(maxsize=256)
+def dice_distribution(notation: str) -> DiceDistribution:
+    """计算骰子表达式结果的精确概率分布，结果会被缓存
+
+    各骰子项的分布通过卷积合并，安装 numpy 时使用向量化卷积。
+
+    Args:
+        notation: 骰子表示法字符串
+
+    Returns:
+        概率分布
+
+    Raises:
+        ValueError: 当骰子表示法格式无效或分布过大时抛出
+    """
+    plan = compile_dice(notation)
+    if plan.count > DICE_LIMITS.max_count:
+        raise ValueError(f"骰子数量不能超过{DICE_LIMITS.max_count}")
+    if plan.max_faces > DICE_LIMITS.max_faces:
+        raise ValueError(f"骰子面数不能超过{DICE_LIMITS.max_faces}")
+
+    offset, probs = plan.modifier, [1.0]
+    for term in plan.terms:
+        if term.kind in ("k", "l"):
+            low, dist = _keep_dist(term)
+        else:
+            single_low, single = _single_die(term)
+            if term.num * (len(single) - 1) + 1 > MAX_DIST_SIZE:
+                raise ValueError("骰子表达式过于复杂，无法计算分布")
+            low, dist = single_low * term.num, _convolve_power(single, term.num)
+        if term.sign < 0:
+            # 减去骰子项时分布取反
+            low, dist = -(low + len(dist) - 1), dist[::-1]
+        if len(probs) + len(dist) - 1 > MAX_DIST_SIZE:
+            raise ValueError("骰子表达式过于复杂，无法计算分布")
+        offset += low
+        probs = _convolve(probs, dist)
+
+    cdf, acc, mean = [], 0.0, 0.0
+    for i, p in enumerate(probs):
+        acc += p
+        cdf.append(acc)
+        mean += (offset + i) * p
+    return DiceDistribution(offset, tuple(probs), tuple(cdf), mean)
@@ -5,8 +5,16 @@ from typing import TYPE_CHECKING
 
 from astrbot.api import logger
 
+from .._types import flag_value  # type: ignore
+from ..prometheus import SAVE_IO_SECONDS  # type: ignore
+from ..registry import register_function  # type: ignore
+
 if TYPE_CHECKING:
     from ..parser import LoreParser
+    from ..template import Call
+
+# 旧版本的世界状态存档中保存随机数状态的键，加载时丢弃
+RNG_STATE_KEY = "__rng__"
 
 
 class SaveHandler:
@@ -43,14 +51,18 @@ class SaveHandler:
         """
         if not args:
             return "无参数"
+        if self.parser.dry_run:
+            return "试运行，未保存"
 
         try:
             match args:
                 case ["world"]:
-                    self._save_world_state()
+                    with SAVE_IO_SECONDS.time("save", "world"):
+                        self._save_world_state()
                     return "世界状态已保存"
                 case ["user"]:
-                    self._save_user_state()
+                    with SAVE_IO_SECONDS.time("save", "user"):
+                        self._save_user_state()
                     return "用户状态已保存"
                 case _:
                     return "未知参数"
@@ -73,10 +85,12 @@ class SaveHandler:
         try:
             match args:
                 case ["world"]:
-                    result = self._load_world_state()
+                    with SAVE_IO_SECONDS.time("load", "world"):
+                        result = self._load_world_state()
                     return result if result else "世界状态已加载"
                 case ["user"]:
-                    result = self._load_user_state()
+                    with SAVE_IO_SECONDS.time("load", "user"):
+                        result = self._load_user_state()
                     return result if result else "用户状态已加载"
                 case _:
                     return "未知参数"
@@ -88,21 +102,25 @@ class SaveHandler:
         """保存世界状态到文件"""
         try:
             world_state = self.parser._vars.get("world", {})
-            if not world_state:
-                logger.debug("世界状态为空，不保存")
-                return
 
             session_ps = self._get_session_ps()
             filename = f"{session_ps}_world_state.json"
             filepath = os.path.join(self.data_path, filename)
 
             logger.debug(f"保存世界状态到: {filepath}")
-            json_data = json.dumps(world_state, ensure_ascii=False, indent=2)
+            # 模板值以原始文本保存
+            json_data = json.dumps(
+                world_state, ensure_ascii=False, indent=2, default=str
+            )
 
             with open(filepath, "w", encoding="utf-8") as f:
                 f.write(json_data)
                 f.flush()
 
+            # 会话的随机数种子单独保存，用于回放对话记录
+            with open(self._seed_path(), "w", encoding="utf-8") as f:
+                json.dump({"seed": self.parser.seed}, f)
+
         except Exception as e:
             logger.error(f"保存世界状态时出错: {e}")
             raise
@@ -124,7 +142,10 @@ class SaveHandler:
             filepath = os.path.join(self.data_path, filename)
 
             logger.debug(f"保存用户状态到: {filepath}")
-            json_data = json.dumps(user_states, ensure_ascii=False, indent=2)
+            # 模板值以原始文本保存
+            json_data = json.dumps(
+                user_states, ensure_ascii=False, indent=2, default=str
+            )
 
             with open(filepath, "w", encoding="utf-8") as f:
                 f.write(json_data)
@@ -149,13 +170,37 @@ class SaveHandler:
                 content = f.read()
                 world_state = json.loads(content)
 
-            self.parser._vars["world"] = world_state
+            # 加载存档不恢复随机数状态，否则每次加载后的随机结果都会重复
+            world_state.pop(RNG_STATE_KEY, None)
+            self.parser._vars["world"] = {
+                key: flag_value(value) for key, value in world_state.items()
+            }
+            self.parser._var_handler._touch_all()
             return None
 
         except Exception as e:
             logger.error(f"加载世界状态时出错: {e}")
             raise
 
+    def _seed_path(self) -> str:
+        """随机数种子文件的路径"""
+        return os.path.join(self.data_path, f"{self._get_session_ps()}_seed.json")
+
+    def load_seed(self) -> int | None:
+        """读取保存世界状态时记录的随机数种子
+
+        只用于回放：以该种子新建解析器并送入相同的对话记录，可以得到相同的输出。
+        游戏内的 buildin::load 不会恢复种子。
+
+        Returns:
+            保存的种子，没有保存过时返回None
+        """
+        try:
+            with open(self._seed_path(), "r", encoding="utf-8") as f:
+                return int(json.load(f)["seed"])
+        except FileNotFoundError:
+            return None
+
     def _load_user_state(self) -> str:
         """加载用户状态"""
         try:
@@ -172,9 +217,24 @@ class SaveHandler:
                 user_states = json.loads(content)
 
             for key, value in user_states.items():
-                self.parser._vars[key] = value
+                self.parser._vars[key] = {
+                    name: flag_value(item) for name, item in value.items()
+                }
+            self.parser._var_handler._touch_all()
             return None
 
         except Exception as e:
             logger.error(f"加载用户状态时出错: {e}")
             raise
+
+
+def _load_oper(parser: "LoreParser", call: "Call", args: list) -> str:
+    return parser._save_handler.handle_load_oper(args)
+
+
+def _save_oper(parser: "LoreParser", call: "Call", args: list) -> str:
+    return parser._save_handler.handle_save_oper(args)
+
+
+register_function("buildin", "load", _load_oper, phase=1, pure=False)
+register_function("buildin", "save", _save_oper, phase=2, pure=False)
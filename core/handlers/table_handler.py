@@ -0,0 +1,49 @@
+from typing import TYPE_CHECKING
+
+from ..registry import register_function  # type: ignore
+
+if TYPE_CHECKING:
+    from ..parser import LoreParser
+    from ..template import Call, LazyArg
+
+
+class TableHandler:
+    """查找表处理器类，用于处理lorebook中tables块定义的查找表"""
+
+    def __init__(self, parser: "LoreParser"):
+        """初始化查找表处理器
+
+        Args:
+            parser: 解析器实例，用于读取编译后的查找表并渲染表项
+        """
+        self.parser: "LoreParser" = parser
+
+    def handle_table_oper(self, name: str, args: list["LazyArg"]) -> str:
+        """处理查找表操作 {table::name(key, default)}
+
+        Args:
+            name: 查找表名称
+            args: 操作参数列表，第一个参数为键，第二个参数为可选的默认值
+
+        Returns:
+            表项渲染后的内容，键不存在时返回默认值（若存在）
+        """
+        if not args:
+            return "参数错误"
+
+        table = self.parser._lorebook.tables.get(name)
+        if table is None:
+            return "未知查找表"
+
+        # 表项在加载lorebook时编译，查找时只渲染被选中的表项
+        template = table.get(args[0]())
+        if template is not None:
+            return self.parser._render(template)
+        return args[1]() if len(args) > 1 else ""
+
+
+def _table_oper(parser: "LoreParser", call: "Call", args: list) -> str:
+    return parser._table_handler.handle_table_oper(call.function, args)
+
+
+register_function("table", "*", _table_oper, lazy=True)
@@ -1,11 +1,15 @@
 from datetime import datetime
+from functools import lru_cache
 from typing import Any
 from typing import TYPE_CHECKING
 
 from dateutil import relativedelta
 
+from ..registry import REAL_TIME_REF, WORLD_TIME_REF, register_function  # type: ignore
+
 if TYPE_CHECKING:
     from ..parser import LoreParser
+    from ..template import Call, Template
 
 # 定义不同时间格式的格式化字符串
 TIME_FORMATS = {
@@ -17,6 +21,8 @@ TIME_FORMATS = {
     "hour": "%H",  # 小时格式
     "minute": "%M",  # 分钟格式
 }
+# 完整时间格式
+DEFAULT_FORMAT = "%Y-%m-%d %H:%M"
 
 
 class TimeHandler:
@@ -29,6 +35,29 @@ class TimeHandler:
             parser: 解析器实例，用于访问和修改当前时间
         """
         self.parser: "LoreParser" = parser
+        # 格式化结果缓存，键为格式，所有格式均精确到分钟，分钟变化时清空
+        self._format_cache: dict[str, str] = {}
+        self._format_minute: datetime | None = None
+        # 只读取时间的调用次数，用于判断条件求值是否只调用了读取时间的非纯函数
+        self.reads = 0
+
+    def _format(self, fmt: str = DEFAULT_FORMAT) -> str:
+        """格式化当前世界时间
+
+        Args:
+            fmt: 格式化字符串
+
+        Returns:
+            格式化后的时间
+        """
+        minute = self.parser._current_time.replace(second=0, microsecond=0)
+        if minute != self._format_minute:
+            self._format_cache.clear()
+            self._format_minute = minute
+        text = self._format_cache.get(fmt)
+        if text is None:
+            text = self._format_cache[fmt] = minute.strftime(fmt)
+        return text
 
     def handle_time_oper(self, args: list[str]) -> str:
         """处理时间相关操作
@@ -41,19 +70,23 @@ class TimeHandler:
         """
         # 如果没有参数，返回当前时间
         if not args:
-            return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
+            self.reads += 1
+            return self._format()
 
         arg = args[0]
         match arg:
             # 返回计算后的真实世界空闲时间
             case "real_idle":
+                self.reads += 1
                 return self._get_idle_duration(self.parser._real_idle)
             # 返回计算后的虚拟世界空闲时间
             case "world_idle":
+                self.reads += 1
                 return self._get_idle_duration(self.parser._world_idle)
             # 如果参数是预定义的时间格式，返回相应格式的时间
             case format_key if format_key in TIME_FORMATS:
-                return self.parser._current_time.strftime(TIME_FORMATS[format_key])
+                self.reads += 1
+                return self._format(TIME_FORMATS[format_key])
             # 如果参数以+或-开头，表示时间调整
             case delta if delta.startswith("+") or delta.startswith("-"):
                 positive = delta.startswith("+")
@@ -62,11 +95,11 @@ class TimeHandler:
             # 否则尝试将参数解析为完整时间字符串
             case time_str:
                 try:
-                    new_time = datetime.strptime(time_str, "%Y-%m-%d %H:%M")
+                    new_time = datetime.strptime(time_str, DEFAULT_FORMAT)
                     return self._set_time(new_time)
                 except ValueError:
                     # 如果解析失败，返回当前时间
-                    return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
+                    return self._format()
 
     def _set_time(self, new_time: datetime | str) -> str:
         """设置绝对时间
@@ -81,13 +114,13 @@ class TimeHandler:
             # 如果是datetime对象，直接设置
             case datetime() as dt:
                 self.parser._current_time = dt
-                return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
+                return self._format()
             # 如果是字符串，尝试解析为datetime
             case str() as time_str:
                 try:
-                    dt = datetime.strptime(time_str, "%Y-%m-%d %H:%M")
+                    dt = datetime.strptime(time_str, DEFAULT_FORMAT)
                     self.parser._current_time = dt
-                    return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
+                    return self._format()
                 except ValueError:
                     return "日期格式无效"
             case _:
@@ -117,34 +150,22 @@ class TimeHandler:
                         seconds=-delta.seconds,
                     )
                 self.parser._current_time += delta
-                return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
+                return self._format()
             # 如果是字符串，解析为时间增量
             case str() as delta_str:
+                delta = _parse_delta(delta_str, positive)
+                if delta is None:
+                    return "无效的时间增量格式"
+                if delta is INVALID_UNIT:
+                    return "无效的时间单位"
+                # 应用时间增量
                 try:
-                    # 解析格式：数字+单位，如"1Y"表示1年，"30m"表示30分钟
-                    amount, unit = delta_str[:-1], delta_str[-1]
-                    amount_i: int = int(amount) * (1 if positive else -1)
-                    # 根据单位创建相应的relativedelta对象
-                    match unit:
-                        case "Y":  # 年
-                            delta = relativedelta.relativedelta(years=amount_i)
-                        case "M":  # 月
-                            delta = relativedelta.relativedelta(months=amount_i)
-                        case "D":  # 日
-                            delta = relativedelta.relativedelta(days=amount_i)
-                        case "h":  # 小时
-                            delta = relativedelta.relativedelta(hours=amount_i)
-                        case "m":  # 分钟
-                            delta = relativedelta.relativedelta(minutes=amount_i)
-                        case _:
-                            return "无效的时间单位"
-                    # 应用时间增量
                     self.parser._current_time += delta
-                    self.parser._world_idle["before"] = self.parser._world_idle["after"]
-                    self.parser._world_idle["after"] = self.parser._current_time
-                    return self.parser._current_time.strftime("%Y-%m-%d %H:%M")
-                except (ValueError, IndexError):
+                except (ValueError, OverflowError):
                     return "无效的时间增量格式"
+                self.parser._world_idle["before"] = self.parser._world_idle["after"]
+                self.parser._world_idle["after"] = self.parser._current_time
+                return self._format()
             case _:
                 return "时间增量输入类型无效"
 
@@ -189,3 +210,57 @@ class TimeHandler:
         else:
             years = delta.years
             return f"{years}年{suffix}"
+
+
+# 时间单位对应的 relativedelta 参数名
+DELTA_UNITS = {
+    "Y": "years",  # 年
+    "M": "months",  # 月
+    "D": "days",  # 日
+    "h": "hours",  # 小时
+    "m": "minutes",  # 分钟
+}
+# 时间单位无效时 _parse_delta 的返回值
+INVALID_UNIT = relativedelta.relativedelta()
+
+
+@lru_cache(maxsize=256)
+def _parse_delta(
+    delta_str: str, positive: bool
+) -> relativedelta.relativedelta | None:
+    """解析时间增量，结果会被缓存
+
+    Args:
+        delta_str: 时间增量，格式为数字+单位，如"1Y"表示1年，"30m"表示30分钟
+        positive: 是否为正向调整
+
+    Returns:
+        relativedelta对象，格式无效时返回None，单位无效时返回 INVALID_UNIT
+    """
+    try:
+        amount, unit = delta_str[:-1], delta_str[-1]
+        amount_i: int = int(amount) * (1 if positive else -1)
+    except (ValueError, IndexError):
+        return None
+    if unit not in DELTA_UNITS:
+        return INVALID_UNIT
+    return relativedelta.relativedelta(**{DELTA_UNITS[unit]: amount_i})
+
+
+def _time_oper(parser: "LoreParser", call: "Call", args: list) -> str:
+    return parser._time_handler.handle_time_oper(args)
+
+
+def _time_reads(args: tuple["Template", ...]) -> list[str] | None:
+    """只读取时间的调用返回时间的伪变量引用，调整或设置时间的调用返回None"""
+    arg = args[0].literal if args else ""
+    if arg == "" or arg in TIME_FORMATS or arg == "world_idle":
+        return [WORLD_TIME_REF]
+    if arg == "real_idle":
+        return [REAL_TIME_REF]
+    return None
+
+
+register_function(
+    "buildin", "time", _time_oper, phase=1, pure=False, reads=_time_reads
+)
@@ -1,7 +1,14 @@
+import sys
+from dataclasses import dataclass
 from typing import Any, TYPE_CHECKING
 
+from .._types import TemplateValue  # type: ignore
+from ..condition import try_numeric  # type: ignore
+from ..registry import register_function  # type: ignore
+
 if TYPE_CHECKING:
     from ..parser import LoreParser
+    from ..template import Call, Template
 
 
 class VarHandler:
@@ -14,6 +21,26 @@ class VarHandler:
             parser: 解析器实例，用于解析占位符和存储变量数据
         """
         self.parser: "LoreParser" = parser
+        # 变量版本号，键为(作用域键, 变量名)，每次写入时更新
+        self.versions: dict[tuple[str, str], int] = {}
+        # 整体版本号，整个作用域被替换（如加载存档）时更新，使所有缓存失效
+        self.epoch = 0
+        self._version = 0
+        # 正在记录的变量读取，用于渲染缓存
+        self.read_log: list[tuple[str, str]] | None = None
+        # 已解析的作用域键，键为(用户ID, 作用域)
+        self._scope_keys: dict[tuple[str, str], str] = {}
+
+    def _touch(self, scope_key: str, var_name: str) -> None:
+        """更新变量版本号"""
+        self._version += 1
+        self.versions[(scope_key, var_name)] = self._version
+        self.parser._conditions.invalidate((scope_key, var_name))
+
+    def _touch_all(self) -> None:
+        """更新整体版本号"""
+        self.epoch += 1
+        self.parser._conditions.clear()
 
     def _get_scope_key(self, scope: str) -> str:
         """获取作用域键
@@ -24,13 +51,19 @@ class VarHandler:
         Returns:
             作用域键，全局作用域为"world"，用户作用域为"用户ID:作用域"
         """
-        scope = self.parser.parse_placeholder(scope)
-        scope_key = scope if scope == "world" else f"{self.parser.sender}:{scope}"
+        sender = self.parser.sender
+        scope_key = self._scope_keys.get((sender, scope))
+        if scope_key is not None:
+            return scope_key
 
+        scope_key = sys.intern(
+            scope if scope == "world" else f"{sender}:{scope}"
+        )
         # 如果作用域不存在，则创建并复制对应作用域的变量
         if scope_key not in self.parser._vars:
             self.parser._vars[scope_key] = self.parser._vars.get(scope, {}).copy()
 
+        self._scope_keys[(sender, scope)] = scope_key
         return scope_key
 
     def _parse_var_scope(self, var: str, default_scope: str) -> tuple[str, str]:
@@ -49,14 +82,19 @@ class VarHandler:
         return default_scope, var
 
     def handle_var_oper(
-        self, function: str, args: list[str], scope: str = "world"
+        self,
+        function: str,
+        args: list[str],
+        scope: str = "world",
+        refs: tuple["VarRef | int | float | None", ...] | None = None,
     ) -> str:
         """处理变量操作
 
         Args:
-            function: 操作类型，可选值: set(设置), get(获取), del(删除), add(加), sub(减), mul(乘), div(除)
+            function: 操作类型，可选值: set(设置), get(获取), del(删除), inc(自增), add(加), sub(减), mul(乘), div(除)
             args: 操作参数列表
             scope: 默认变量作用域，默认为"world"(全局)
+            refs: 编译期解析的参数，常量变量引用为 VarRef，数字常量为数值，其余为None
 
         Returns:
             操作结果字符串
@@ -67,32 +105,45 @@ class VarHandler:
         match (function, len(args)):
             case ("set", n) if n >= 2:
                 # 设置变量值
-                target_scope, var_name = self._parse_var_scope(args[0], scope)
+                target_scope, var_name = self._resolve_ref(args, refs, 0, scope)
                 value = args[1]
-                return self._set_var(var_name, value, target_scope)
+                return format_value(self._set_var(var_name, value, target_scope))
 
             case ("get", 1):
                 # 获取变量值
-                target_scope, var_name = self._parse_var_scope(args[0], scope)
-                return str(self._get_var(var_name, target_scope))
+                target_scope, var_name = self._resolve_ref(args, refs, 0, scope)
+                return format_value(self._get_var(var_name, target_scope))
 
             case ("del", 1):
                 # 删除变量
-                target_scope, var_name = self._parse_var_scope(args[0], scope)
+                target_scope, var_name = self._resolve_ref(args, refs, 0, scope)
                 self._del_var(var_name, target_scope)
                 return ""
 
+            case ("inc", 1 | 2):
+                # 原地自增，增量默认为1
+                target_scope, var_name = self._resolve_ref(args, refs, 0, scope)
+                amount = (
+                    self._get_num(args[1], scope, self._const(refs, 1))
+                    if len(args) == 2
+                    else 1
+                )
+                if not is_number(amount):
+                    return "增量必须是数字"
+                result = self._inc_var(var_name, amount, target_scope)
+                return "变量不是数字" if result is None else format_value(result)
+
             case ("add" | "sub" | "mul" | "div", 2):
                 # 数学运算
-                x_scope, x_var = self._parse_var_scope(args[0], scope)
-                y_scope, y_var = self._parse_var_scope(args[1], scope)
+                x_scope, x_var = self._resolve_ref(args, refs, 0, scope)
+                y_scope, y_var = self._resolve_ref(args, refs, 1, scope)
 
-                x = self._get_num(x_var, x_scope)
-                y = self._get_num(y_var, y_scope)
+                x = self._get_num(x_var, x_scope, self._const(refs, 0))
+                y = self._get_num(y_var, y_scope, self._const(refs, 1))
 
                 # 如果不是数字，则进行字符串拼接
-                if not (isinstance(x, (int, float)) and isinstance(y, (int, float))):
-                    return f"{str(x)}{str(y)}"
+                if not (is_number(x) and is_number(y)):
+                    return f"{format_value(x)}{format_value(y)}"
 
                 # 执行相应的数学运算
                 match function:
@@ -112,6 +163,39 @@ class VarHandler:
             case _:
                 return "参数错误"
 
+    def _resolve_ref(
+        self,
+        args: list[str],
+        refs: tuple["VarRef | int | float | None", ...] | None,
+        index: int,
+        default_scope: str,
+    ) -> tuple[str, str]:
+        """获取第 index 个参数对应的(作用域, 变量名)，优先使用编译期解析结果"""
+        ref = refs[index] if refs and index < len(refs) else None
+        if type(ref) is VarRef:
+            return ref.scope or default_scope, ref.name
+        return self._parse_var_scope(args[index], default_scope)
+
+    def _const(
+        self, refs: tuple["VarRef | int | float | None", ...] | None, index: int
+    ) -> int | float | None:
+        """获取第 index 个参数在编译期转换的数字常量"""
+        ref = refs[index] if refs and index < len(refs) else None
+        return ref if is_number(ref) else None  # type: ignore[return-value]
+
+    def lookup(self, ref: str) -> int | float | str:
+        """按"scope.name"形式的引用读取变量，供条件表达式直接绑定
+
+        Args:
+            ref: 变量引用，格式可以是"scope.name"或"name"
+
+        Returns:
+            数字变量返回数值，其余返回字符串形式
+        """
+        target_scope, var_name = self._parse_var_scope(ref, "world")
+        value = self._get_var(var_name, target_scope)
+        return value if is_number(value) else format_value(value)
+
     def _get_var(self, var_name: str, scope: str = "world") -> Any:
         """获取变量值
 
@@ -122,13 +206,16 @@ class VarHandler:
         Returns:
             变量值，如果变量不存在则返回空字符串
         """
-        var_name = self.parser.parse_placeholder(var_name)
         scope_key = self._get_scope_key(scope)
-        return self.parser.parse_placeholder(
-            self.parser._vars[scope_key].get(var_name, "")
-        )
+        if self.read_log is not None:
+            self.read_log.append((scope_key, var_name))
+        value = self.parser._vars[scope_key].get(var_name, "")
+        # 只有写入时被标记为模板的值才需要渲染
+        if type(value) is TemplateValue:
+            return self.parser._render(value.template)
+        return value
 
-    def _set_var(self, var_name: str, value: Any, scope: str = "world") -> str:
+    def _set_var(self, var_name: str, value: Any, scope: str = "world") -> Any:
         """设置变量值
 
         Args:
@@ -137,14 +224,43 @@ class VarHandler:
             scope: 变量作用域，默认为"world"(全局)
 
         Returns:
-            设置的变量值
+            设置的变量值，数字字符串会以数值形式保存
         """
-        var_name = self.parser.parse_placeholder(var_name)
-        value = self.parser.parse_placeholder(str(value))
+        # 参数在传入前已渲染，按普通值保存
+        if type(value) is str:
+            value = parse_value(value)
         scope_key = self._get_scope_key(scope)
         self.parser._vars[scope_key][var_name] = value
+        self._touch(scope_key, var_name)
         return value
 
+    def _inc_var(
+        self, var_name: str, amount: int | float, scope: str = "world"
+    ) -> int | float | None:
+        """原地自增变量，未定义的变量视为0
+
+        Args:
+            var_name: 变量名
+            amount: 增量
+            scope: 变量作用域，默认为"world"(全局)
+
+        Returns:
+            自增后的值，变量不是数字时返回None
+        """
+        scope_key = self._get_scope_key(scope)
+        variables = self.parser._vars[scope_key]
+        current = variables.get(var_name, 0)
+        # 模板值先渲染，与 get/add 读取到的值一致
+        if type(current) is TemplateValue:
+            current = self.parser._render(current.template)
+        if not is_number(current):
+            current = try_numeric(format_value(current).strip() or "0")
+            if not is_number(current):
+                return None
+        variables[var_name] = current + amount
+        self._touch(scope_key, var_name)
+        return variables[var_name]
+
     def _del_var(self, var_name: str, scope: str = "world") -> None:
         """删除变量
 
@@ -152,11 +268,13 @@ class VarHandler:
             var_name: 变量名
             scope: 变量作用域，默认为"world"(全局)
         """
-        var_name = self.parser.parse_placeholder(var_name)
         scope_key = self._get_scope_key(scope)
         self.parser._vars[scope_key].pop(var_name, None)
+        self._touch(scope_key, var_name)
 
-    def _get_num(self, arg: str, scope: str = "world") -> int | float | str:
+    def _get_num(
+        self, arg: str, scope: str = "world", const: int | float | None = None
+    ) -> Any:
         """获取数字值
 
         尝试将参数转换为数字，如果失败则尝试获取同名变量的值并转换
@@ -164,18 +282,139 @@ class VarHandler:
         Args:
             arg: 数字字面量或变量名
             scope: 变量作用域，默认为"world"(全局)
+            const: 编译期已转换的数字常量
 
         Returns:
-            数字值或原始字符串
+            数字值或原始值
         """
+        if const is not None:
+            return const
+        num = try_numeric(arg)
+        if is_number(num):
+            return num
+        val = self._get_var(arg, scope)
+        # 数值变量直接返回，无需字符串转换
+        if is_number(val):
+            return val
+        num = try_numeric(format_value(val))
+        if is_number(num):
+            return num
+        return val if val != "" else arg
+
+
+@dataclass(slots=True, frozen=True)
+class VarRef:
+    """编译期解析的变量引用，作用域为None时使用默认作用域"""
+
+    scope: str | None
+    name: str
+
+
+def _parse_ref(arg: "Template") -> "VarRef | int | float | None":
+    """在编译期解析常量参数
+
+    Returns:
+        数字常量返回数值，其余常量返回 VarRef，含占位符时返回None
+    """
+    literal = arg.literal
+    if literal is None:
+        return None
+    num = try_numeric(literal)
+    if is_number(num):
+        return num  # type: ignore[return-value]
+    if "." in literal:
+        scope_name, var_name = literal.split(".", 1)
+        return VarRef(sys.intern(scope_name), sys.intern(var_name))
+    return VarRef(None, sys.intern(literal))
+
+
+def _prepare_refs(args: tuple["Template", ...]) -> tuple:
+    return tuple(_parse_ref(arg) for arg in args)
+
+
+def is_number(value: Any) -> bool:
+    """判断值是否为数字（不包括布尔值）"""
+    return type(value) is int or type(value) is float
+
+
+def parse_value(text: str) -> int | float | str:
+    """将设置的文本转换为变量值
+
+    只有规范形式的数字（如"10"、"2.5"）会以数值保存，"007"、"1.50"等保持原样，
+    保证读取时得到的文本与写入时一致。
+
+    Args:
+        text: 渲染后的文本
+
+    Returns:
+        整数、浮点数或原始字符串
+    """
+    num = try_numeric(text)
+    if is_number(num) and str(num) == text:
+        return num
+    return text
+
+
+def format_value(value: Any) -> str:
+    """将变量值转换为渲染用的字符串
+
+    Args:
+        value: 变量值
+
+    Returns:
+        字符串形式，列表以逗号连接，None为空字符串
+    """
+    if type(value) is str:
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ",".join(format_value(item) for item in value)
+    return str(value)
+
+
+def _var_ref(arg: "Template") -> str | None:
+    """将常量参数转换为"scope.name"形式的变量引用"""
+    ref = arg.literal
+    if ref is None:
+        return None
+    return ref if "." in ref else f"world.{ref}"
+
+
+def _get_reads(args: tuple["Template", ...]) -> list[str] | None:
+    ref = _var_ref(args[0]) if len(args) == 1 else None
+    return None if ref is None else [ref]
+
+
+def _math_reads(args: tuple["Template", ...]) -> list[str] | None:
+    refs = []
+    for arg in args:
+        literal = arg.literal
+        if literal is None:
+            return None
+        # 数字字面量不读取变量
         try:
-            # 尝试转换为整数或浮点数
-            num = float(arg)
-            return int(num) if num.is_integer() else num
-        except (ValueError, TypeError):
-            val = self._get_var(arg, scope)
-            try:
-                num = float(val)
-                return int(num) if num.is_integer() else num
-            except (ValueError, TypeError):
-                return val if val != "" else arg
+            float(literal)
+        except ValueError:
+            refs.append(_var_ref(arg))
+    return refs
+
+
+def _var_oper(parser: "LoreParser", call: "Call", args: list) -> str:
+    return parser._var_handler.handle_var_oper(call.function, args, refs=call.data)
+
+
+register_function(
+    "var", "set", _var_oper, phase=2, pure=False, prepare=_prepare_refs
+)
+register_function("var", "del", _var_oper, pure=False, prepare=_prepare_refs)
+register_function(
+    "var", "inc", _var_oper, phase=2, pure=False, prepare=_prepare_refs
+)
+register_function(
+    "var", "get", _var_oper, reads=_get_reads, prepare=_prepare_refs
+)
+for _name in ("add", "sub", "mul", "div"):
+    register_function(
+        "var", _name, _var_oper, reads=_math_reads, prepare=_prepare_refs
+    )
@@ -0,0 +1,158 @@
+from datetime import datetime
+from typing import Any
+
+from astrbot.api import logger
+
+from ._types import RESPONSE_POSITIONS, Trigger, flag_value  # type: ignore
+from .matcher import TriggerIndex  # type: ignore
+from .template import Template, compile_template, iter_calls  # type: ignore
+
+
+class Lorebook:
+    """编译后的lorebook
+
+    在加载时编译一次，由所有会话的解析器共享，不保存任何会话状态。
+    """
+
+    __slots__ = (
+        "data",
+        "world_state",
+        "user_state",
+        "triggers",
+        "trigger_map",
+        "index",
+        "notes",
+        "tables",
+        "world_time",
+        "responds",
+    )
+
+    def __init__(self, data: dict[str, Any]):
+        """编译lorebook配置
+
+        Args:
+            data: Lorebook配置字典
+        """
+        self.data = data
+        # 初始状态中含有占位符的值在此标记，读取时才需要渲染
+        self.world_state: dict[str, Any] = {
+            key: flag_value(value)
+            for key, value in (data.get("world_state") or {}).items()
+        }
+        self.user_state: dict[str, dict[str, Any]] = {
+            item["name"]: {
+                key: flag_value(value)
+                for key, value in (item.get("variables") or {}).items()
+            }
+            for item in data.get("user_state", [])
+        }
+        # 世界时间只在加载时解析一次
+        self.world_time: datetime | None = None
+        world_time = self.world_state.get("world_time")
+        if world_time is not None:
+            try:
+                self.world_time = datetime.strptime(str(world_time), "%Y-%m-%d %H:%M")
+            except ValueError:
+                logger.warning(f"lorebook | world_time 格式无效: {world_time}")
+
+        # 按优先级排序触发器
+        self.triggers: list[Trigger] = sorted(
+            [
+                Trigger(
+                    name=t.get("name", ""),
+                    type=t.get("type", "keywords"),
+                    match=t.get("match"),
+                    conditional=t.get("conditional"),
+                    priority=t.get("priority", 0),
+                    block=t.get("block", False),
+                    probability=t.get("probability", 1.0),
+                    use_logic=t.get("use_logic", True),
+                    position=t.get("position", "sys_start"),
+                    content=t.get("content", ""),
+                    actions=t.get("actions", []),
+                    max_trig=t.get("max_trig", -1),
+                    match_on=t.get("match_on", "text"),
+                )
+                for t in data.get("trigger", [])
+            ],
+            key=lambda trigger: -trigger.priority,
+        )
+        # 按名称索引触发器，同名时保留优先级最高的
+        self.trigger_map: dict[str, Trigger] = {}
+        for order, trigger in enumerate(self.triggers):
+            trigger.order = order
+            self.trigger_map.setdefault(trigger.name, trigger)
+        # 共享的匹配索引，一次扫描得到所有匹配的触发器
+        self.index = TriggerIndex(self.triggers)
+
+        # 初始化作者注释
+        self.notes: list[Trigger] = [
+            Trigger(
+                content=note.get("content", ""),
+                probability=note.get("probability", 1.0),
+                position=note.get("position", "sys_start"),
+            )
+            for note in data.get("authors_note", [])
+        ]
+        # 是否有需要处理LLM回复的触发器或作者注释
+        self.responds = self.index.responds or any(
+            note.position in RESPONSE_POSITIONS for note in self.notes
+        )
+
+        # 编译查找表
+        self.tables: dict[str, dict[str, Template]] = {
+            str(name): {
+                str(key): compile_template(str(value))
+                for key, value in (table or {}).items()
+            }
+            for name, table in (data.get("tables") or {}).items()
+        }
+
+        for name in sorted(self.unknown_functions()):
+            logger.warning(f"lorebook | 未知的占位符函数: {name}")
+        self._check_actions()
+
+    def _check_actions(self) -> None:
+        """检查跨越消息与回复阶段的动作
+
+        回复触发器只在处理LLM回复时执行，此时其余位置的结果已经注入，反之亦然，
+        这样的动作在执行时会被跳过。
+        """
+        for trigger in self.triggers:
+            response = trigger.position in RESPONSE_POSITIONS
+            for action in trigger.action_templates:
+                target = self.trigger_map.get(action.literal or "")
+                if target is not None and (
+                    target.position in RESPONSE_POSITIONS
+                ) != response:
+                    logger.warning(
+                        f"lorebook | 触发器 {trigger.name} 的动作 {target.name} "
+                        f"位于 {target.position}，与触发器不在同一阶段，不会执行"
+                    )
+
+    def templates(self):
+        """遍历lorebook中的所有模板
+
+        Yields:
+            编译后的模板
+        """
+        for trigger in self.triggers + self.notes:
+            yield trigger.template
+            yield from trigger.action_templates
+            if trigger.conditional:
+                yield compile_template(trigger.conditional)
+        for table in self.tables.values():
+            yield from table.values()
+
+    def unknown_functions(self) -> set[str]:
+        """查找lorebook中使用了但未注册的占位符函数
+
+        Returns:
+            未知函数名集合，如 {"weather::now"}
+        """
+        return {
+            f"{call.namespace}::{call.function}"
+            for template in self.templates()
+            for call in iter_calls(template)
+            if call.spec is None
+        }
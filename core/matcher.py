@@ -0,0 +1,350 @@
+import re
+from collections.abc import Sequence
+
+from astrbot.api import logger
+
+from ._types import RESPONSE_POSITIONS, Trigger  # type: ignore
+from .normalize import (  # type: ignore
+    Message,
+    check_forms,
+    fold,
+    normalize_form,
+    to_simplified,
+)
+from .stream import StreamAutomaton, parse_expression  # type: ignore
+
+# 编译后的逻辑表达式：(其余必须出现的关键词编号, 排除组, 所属触发器)
+Expression = tuple[tuple[int, ...], tuple[tuple[int, ...], ...], list[int]]
+
+
+def split_args(args_str: str) -> list[str]:
+    """切分参数字符串，支持引号保护。
+
+    Args:
+        args_str: 参数字符串，如 'a, "b,c", d'
+
+    Returns:
+        参数列表，如 ['a', 'b,c', 'd']
+    """
+    args = []
+    current: list[str] = []
+    in_quotes = False
+    quote_char = None
+
+    args_str = args_str.strip()
+    if args_str.startswith("[") and args_str.endswith("]"):
+        args_str = args_str[1:-1]
+
+    for c in args_str:
+        if c in "\"'" and not in_quotes:
+            in_quotes = True
+            quote_char = c
+        elif c == quote_char and in_quotes:
+            in_quotes = False
+            quote_char = None
+        elif c == "," and not in_quotes:
+            args.append("".join(current).strip())
+            current = []
+        else:
+            current.append(c)
+
+    # 确保添加最后一个参数
+    if current:
+        args.append("".join(current).strip())
+
+    # 如果解析结束时仍在引号内，记录警告
+    if in_quotes:
+        logger.warning(f"引号不匹配: {args_str}")
+
+    # 移除每个参数可能残留的首尾引号
+    for i in range(len(args)):
+        arg = args[i]
+        if (arg.startswith('"') and arg.endswith('"')) or (
+            arg.startswith("'") and arg.endswith("'")
+        ):
+            args[i] = arg[1:-1]
+
+    return args
+
+
+class TriggerIndex:
+    """触发器的共享匹配索引
+
+    所有关键词触发器的逻辑表达式拆分为关键词，每种匹配形式合并为一个自动机，
+    关键词预先转换为触发器的匹配形式，正则表达式在加载时编译。
+    一次扫描即可得到本条消息可能触发的触发器集合，无需逐个触发器构建匹配器。
+    位于 res_start/res_end 的回复触发器只匹配LLM回复，回复可以分段增量扫描。
+    随lorebook编译一次，由所有会话共享。
+    """
+
+    __slots__ = (
+        "size",
+        "listeners",
+        "response_listeners",
+        "responds",
+        "simplified",
+        "_regexes",
+        "_response_regexes",
+        "_streams",
+        "_expressions",
+    )
+
+    def __init__(self, triggers: Sequence[Trigger]):
+        """编译触发器的匹配规则
+
+        Args:
+            triggers: 按优先级排序的触发器，集合中的元素为其下标
+        """
+        self.size = len(triggers)
+        # 监听器在有消息（回复）时总是候选
+        self.listeners: frozenset[int] = frozenset(
+            i
+            for i, trigger in enumerate(triggers)
+            if trigger.type == "listener" and trigger.position not in RESPONSE_POSITIONS
+        )
+        self.response_listeners: frozenset[int] = frozenset(
+            i
+            for i, trigger in enumerate(triggers)
+            if trigger.type == "listener" and trigger.position in RESPONSE_POSITIONS
+        )
+        # 逻辑表达式到所属触发器的映射，键为(匹配形式, 是否启用逻辑表达式, 是否为回复触发器)
+        owners: dict[tuple[str, bool, bool], dict[str, list[int]]] = {}
+        # 正则表达式按原样匹配对应形式的消息
+        self._regexes: list[tuple[int, re.Pattern, str]] = []
+        self._response_regexes: list[tuple[int, re.Pattern, str]] = []
+
+        forms: set[str] = set()
+        for i, trigger in enumerate(triggers):
+            if not trigger.match:
+                continue
+            form = trigger.match_on
+            response = trigger.position in RESPONSE_POSITIONS
+            if trigger.type == "keywords":
+                group = owners.setdefault((form, trigger.use_logic, response), {})
+                for keyword in set(split_args(trigger.match)):
+                    group.setdefault(normalize_form(keyword, form), []).append(i)
+                forms.add(form)
+            elif trigger.type == "regex":
+                try:
+                    pattern = re.compile(trigger.match)
+                except re.error as e:
+                    logger.warning(f"无效的正则表达式: {trigger.match}, 错误: {e}")
+                    continue
+                regexes = self._response_regexes if response else self._regexes
+                regexes.append((i, pattern, form))
+                forms.add(form)
+        check_forms(forms)
+        # 是否有触发器匹配繁转简形式，消息只在需要时计算该形式
+        self.simplified = "simplified" in forms
+        self._build(owners, triggers)
+        # 是否有需要匹配LLM回复的触发器，没有时不必处理回复
+        self.responds = bool(
+            self.response_listeners
+            or self._response_regexes
+            or any(response for _, response in self._expressions)
+        )
+
+    def _build(
+        self,
+        owners: dict[tuple[str, bool, bool], dict[str, list[int]]],
+        triggers: Sequence[Trigger],
+    ) -> None:
+        """构建各匹配形式的自动机与逻辑表达式
+
+        自动机报告所有出现的关键词（包括相互重叠的关键词），逻辑表达式逐条求值，
+        结果与逐个触发器构建匹配器时一致，不受其他触发器的关键词影响。
+        含有无效表达式的触发器整体不参与匹配。
+        """
+        terms: dict[str, set[str]] = {}
+        parsed = []
+        for (form, use_logic, response), group in owners.items():
+            invalid: set[int] = set()
+            for keyword, indexes in group.items():
+                positive, negative = parse_expression(keyword, use_logic)
+                if not positive:
+                    invalid.update(indexes)
+                    continue
+                terms.setdefault(form, set()).update(positive, *negative)
+                parsed.append((form, positive, negative, response, indexes))
+            for i in sorted(invalid):
+                logger.warning(
+                    f"关键词匹配器错误: 无效的表达式, 关键词: {triggers[i].match}"
+                )
+            if invalid:
+                parsed = [
+                    (form, positive, negative, response, kept)
+                    for form, positive, negative, response, indexes in parsed
+                    if (kept := [i for i in indexes if i not in invalid])
+                ]
+
+        self._streams: dict[str, StreamAutomaton] = {
+            form: StreamAutomaton(sorted(form_terms))
+            for form, form_terms in terms.items()
+        }
+        ids = {
+            form: {term: term_id for term_id, term in enumerate(automaton.terms)}
+            for form, automaton in self._streams.items()
+        }
+        # 逻辑表达式按第一个必须出现的关键词索引，只有该关键词出现时才求值，
+        # 键为(匹配形式, 是否为回复触发器)
+        self._expressions: dict[tuple[str, bool], dict[int, list[Expression]]] = {}
+        for form, positive, negative, response, indexes in parsed:
+            term_ids = [ids[form][term] for term in positive]
+            groups = tuple(
+                tuple(ids[form][term] for term in group) for group in negative
+            )
+            watched = self._expressions.setdefault((form, response), {})
+            watched.setdefault(term_ids[0], []).append(
+                (tuple(term_ids[1:]), groups, indexes)
+            )
+
+    def _evaluate(self, seen: dict[str, set[int]], response: bool) -> set[int]:
+        """按各形式出现的关键词求值逻辑表达式
+
+        Args:
+            seen: 各匹配形式出现的关键词编号
+            response: 求值回复触发器还是消息触发器
+
+        Returns:
+            匹配的触发器下标
+        """
+        found: set[int] = set()
+        for form, terms in seen.items():
+            watched = self._expressions.get((form, response))
+            if not watched:
+                continue
+            for term in terms:
+                for positive, negative, indexes in watched.get(term, ()):
+                    if all(t in terms for t in positive) and not any(
+                        all(t in terms for t in group) for group in negative
+                    ):
+                        found.update(indexes)
+        return found
+
+    def _scan(self, message: Message) -> frozenset[int]:
+        """扫描单条消息匹配的触发器，不含监听器"""
+        seen: dict[str, set[int]] = {}
+        for form, automaton in self._streams.items():
+            automaton.step(0, message.form(form), seen.setdefault(form, set()))
+        found = self._evaluate(seen, False)
+        for i, pattern, form in self._regexes:
+            if i not in found and pattern.search(message.form(form)):
+                found.add(i)
+        return frozenset(found)
+
+    def candidates(self, messages: Sequence[Message]) -> set[int]:
+        """扫描消息，返回匹配的触发器
+
+        Args:
+            messages: 消息列表
+
+        Returns:
+            匹配任意一条消息的触发器下标
+        """
+        return self.candidates_batch((messages,))[0]
+
+    def candidates_batch(
+        self, windows: Sequence[Sequence[Message]]
+    ) -> list[set[int]]:
+        """批量扫描多个会话的消息
+
+        每条消息只在首次出现时扫描，结果保存在消息记录中，留在窗口中的消息无需重新扫描。
+        索引只读，可以在工作线程中调用。
+
+        Args:
+            windows: 各会话的消息列表
+
+        Returns:
+            与 windows 一一对应的匹配触发器下标
+        """
+        results = []
+        for window in windows:
+            found: set[int] = set()
+            for message in window:
+                scanned = message.candidates
+                if scanned is None:
+                    scanned = message.candidates = self._scan(message)
+                found |= scanned
+            if window:
+                found |= self.listeners
+            results.append(found)
+        return results
+
+    def scan_response(self) -> "ResponseScanner":
+        """开始流式扫描一条LLM回复"""
+        return ResponseScanner(self)
+
+
+class ResponseScanner:
+    """LLM回复的流式扫描器
+
+    回复的每个分段到达时规范化空白并转换为各匹配形式，自动机状态在分段之间保存，
+    回复结束时不需要再次扫描全文。正则表达式无法增量匹配，在结束时对全文匹配。
+    """
+
+    __slots__ = ("_index", "_states", "_seen", "_parts", "_space")
+
+    def __init__(self, index: TriggerIndex):
+        self._index = index
+        self._states: dict[str, int] = dict.fromkeys(index._streams, 0)
+        self._seen: dict[str, set[int]] = {form: set() for form in index._streams}
+        # 各形式已规范化的分段
+        self._parts: dict[str, list[str]] = {"text": [], "fold": [], "simplified": []}
+        # 上一个分段是否以空白结尾
+        self._space = False
+
+    def feed(self, chunk: str) -> None:
+        """扫描回复的一个分段
+
+        空白的规范化与 " ".join(text.split()) 一致：连续空白合并为一个空格，
+        并去除首尾空白。
+
+        Args:
+            chunk: 新到达的文本
+        """
+        words = chunk.split()
+        if not words:
+            self._space = self._space or bool(chunk)
+            return
+        text = " ".join(words)
+        if self._parts["text"] and (self._space or chunk[0].isspace()):
+            text = " " + text
+        self._space = chunk[-1].isspace()
+
+        index = self._index
+        folded = fold(text)
+        simplified = to_simplified(folded) if index.simplified else folded
+        forms = {"text": text, "fold": folded, "simplified": simplified}
+        for form, part in forms.items():
+            self._parts[form].append(part)
+        for form, automaton in index._streams.items():
+            self._states[form] = automaton.step(
+                self._states[form], forms[form], self._seen[form]
+            )
+
+    def finish(self) -> tuple[Message, set[int]]:
+        """结束扫描
+
+        Returns:
+            (回复的消息记录，已填写匹配的消息触发器, 匹配的回复触发器下标)
+        """
+        index = self._index
+        message = Message(
+            "".join(self._parts["text"]),
+            "".join(self._parts["fold"]),
+            "".join(self._parts["simplified"]) if index.simplified else None,
+        )
+
+        found = index._evaluate(self._seen, False)
+        response = index._evaluate(self._seen, True)
+        for i, pattern, form in index._regexes:
+            if i not in found and pattern.search(message.form(form)):
+                found.add(i)
+        for i, pattern, form in index._response_regexes:
+            if i not in response and pattern.search(message.form(form)):
+                response.add(i)
+        if message.text:
+            response |= index.response_listeners
+
+        message.candidates = frozenset(found)
+        return message, response
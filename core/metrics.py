@@ -0,0 +1,152 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+# 触发器筛选流水线的阶段，按执行顺序排列；除"通过"外，计数为该阶段淘汰的触发器数
+PIPELINE_STAGES = {
+    "max_trig": "次数上限",
+    "match": "匹配",
+    "probability": "概率",
+    "condition": "条件",
+    "passed": "通过",
+}
+
+
+@dataclass(slots=True)
+class TriggerStats:
+    """单个触发器（或作者注释）的统计数据，时间单位为秒"""
+
+    evaluations: int = 0  # 检查触发条件的次数
+    probability_skips: int = 0  # 因概率未通过而跳过的次数
+    condition_rejects: int = 0  # 条件表达式不成立的次数
+    condition_hits: int = 0  # 条件结果来自缓存、无需重新求值的次数
+    match_hits: int = 0  # 消息匹配成功的次数
+    fires: int = 0  # 实际触发（渲染内容）的次数，包括由动作调用的触发
+    blocks: int = 0  # 触发后阻止后续触发器的次数
+    condition_time: float = 0.0
+    render_time: float = 0.0
+    # 各注入位置累计注入的字节数
+    injected_bytes: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_time(self) -> float:
+        return self.condition_time + self.render_time
+
+
+class TriggerMetrics:
+    """触发器统计，由所有会话共享
+
+    采样模式下每 sample_every 条消息统计一次，未被采样的消息不产生额外开销。
+    """
+
+    __slots__ = (
+        "stats",
+        "sample_every",
+        "messages",
+        "sampled_messages",
+        "stages",
+        "scan_time",
+    )
+
+    def __init__(self, sample_every: int = 1):
+        """初始化触发器统计
+
+        Args:
+            sample_every: 采样间隔，1表示统计每条消息，0表示关闭统计
+        """
+        self.stats: dict[str, TriggerStats] = {}
+        self.sample_every = max(0, sample_every)
+        self.messages = 0
+        self.sampled_messages = 0
+        # 筛选流水线各阶段的计数，以及扫描消息得到候选触发器的耗时
+        self.stages: dict[str, int] = dict.fromkeys(PIPELINE_STAGES, 0)
+        self.scan_time = 0.0
+
+    def sample(self) -> bool:
+        """记录一条消息，并判断是否统计该消息
+
+        Returns:
+            是否统计该消息
+        """
+        if not self.sample_every:
+            return False
+        self.messages += 1
+        if self.messages % self.sample_every:
+            return False
+        self.sampled_messages += 1
+        return True
+
+    def trigger(self, name: str) -> TriggerStats:
+        """获取触发器的统计数据，不存在时创建"""
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = TriggerStats()
+        return stats
+
+    def reset(self) -> None:
+        """清空统计数据"""
+        self.stats.clear()
+        self.messages = 0
+        self.sampled_messages = 0
+        self.stages = dict.fromkeys(PIPELINE_STAGES, 0)
+        self.scan_time = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        """导出为可序列化为JSON的字典"""
+        return {
+            "sample_every": self.sample_every,
+            "messages": self.messages,
+            "sampled_messages": self.sampled_messages,
+            "stages": dict(self.stages),
+            "scan_time": self.scan_time,
+            "triggers": {name: asdict(stats) for name, stats in self.stats.items()},
+        }
+
+    def dump_json(self, path: str) -> None:
+        """将统计数据写入JSON文件
+
+        Args:
+            path: 文件路径
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def summary(self, limit: int = 10) -> str:
+        """生成按总耗时排序的统计摘要
+
+        Args:
+            limit: 最多列出的触发器数量
+
+        Returns:
+            摘要文本
+        """
+        if not self.sample_every:
+            return "触发器统计未开启"
+        lines = [
+            f"已统计消息: {self.sampled_messages}/{self.messages}"
+            f"（每{self.sample_every}条采样一次）",
+            "流水线: "
+            + " ".join(
+                f"{label}{self.stages[stage]}"
+                for stage, label in PIPELINE_STAGES.items()
+            )
+            + f" | 扫描{self.scan_time * 1000:.2f}ms",
+        ]
+        ranked = sorted(
+            self.stats.items(), key=lambda item: item[1].total_time, reverse=True
+        )
+        for name, s in ranked[:limit]:
+            injected = sum(s.injected_bytes.values())
+            lines.append(
+                f"- {name}: 检查{s.evaluations} 概率跳过{s.probability_skips} "
+                f"条件拒绝{s.condition_rejects} 条件缓存{s.condition_hits} "
+                f"匹配{s.match_hits} "
+                f"触发{s.fires} 阻止{s.blocks} | "
+                f"条件{s.condition_time * 1000:.2f}ms "
+                f"渲染{s.render_time * 1000:.2f}ms | 注入{injected}B"
+            )
+        if len(ranked) > limit:
+            lines.append(f"……共{len(ranked)}项")
+        return "\n".join(lines)
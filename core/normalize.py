@@ -0,0 +1,89 @@
+import unicodedata
+from dataclasses import dataclass, field
+
+from astrbot.api import logger
+
+try:
+    from opencc import OpenCC
+
+    _t2s = OpenCC("t2s").convert
+except ImportError:  # opencc 为可选依赖，缺失时 simplified 与 fold 相同
+    _t2s = None
+
+# 触发器可选的匹配形式：原文、大小写与全半角折叠、折叠后再繁转简
+MATCH_FORMS = ("text", "fold", "simplified")
+
+
+def fold(text: str) -> str:
+    """大小写与全半角折叠
+
+    NFKC 将全角字母、数字与符号转换为半角，半角片假名转换为全角，
+    再统一转换为小写。
+
+    Args:
+        text: 原文
+
+    Returns:
+        折叠后的文本
+    """
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def to_simplified(text: str) -> str:
+    """繁体转简体，未安装 opencc 时原样返回"""
+    return _t2s(text) if _t2s is not None else text
+
+
+def normalize_form(text: str, form: str) -> str:
+    """将文本转换为指定的匹配形式，用于关键词与消息的预处理"""
+    if form == "text":
+        return text
+    if form == "simplified":
+        return to_simplified(fold(text))
+    return fold(text)
+
+
+def check_forms(forms: set[str]) -> None:
+    """检查lorebook使用的匹配形式是否可用"""
+    if "simplified" in forms and _t2s is None:
+        logger.warning("lorebook | 未安装 opencc，match_on: simplified 不会转换繁体")
+
+
+@dataclass(slots=True)
+class Message:
+    """消息窗口中的一条消息，保存原文与预先计算的匹配形式
+
+    每条消息只在加入窗口时计算一次，所有触发器共用。
+    """
+
+    text: str
+    folded: str
+    simplified: str | None = None  # 没有触发器使用繁转简形式时不计算
+    # 该消息匹配的触发器下标（不含监听器），首次扫描时由所属lorebook的匹配索引填写，
+    # 消息留在窗口中的后续几轮无需重新扫描
+    candidates: frozenset[int] | None = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def create(cls, text: str, simplified: bool = False) -> "Message":
+        """创建消息记录
+
+        Args:
+            text: 已规范化空白的消息原文
+            simplified: 是否计算繁转简形式
+
+        Returns:
+            消息记录
+        """
+        folded = fold(text)
+        return cls(text, folded, to_simplified(folded) if simplified else None)
+
+    def form(self, name: str) -> str:
+        """按名称返回匹配形式"""
+        if name == "text":
+            return self.text
+        if name == "simplified" and self.simplified is not None:
+            return self.simplified
+        return self.folded
+
+    def __str__(self) -> str:
+        return self.text
@@ -1,27 +1,57 @@
 import copy
+import hashlib
 import random
-import re
+import time
 from collections import deque
 from datetime import datetime
 from typing import Any
 
-from kwmatcher import AhoMatcher
-
 from astrbot.api import logger
 
-from ._types import LoreResult, Trigger  # type: ignore
+from ._types import RESPONSE_POSITIONS, LoreResult, Trigger  # type: ignore
+from .budget import Budget, CircuitBreaker  # type: ignore
+from .clock import Clock, RealClock  # type: ignore
+from .debug import debug, summarize_names  # type: ignore
 from .handlers.logic_handler import LogicHandler  # type: ignore
 from .handlers.random_handler import RandomHandler  # type: ignore
 from .handlers.save_handler import SaveHandler  # type: ignore
+from .handlers.table_handler import TableHandler  # type: ignore
 from .handlers.time_handler import TimeHandler  # type: ignore
 from .handlers.var_handler import VarHandler  # type: ignore
-
-# 定义占位符的正则表达式模式，用于匹配 {namespace::function(args)} 格式
-PLACE_PATTERN = re.compile(r"\{([a-zA-Z0-9_]+)::([a-zA-Z0-9_]+)(?:\(([^(){}]*)\))?}")
+from .lorebook import Lorebook  # type: ignore
+from .matcher import ResponseScanner, TriggerIndex  # type: ignore
+from .metrics import TriggerMetrics, TriggerStats  # type: ignore
+from .normalize import Message  # type: ignore
+from .reactive import ConditionCache  # type: ignore
+from .registry import (  # type: ignore
+    REAL_TIME_REF,
+    TIME_REFS,
+    get_function,
+    register_function,
+)
+from .template import Call, LazyArg, Template, compile_template  # type: ignore
+from .tracer import RenderTracer, TraceNode  # type: ignore
 
 # 定义最大递归深度
 MAX_RECURSION_DEPTH = 25
 
+# 每个会话最多缓存的渲染结果数
+RENDER_CACHE_SIZE = 1024
+
+
+def derive_seed(master_seed: str, session: str) -> int:
+    """由主种子与会话键生成会话的随机数种子
+
+    Args:
+        master_seed: 主种子
+        session: 会话键
+
+    Returns:
+        64位整数种子，与进程无关，可用于复现
+    """
+    digest = hashlib.sha256(f"{master_seed}:{session}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
 
 class LoreParser:
     __slots__ = (
@@ -29,11 +59,22 @@ class LoreParser:
         "sender_name",
         "messages",
         "session",
+        "seed",
+        "rng",
+        "clock",
+        "world_rate",
+        "metrics",
+        "_sampling",
+        "tracer",
+        "dry_run",
+        "budget",
+        "breaker",
         "_lorebook",
         "_vars",
         "_triggers",
         "_notes",
         "_current_time",
+        "_world_anchor",
         "_real_idle",
         "_world_idle",
         "_var_handler",
@@ -41,40 +82,63 @@ class LoreParser:
         "_random_handler",
         "_logic_handler",
         "_save_handler",
+        "_table_handler",
+        "_render_cache",
+        "_impure_count",
+        "_conditions",
         "trigger_count",
     )
 
-    def __init__(self, lorebook: dict[str, Any], scan_depth: int = 1):
+    def __init__(
+        self,
+        lorebook: Lorebook | dict[str, Any],
+        scan_depth: int = 1,
+        seed: int | None = None,
+        clock: Clock | None = None,
+        metrics: TriggerMetrics | None = None,
+        budget: Budget | None = None,
+        breaker: CircuitBreaker | None = None,
+        world_rate: float = 0.0,
+    ):
         """初始化Lorebook解析器
 
         Args:
-            lorebook: Lorebook配置字典
+            lorebook: 编译后的Lorebook，或Lorebook配置字典
             scan_depth: 扫描深度
+            seed: 随机数种子，为None时随机生成；相同种子与相同输入会得到相同结果
+            clock: 时钟，默认为系统时钟
+            metrics: 触发器统计，为None时不统计
+            budget: 单条消息的处理预算，为None时不限制
+            breaker: 触发器熔断器，为None时不熔断
+            world_rate: 世界时间随时钟流逝的倍率，0表示世界时间只由 buildin::time 调整
         """
-        self._lorebook = lorebook
+        self._lorebook = (
+            lorebook if isinstance(lorebook, Lorebook) else Lorebook(lorebook)
+        )
         self.sender = "AstrBot"
         self.sender_name = "AstrBot"
-        self.messages: deque[str] = deque(maxlen=scan_depth)
+        self.messages: deque[Message] = deque(maxlen=scan_depth)
         self.session = "default"
 
+        # 会话独立的随机数生成器，触发概率、作者注释与随机函数共用
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.rng = random.Random(self.seed)
+
         # 初始化变量存储
         self._vars: dict[str, dict[str, Any]] = {}
-        self._vars["world"] = copy.deepcopy(self._lorebook.get("world_state", {}))
-        self._vars.update({
-            item["name"]: copy.deepcopy(item.get("variables", {}))
-            for item in self._lorebook.get("user_state", [])
-        })
-        # 设置当前时间，优先使用世界时间，否则使用系统时间
-        if self._vars["world"].get("world_time") is not None:
-            self._current_time = datetime.strptime(
-                self._vars["world"]["world_time"], "%Y-%m-%d %H:%M"
-            )
-        else:
-            self._current_time = datetime.now()
+        self._vars["world"] = copy.deepcopy(self._lorebook.world_state)
+        self._vars.update(copy.deepcopy(self._lorebook.user_state))
+        self.clock: Clock = clock if clock is not None else RealClock()
+        # 设置当前时间，优先使用世界时间，否则使用时钟时间
+        now = self.clock.now()
+        self._current_time: datetime = self._lorebook.world_time or now
+        # 世界时间按倍率跟随时钟流逝，记录上次推进时的时钟时间
+        self.world_rate = world_rate
+        self._world_anchor = now
 
         self._real_idle: dict[str, datetime] = {
-            "before": datetime.now(),
-            "after": datetime.now(),
+            "before": now,
+            "after": now,
         }
 
         self._world_idle: dict[str, datetime] = {
@@ -82,37 +146,11 @@ class LoreParser:
             "after": self._current_time,
         }
 
-        # 按优先级排序触发器
-        self._triggers: list[Trigger] = sorted(
-            [
-                Trigger(
-                    name=t.get("name", ""),
-                    type=t.get("type", "keywords"),
-                    match=t.get("match"),
-                    conditional=t.get("conditional"),
-                    priority=t.get("priority", 0),
-                    block=t.get("block", False),
-                    probability=t.get("probability", 1.0),
-                    use_logic=t.get("use_logic", True),
-                    position=t.get("position", "sys_start"),
-                    content=t.get("content", ""),
-                    actions=t.get("actions", []),
-                    max_trig=t.get("max_trig", -1),
-                )
-                for t in lorebook.get("trigger", [])
-            ],
-            key=lambda trigger: -trigger.priority,
-        )
+        self._triggers: list[Trigger] = self._lorebook.triggers
+        self._notes: list[Trigger] = self._lorebook.notes
 
-        # 初始化作者注释
-        self._notes: list[Trigger] = [
-            Trigger(
-                content=note.get("content", ""),
-                probability=note.get("probability", 1.0),
-                position=note.get("position", "sys_start"),
-            )
-            for note in lorebook.get("authors_note", [])
-        ]
+        # 触发条件的求值结果缓存，变量写入时由变量处理器使相关结果失效
+        self._conditions = ConditionCache()
 
         # 初始化各种处理器
         self._var_handler = VarHandler(self)
@@ -120,10 +158,42 @@ class LoreParser:
         self._random_handler = RandomHandler(self)
         self._logic_handler = LogicHandler(self)
         self._save_handler = SaveHandler(self)
+        self._table_handler = TableHandler(self)
+
+        # 纯模板的渲染缓存，值为(整体版本号, 读取的变量及其版本号, 渲染结果)
+        self._render_cache: dict[
+            tuple[Template, str, str],
+            tuple[int, tuple[tuple[tuple[str, str], int], ...], str],
+        ] = {}
+        # 已执行的非纯函数次数，用于发现渲染过程中间接调用的非纯函数
+        self._impure_count = 0
 
         # 初始化触发器计数器
         self.trigger_count: dict[str, int] = {}
 
+        # 触发器统计，_sampling 表示当前消息是否被采样
+        self.metrics = metrics
+        self._sampling = False
+
+        # 展开追踪器，为None时不追踪
+        self.tracer: RenderTracer | None = None
+        # 试运行模式下存档操作不写入文件
+        self.dry_run = False
+
+        # 处理预算与熔断器
+        self.budget = budget
+        self.breaker = breaker
+
+    @property
+    def index(self) -> TriggerIndex:
+        """lorebook的共享匹配索引"""
+        return self._lorebook.index
+
+    @property
+    def responds(self) -> bool:
+        """lorebook是否有需要处理LLM回复的触发器或作者注释"""
+        return self._lorebook.responds
+
     def __str__(self) -> str:
         """返回解析器的字符串表示"""
         return f"LoreParser(variables={self._vars},triggers={self._triggers},authors_notes={self._notes})"
@@ -132,6 +202,74 @@ class LoreParser:
         """返回解析器的官方字符串表示"""
         return self.__str__()
 
+    def summary(self) -> str:
+        """返回有界的状态摘要，用于调试日志
+
+        只包含变量与触发器的数量以及本轮已触发的触发器名称，不展开变量内容。
+        """
+        variables = sum(len(scope) for scope in self._vars.values())
+        fired = summarize_names(self.trigger_count)
+        return (
+            f"LoreParser(scopes={len(self._vars)}, variables={variables}, "
+            f"triggers={len(self._triggers)}, notes={len(self._notes)}, "
+            f"fired=[{fired}])"
+        )
+
+    def sandbox(self) -> "LoreParser":
+        """创建试运行用的会话副本
+
+        副本共享编译后的Lorebook、时钟与熔断器，使用相同上限的预算，
+        复制变量、时间、随机数状态与触发计数，
+        在副本上渲染不会影响原会话，存档操作也不会写入文件。
+
+        Returns:
+            会话副本
+        """
+        sandbox = LoreParser(
+            self._lorebook,
+            self.messages.maxlen or 1,
+            seed=self.seed,
+            clock=self.clock,
+            budget=(
+                Budget(self.budget.max_steps, self.budget.max_seconds)
+                if self.budget is not None
+                else None
+            ),
+            breaker=self.breaker,
+        )
+        sandbox.sender = self.sender
+        sandbox.sender_name = self.sender_name
+        sandbox.session = self.session
+        sandbox.messages.extend(self.messages)
+        sandbox.rng.setstate(self.rng.getstate())
+        sandbox._vars = copy.deepcopy(self._vars)
+        sandbox._current_time = self._current_time
+        sandbox.world_rate = self.world_rate
+        sandbox._world_anchor = self._world_anchor
+        sandbox._real_idle = dict(self._real_idle)
+        sandbox._world_idle = dict(self._world_idle)
+        sandbox.trigger_count = dict(self.trigger_count)
+        sandbox.dry_run = True
+        return sandbox
+
+    def add_message(self, text: str | Message) -> Message:
+        """将消息加入扫描窗口
+
+        消息的匹配形式在此计算一次，由所有触发器共用。
+
+        Args:
+            text: 已规范化空白的消息文本，或已扫描的消息记录（如流式扫描的LLM回复）
+
+        Returns:
+            加入窗口的消息记录
+        """
+        if isinstance(text, Message):
+            self.messages.append(text)
+            return text
+        message = Message.create(text, self.index.simplified)
+        self.messages.append(message)
+        return message
+
     def parse_placeholder(self, text: str) -> str:
         """解析文本中的占位符，支持多阶段解析
 
@@ -143,186 +281,286 @@ class LoreParser:
         """
         if not isinstance(text, str):
             return str(text)
+        if "{" not in text:
+            return text
+        return self._render(compile_template(text))
 
-        def replace_match(match, phase):
-            """根据不同阶段处理匹配到的占位符
-
-            Args:
-                match: 正则表达式匹配对象
-                phase: 处理阶段(1-3)
-
-            Returns:
-                替换后的文本
-            """
-            try:
-                namespace = match.group(1)
-                function = match.group(2)
-                args_str = match.group(3) or ""
-
-                args = self._split_args(args_str) if args_str else []
-
-                match (phase, namespace, function):
-                    # 阶段1: 处理基础内置函数
-                    case (1, "buildin", "sender"):
-                        return self.sender
-                    case (1, "buildin", "sender_name"):
-                        return self.sender_name
-                    case (1, "buildin", "time"):
-                        return self._time_handler.handle_time_oper(args)
-                    case (1, "buildin", "random"):
-                        return self._random_handler.handle_random_oper(args)
-                    case (1, "buildin", "load"):
-                        return self._save_handler.handle_load_oper(args)
-
-                    # 阶段2: 处理变量设置
-                    case (2, "var", "set"):
-                        return self._var_handler.handle_var_oper(function, args)
-                    case (2, "buildin", "save"):
-                        return self._save_handler.handle_save_oper(args)
-
-                    # 阶段3: 处理所有其他函数
-                    case (3, "var", _):
-                        return self._var_handler.handle_var_oper(function, args)
-                    case (3, "logic", _):
-                        return self._logic_handler.handle_logic_oper(function, args)
-
-                # 默认情况：保持原样
-                return match.group(0)
-            except Exception as e:
-                logger.debug(f"解析占位符时出现错误: {e!s}, 占位符: {match.group(0)}")
-                return match.group(0)
-
-        # 阶段1: 处理基础内置函数
-        for _ in range(MAX_RECURSION_DEPTH):
-            new_text = text
-            for match in PLACE_PATTERN.finditer(text):
-                replacement = replace_match(match, phase=1)
-                new_text = new_text.replace(match.group(0), str(replacement), 1)
-            if new_text == text:  # 如果文本没有变化，跳出循环
-                break
-            text = new_text
-
-        # 阶段2: 处理变量设置
-        for _ in range(MAX_RECURSION_DEPTH):
-            new_text = text
-            for match in PLACE_PATTERN.finditer(text):
-                replacement = replace_match(match, phase=2)
-                new_text = new_text.replace(match.group(0), str(replacement), 1)
-            if new_text == text:
-                break
-            text = new_text
-
-        # 阶段3: 处理所有其他函数
-        for _ in range(MAX_RECURSION_DEPTH):
-            new_text = text
-            for match in PLACE_PATTERN.finditer(text):
-                replacement = replace_match(match, phase=3)
-                new_text = new_text.replace(match.group(0), str(replacement), 1)
-            if new_text == text:
-                break
-            text = new_text
-
-        return text
+    def _render(self, template: Template) -> str:
+        """按执行计划渲染模板
 
-    def _split_args(self, args_str: str) -> list[str]:
-        """切分参数字符串，支持引号保护。
+        阶段1处理基础内置函数，阶段2处理变量设置，阶段3处理所有其他函数。
+        惰性调用（如logic::if）的参数只在被选中时渲染。
 
         Args:
-            args_str: 参数字符串，如 'a, "b,c", d'
+            template: 编译后的模板
 
         Returns:
-            参数列表，如 ['a', 'b,c', 'd']
+            渲染后的文本
         """
-        args = []
-        current: list[str] = []
-        in_quotes = False
-        quote_char = None
-
-        args_str = args_str.strip()
-        if args_str.startswith("[") and args_str.endswith("]"):
-            args_str = args_str[1:-1]
-
-        for c in args_str:
-            if c in "\"'" and not in_quotes:
-                in_quotes = True
-                quote_char = c
-            elif c == quote_char and in_quotes:
-                in_quotes = False
-                quote_char = None
-            elif c == "," and not in_quotes:
-                args.append("".join(current).strip())
-                current = []
+        if not template.plan:
+            return template.source
+
+        budget = self.budget
+        tracer = self.tracer
+        values: dict[Call, str] = {}
+        # 追踪时每个调用的展开节点
+        nodes: dict[Call, TraceNode] = {}
+        for call in template.plan:
+            node = (
+                tracer.begin(f"{call.namespace}::{call.function}")
+                if tracer is not None
+                else None
+            )
+            # 超出预算后剩余的占位符渲染为空文本
+            if budget is not None and budget.spend():
+                args: list = []
+                values[call] = ""
             else:
-                current.append(c)
+                if call.args is None:
+                    args = []
+                elif call.lazy:
+                    args = [LazyArg(arg, self._render) for arg in call.args]
+                else:
+                    args = [arg.join(values).strip() for arg in call.args]
 
-        # 确保添加最后一个参数
-        if current:
-            args.append("".join(current).strip())
+                # 已编译的模板在渲染时补充查找之后注册的函数
+                spec = call.spec or get_function(call.namespace, call.function)
+                if spec is None or not spec.pure:
+                    self._impure_count += 1
+                try:
+                    result = None if spec is None else spec.handler(self, call, args)
+                except Exception as e:
+                    result = None
+                    debug(
+                        lambda: f"解析占位符时出现错误: {e!s}, "
+                        f"占位符: {call.namespace}::{call.function}"
+                    )
+                # 默认情况：保持原样
+                values[call] = (
+                    call.fallback(list(map(str, args)))
+                    if result is None
+                    else str(result)
+                )
 
-        # 如果解析结束时仍在引号内，记录警告
-        if in_quotes:
-            logger.warning(f"引号不匹配: {args_str}")
+            if tracer is not None and node is not None:
+                # 非惰性参数中的调用已先于本调用执行
+                eager = (
+                    [
+                        nodes[part]
+                        for arg in call.args
+                        for part in arg.parts
+                        if type(part) is Call
+                    ]
+                    if call.args is not None and not call.lazy
+                    else []
+                )
+                tracer.end(node, call.phase, args, values[call], eager)
+                nodes[call] = node
 
-        # 移除每个参数可能残留的首尾引号
-        for i in range(len(args)):
-            arg = args[i]
-            if (arg.startswith('"') and arg.endswith('"')) or (
-                arg.startswith("'") and arg.endswith("'")
-            ):
-                args[i] = arg[1:-1]
+        if tracer is not None:
+            tracer.attach(
+                [nodes[part] for part in template.parts if type(part) is Call]
+            )
+        return template.join(values)
+
+    def _render_cached(self, template: Template) -> str:
+        """渲染模板，纯模板的结果按读取变量的版本号缓存
 
-        return args
+        只有读取的变量被写入后才会重新渲染。变量值本身含有非纯占位符时，
+        渲染过程中会间接调用非纯函数，此时结果不缓存。
 
-    def _can_trigger(self, trigger: Trigger, messages: deque[str]) -> bool:
+        Args:
+            template: 编译后的模板
+
+        Returns:
+            渲染后的文本
+        """
+        # 追踪时不使用缓存，以记录完整的展开过程
+        if not template.pure or not template.plan or self.tracer is not None:
+            return self._render(template)
+
+        var_handler = self._var_handler
+        versions = var_handler.versions
+        key = (template, self.sender, self.sender_name)
+        entry = self._render_cache.get(key)
+        if entry is not None:
+            epoch, reads, output = entry
+            if epoch == var_handler.epoch and all(
+                versions.get(var, 0) == version for var, version in reads
+            ):
+                return output
+
+        outer_log = var_handler.read_log
+        impure_count = self._impure_count
+        epoch = var_handler.epoch
+        var_handler.read_log = []
+        try:
+            output = self._render(template)
+        finally:
+            read_log, var_handler.read_log = var_handler.read_log, outer_log
+        if outer_log is not None:
+            outer_log.extend(read_log)
+
+        # 超出预算时渲染结果不完整，不缓存
+        exhausted = self.budget is not None and self.budget.exhausted
+        if (
+            self._impure_count == impure_count
+            and epoch == var_handler.epoch
+            and not exhausted
+        ):
+            if len(self._render_cache) >= RENDER_CACHE_SIZE:
+                self._render_cache.clear()
+            self._render_cache[key] = (
+                epoch,
+                tuple((var, versions.get(var, 0)) for var in set(read_log)),
+                output,
+            )
+        return output
+
+    def _can_trigger(
+        self,
+        trigger: Trigger,
+        messages: deque[Message],
+        stats: TriggerStats | None = None,
+        matched: bool | None = None,
+    ) -> bool:
         """检查触发器是否可以触发
 
+        依次检查消息匹配、触发概率与条件表达式，开销小的检查在前。
+
         Args:
             trigger: 要检查的触发器对象
             messages: 消息列表
+            stats: 触发器统计，为None时不统计
+            matched: 已知的消息匹配结果，为None时匹配消息
 
         Returns:
             布尔值，表示触发器是否可以触发
         """
+        stages = self.metrics.stages if self._sampling and self.metrics else None
+        if stats is not None:
+            stats.evaluations += 1
+
+        # 检查消息匹配条件
+        if matched is None:
+            matched = self._match_messages(trigger, messages)
+        if stats is not None:
+            stats.match_hits += matched
+        if not matched:
+            if stages is not None:
+                stages["match"] += 1
+            return False
+
         # 检查概率条件
-        if random.random() > trigger.probability:
+        if self.rng.random() > trigger.probability:
+            if stats is not None:
+                stats.probability_skips += 1
+            if stages is not None:
+                stages["probability"] += 1
             return False
 
         # 检查条件表达式
-        if trigger.conditional:
-            parsed_condition = self.parse_placeholder(trigger.conditional)
-            if not self._logic_handler._eval_cond(parsed_condition):
+        if trigger.cond is not None:
+            start = time.perf_counter() if stats is not None else 0.0
+            passed = self._evaluate_cond(trigger, stats)
+            if stats is not None:
+                stats.condition_time += time.perf_counter() - start
+                stats.condition_rejects += not passed
+            if not passed:
+                if stages is not None:
+                    stages["condition"] += 1
                 return False
 
-        # 检查消息匹配条件
-        for message in messages:
-            # 正则表达式匹配
-            if trigger.type == "regex" and trigger.match:
-                try:
-                    if bool(re.search(trigger.match, message)):
-                        return True
-                except re.error as e:
-                    logger.warning(f"无效的正则表达式: {trigger.match}, 错误: {e}")
-                    continue
-            # 关键词匹配
-            elif trigger.type == "keywords" and trigger.match:
-                try:
-                    matcher = AhoMatcher(use_logic=trigger.use_logic)
-                    keywords = self._split_args(trigger.match)
-                    matcher.build(set(keywords))
-                    if bool(matcher.find(message)):
-                        return True
-                except Exception as e:
-                    logger.warning(f"关键词匹配器错误: {e}, 关键词: {trigger.match}")
-                    continue
-            # 监听器类型触发器总是触发
-            elif trigger.type == "listener":
-                return True
-        return False  # 没有匹配任何条件
+        if stages is not None:
+            stages["passed"] += 1
+        return True
+
+    def _time_key(self, reads: frozenset[str]) -> tuple | None:
+        """条件读取的时间状态，不读取时间时返回None"""
+        if not reads & TIME_REFS:
+            return None
+        key: tuple = (
+            self._current_time,
+            self._world_idle["before"],
+            self._world_idle["after"],
+        )
+        if REAL_TIME_REF in reads:
+            key += (self._real_idle["before"], self._real_idle["after"])
+        return key
+
+    def _evaluate_cond(
+        self, trigger: Trigger, stats: TriggerStats | None = None
+    ) -> bool:
+        """求值触发条件，结果在读取的变量被写入或时间变化前保持有效
+
+        编译期的读取集合决定条件能否缓存以及是否依赖时间，实际依赖的变量
+        由求值时的读取记录确定，包括变量值中的占位符间接读取的变量。
+
+        Args:
+            trigger: 带有条件的触发器
+            stats: 触发器统计，为None时不统计
+
+        Returns:
+            条件是否成立
+        """
+        assert trigger.cond is not None
+        var_handler = self._var_handler
+        reads = trigger.cond_reads
+        # 条件调用了非纯函数时每次都求值；追踪时不使用缓存
+        if reads is None or self.tracer is not None:
+            return trigger.cond.evaluate(self.parse_placeholder, var_handler.lookup)
+
+        key = (trigger.cond, self.sender, self.sender_name)
+        time_key = self._time_key(reads)
+        cached = self._conditions.get(key, time_key)
+        if cached is not None:
+            if stats is not None:
+                stats.condition_hits += 1
+            return cached
+
+        outer_log = var_handler.read_log
+        impure_count = self._impure_count
+        time_reads = self._time_handler.reads
+        epoch = var_handler.epoch
+        var_handler.read_log = []
+        try:
+            passed = trigger.cond.evaluate(self.parse_placeholder, var_handler.lookup)
+        finally:
+            read_log, var_handler.read_log = var_handler.read_log, outer_log
+        if outer_log is not None:
+            outer_log.extend(read_log)
+
+        # 变量值中的占位符可能间接调用非纯函数，只有读取时间的调用可以缓存，
+        # 且条件本身需要读取时间，否则时间变化时无法发现
+        time_reads = self._time_handler.reads - time_reads
+        exhausted = self.budget is not None and self.budget.exhausted
+        if (
+            self._impure_count - impure_count == time_reads
+            and (not time_reads or time_key is not None)
+            and epoch == var_handler.epoch
+            and not exhausted
+        ):
+            self._conditions.put(key, set(read_log), time_key, passed)
+        return passed
+
+    def _match_messages(self, trigger: Trigger, messages: deque[Message]) -> bool:
+        """检查消息是否满足触发器的匹配条件
+
+        Args:
+            trigger: 触发器
+            messages: 消息列表
+
+        Returns:
+            是否有消息匹配
+        """
+        if trigger.order < 0:
+            return False
+        return trigger.order in self.index.candidates(messages)
 
     def _process_trigger(
         self,
         trigger: Trigger,
-        messages: deque[str],
+        messages: deque[Message],
         result: LoreResult,
         depth: int = 1,
         skip_chk: bool = False,
@@ -342,6 +580,9 @@ class LoreParser:
         # 防止递归过深
         if depth > MAX_RECURSION_DEPTH:
             return False
+        # 超出预算时停止处理，包括由动作调用的触发器
+        if self.budget is not None and self.budget.spend():
+            return False
 
         # 检查触发条件（除非跳过检查）
         can_trigger = True
@@ -351,56 +592,80 @@ class LoreParser:
                 return True  # 继续处理下一个触发器
 
         # 解析触发器内容并根据位置添加到结果中
-        content = self.parse_placeholder(trigger.content)
-        if trigger.position == "sys_start":
-            result.sys_start.append(content)
-        elif trigger.position == "sys_end":
-            result.sys_end.append(content)
-        elif trigger.position == "user_start":
-            result.user_start.append(content)
-        elif trigger.position == "user_end":
-            result.user_end.append(content)
-
-        for action in trigger.actions:
-            parsed_action = self.parse_placeholder(action)
+        if self._sampling:
+            self._render_sampled(trigger, result)
+        else:
+            content = self._render_cached(trigger.template)
+            getattr(result, trigger.position).append(content)
+
+        for action in trigger.action_templates:
+            parsed_action = self._render(action)
             # 如果动作是另一个触发器的名称，则递归处理该触发器
-            trigger_by_name = next(
-                (t for t in self._triggers if t.name == parsed_action), None
-            )
+            trigger_by_name = self._lorebook.trigger_map.get(parsed_action)
             if trigger_by_name and parsed_action != trigger.name:  # 防止自我递归
+                # 消息与回复阶段的结果分别注入，跨阶段的触发器的内容无处插入
+                if (trigger_by_name.position in RESPONSE_POSITIONS) != (
+                    trigger.position in RESPONSE_POSITIONS
+                ):
+                    logger.warning(
+                        f"lorebook | {self.session} | 跳过动作 {parsed_action}："
+                        f"位于 {trigger_by_name.position}，与触发器 {trigger.name} "
+                        "不在同一阶段"
+                    )
+                    continue
                 self._process_trigger(
                     trigger_by_name, messages, result, depth + 1, True
                 )
 
         return not trigger.block if can_trigger else True
 
+    def _render_sampled(self, trigger: Trigger, result: LoreResult) -> None:
+        """渲染触发器内容并记录统计数据"""
+        assert self.metrics is not None
+        stats = self.metrics.trigger(trigger.name)
+        start = time.perf_counter()
+        content = self._render_cached(trigger.template)
+        stats.render_time += time.perf_counter() - start
+        stats.fires += 1
+        size = len(content.encode())
+        injected = stats.injected_bytes
+        injected[trigger.position] = injected.get(trigger.position, 0) + size
+        getattr(result, trigger.position).append(content)
+
     def reset_trigger_count(self) -> None:
         """重置所有触发器的计数器"""
         self.trigger_count.clear()
 
-    def process_chat(self) -> LoreResult:
-        """处理聊天消息，应用所有适用的触发器和注释
+    def _run_triggers(
+        self, candidates: set[int], result: LoreResult, metrics: TriggerMetrics | None
+    ) -> None:
+        """按优先级处理触发器，依次经过次数上限、候选集合、概率与条件表达式的筛选
 
         Args:
-            messages: 消息列表
-
-        Returns:
-            LoreResult对象，包含处理后的各位置内容
+            candidates: 匹配的候选触发器下标
+            result: 结果对象，用于存储处理结果
+            metrics: 本次需要统计时为触发器统计，否则为None
         """
-        result = LoreResult()
         triged_lis: set[str] = set()
-        # 更新真实世界的空闲时间
-        self._real_idle["before"] = self._real_idle["after"]
-        self._real_idle["after"] = datetime.now()
+        budget = self.budget
+        breaker = self.breaker
+        stages = metrics.stages if metrics is not None else None
 
-        # 处理所有触发器
         for trigger in self._triggers:
             # 检查触发次数限制
             if trigger.max_trig != -1:
                 current_count = self.trigger_count.get(trigger.name, 0)
                 if current_count >= trigger.max_trig:
+                    if stages is not None:
+                        stages["max_trig"] += 1
                     continue  # 跳过已达到最大触发次数的触发器
 
+            # 未匹配任何消息的触发器只需一次集合查找
+            if trigger.order not in candidates:
+                if stages is not None:
+                    stages["match"] += 1
+                continue
+
             # 特殊处理监听器类型触发器，确保每个只触发一次
             if trigger.type == "listener":
                 if trigger.name in triged_lis:
@@ -408,31 +673,174 @@ class LoreParser:
                 else:
                     triged_lis.add(trigger.name)
 
+            # 跳过被熔断的触发器
+            if breaker is not None and not breaker.allow(trigger.name):
+                continue
+
+            # 只有进入概率、条件与渲染的触发器计入预算，超出预算时跳过剩余的触发器
+            if budget is not None and budget.spend():
+                break
+            start = time.perf_counter() if breaker is not None else 0.0
+
             # 处理当前触发器
-            if self._can_trigger(trigger, self.messages):
+            stats = metrics.trigger(trigger.name) if metrics is not None else None
+            proceed = True
+            if self._can_trigger(trigger, self.messages, stats, matched=True):
                 # 增加触发次数计数
                 self.trigger_count[trigger.name] = (
                     self.trigger_count.get(trigger.name, 0) + 1
                 )
 
                 # 处理触发器, 如果返回 False，则停止处理下一个触发器
-                if not self._process_trigger(
+                proceed = self._process_trigger(
                     trigger, self.messages, result, skip_chk=True
-                ):
-                    break
+                )
 
-        # 处理作者注释
+            if breaker is not None:
+                breaker.record(trigger.name, time.perf_counter() - start)
+            if not proceed:
+                if stats is not None:
+                    stats.blocks += 1
+                break
+
+    def _run_notes(self, result: LoreResult, response: bool) -> None:
+        """处理作者注释
+
+        Args:
+            result: 结果对象，用于存储处理结果
+            response: 处理位于 res_start/res_end 的回复注释还是其余注释
+        """
+        budget = self.budget
         for note in self._notes:
-            if random.random() < note.probability:
-                content = self.parse_placeholder(note.content)
+            if (note.position in RESPONSE_POSITIONS) != response:
+                continue
+            if budget is not None and budget.exhausted:
+                break
+            if self.rng.random() < note.probability:
                 # 根据位置添加到结果中
-                if note.position == "sys_start":
-                    result.sys_start.append(content)
-                elif note.position == "user_start":
-                    result.user_start.append(content)
-                elif note.position == "sys_end":
-                    result.sys_end.append(content)
-                elif note.position == "user_end":
-                    result.user_end.append(content)
+                if self._sampling:
+                    self._render_sampled(note, result)
+                else:
+                    content = self._render_cached(note.template)
+                    getattr(result, note.position).append(content)
+
+    def _warn_exhausted(self) -> None:
+        """超出预算时记录警告"""
+        if self.budget is not None and self.budget.exhausted:
+            logger.warning(
+                f"lorebook | {self.session} | 超出单条消息的处理预算"
+                f"（{self.budget.steps}步），已跳过剩余的占位符与触发器"
+            )
+
+    def process_chat(
+        self,
+        candidates: set[int] | None = None,
+        window: tuple[Message, ...] | None = None,
+    ) -> LoreResult:
+        """处理聊天消息，应用所有适用的触发器和注释
+
+        Args:
+            candidates: 已扫描得到的候选触发器下标（如批量匹配的结果），
+                为None时扫描当前的消息列表
+            window: 得到 candidates 时扫描的消息列表，与当前的消息列表不一致时
+                丢弃 candidates 并重新扫描
+
+        Returns:
+            LoreResult对象，包含处理后的各位置内容
+        """
+        result = LoreResult()
+        # 更新真实世界的空闲时间
+        self._real_idle["before"] = self._real_idle["after"]
+        self._real_idle["after"] = self.clock.now()
+        self._advance_world_time(self._real_idle["after"])
 
+        # 判断本条消息是否需要统计
+        self._sampling = self.metrics is not None and self.metrics.sample()
+        metrics = self.metrics if self._sampling else None
+
+        budget = self.budget
+        if budget is not None:
+            budget.start()
+
+        # 扫描之后消息列表已改变（如等待期间同一会话又收到消息）时，候选结果已过期
+        if window is not None and not self._same_window(window):
+            candidates = None
+
+        # 一次扫描所有消息，得到匹配的候选触发器
+        if candidates is None:
+            start = time.perf_counter() if metrics is not None else 0.0
+            candidates = self.index.candidates(self.messages)
+            if metrics is not None:
+                metrics.scan_time += time.perf_counter() - start
+
+        self._run_triggers(candidates, result, metrics)
+
+        # 处理作者注释
+        self._run_notes(result, False)
+        self._warn_exhausted()
         return result
+
+    def _same_window(self, window: tuple[Message, ...]) -> bool:
+        """判断消息列表是否仍为 window 中的消息"""
+        messages = self.messages
+        return len(window) == len(messages) and all(
+            a is b for a, b in zip(window, messages)
+        )
+
+    def _advance_world_time(self, now: datetime) -> None:
+        """按时钟流逝推进世界时间
+
+        每条消息推进一次，处理同一条消息时世界时间保持不变。
+
+        Args:
+            now: 当前的时钟时间
+        """
+        elapsed, self._world_anchor = now - self._world_anchor, now
+        if not self.world_rate or not elapsed:
+            return
+        try:
+            self._current_time += elapsed * self.world_rate
+        except OverflowError:
+            logger.warning(f"lorebook | {self.session} | 世界时间超出范围，停止推进")
+            self.world_rate = 0.0
+
+    def scan_response(self) -> ResponseScanner:
+        """开始流式扫描一条LLM回复
+
+        Returns:
+            扫描器，回复的每个分段到达时调用 feed，结束后调用 finish
+        """
+        return self.index.scan_response()
+
+    def process_response(self, candidates: set[int]) -> LoreResult:
+        """处理LLM回复，应用位置为 res_start/res_end 的回复触发器与作者注释
+
+        Args:
+            candidates: 扫描回复得到的回复触发器下标
+
+        Returns:
+            LoreResult对象，内容位于 res_start 与 res_end
+        """
+        result = LoreResult()
+        if not self._lorebook.responds:
+            return result
+        # 回复不计入触发器统计
+        self._sampling = False
+        if self.budget is not None:
+            self.budget.start()
+        self._run_triggers(candidates, result, None)
+        self._run_notes(result, True)
+        self._warn_exhausted()
+        return result
+
+
+def _sender(parser: LoreParser, call: Call, args: list) -> str:
+    return parser.sender
+
+
+def _sender_name(parser: LoreParser, call: Call, args: list) -> str:
+    return parser.sender_name
+
+
+register_function("buildin", "sender", _sender, phase=1)
+register_function("buildin", "sender_name", _sender_name, phase=1)
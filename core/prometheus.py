@@ -0,0 +1,217 @@
+import asyncio
+import math
+import os
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+# 耗时直方图的默认分桶（秒）
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# 文本大小直方图的分桶（字节）
+SIZE_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Histogram:
+    """直方图指标"""
+
+    __slots__ = ("name", "help", "labelnames", "buckets", "_series")
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = TIME_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # 键为标签值，值为[各分桶计数, 总和, 总数]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """记录一次观测值
+
+        Args:
+            value: 观测值
+            labels: 标签值，顺序与 labelnames 一致
+        """
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        """记录代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_labels(names, labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(names, labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{le} {count}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Gauge:
+    """数值指标，可直接设置，也可在导出时通过回调函数取值"""
+
+    __slots__ = ("name", "help", "labelnames", "_values", "_function")
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float] | None) -> None:
+        """设置导出时调用的取值函数，仅适用于无标签的指标"""
+        self._function = function
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        values = dict(self._values)
+        if self._function is not None:
+            values[()] = self._function()
+        for labels, value in values.items():
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}{label_str} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，负责以Prometheus文本格式导出"""
+
+    def __init__(self):
+        self.metrics: dict[str, Histogram | Gauge] = {}
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = TIME_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics[name] = metric
+        return metric
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help, labelnames)
+        self.metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        lines: list[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """将指标写入文件，先写临时文件再替换，避免读取到不完整的内容
+
+        Args:
+            path: 文件路径
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> asyncio.Server:
+        """启动只读的HTTP端点，任意路径均返回指标
+
+        Args:
+            port: 端口
+            host: 监听地址，默认只监听本机
+
+        Returns:
+            服务器对象，关闭时调用 close()
+        """
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                # 读取并丢弃请求头
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + b"Connection: close\r\n\r\n"
+                    + body
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+# 插件使用的全局注册表与指标
+REGISTRY = MetricsRegistry()
+HOOK_SECONDS = REGISTRY.histogram(
+    "lorebook_hook_duration_seconds", "事件钩子的处理耗时", ("hook",)
+)
+INJECTED_BYTES = REGISTRY.histogram(
+    "lorebook_injected_prompt_bytes",
+    "每次LLM请求注入的提示词大小",
+    ("position",),
+    buckets=SIZE_BUCKETS,
+)
+SAVE_IO_SECONDS = REGISTRY.histogram(
+    "lorebook_save_io_seconds", "存档读写耗时", ("operation", "scope")
+)
+COMPILE_SECONDS = REGISTRY.gauge("lorebook_compile_seconds", "lorebook编译耗时")
+SESSIONS = REGISTRY.gauge("lorebook_sessions", "当前的会话解析器数量")
+PENDING_RESULTS = REGISTRY.gauge(
+    "lorebook_pending_results", "等待注入LLM请求的处理结果数量"
+)
@@ -0,0 +1,74 @@
+from collections.abc import Hashable, Iterable
+
+# 每个会话最多缓存的条件结果数，超出时全部清空
+CONDITION_CACHE_SIZE = 4096
+
+
+class ConditionCache:
+    """触发条件的求值结果缓存
+
+    每个结果记录求值时读取的变量，并按变量建立反向索引。变量被写入时，
+    只有读取过该变量的条件结果失效；读取时间的条件还需要时间与求值时一致。
+    """
+
+    __slots__ = ("_values", "_dependents")
+
+    def __init__(self):
+        # 键为(条件, 用户ID, 用户名)，值为(时间键, 求值结果)
+        self._values: dict[Hashable, tuple[Hashable, bool]] = {}
+        # 变量到读取该变量的条件键，变量键为(作用域键, 变量名)
+        self._dependents: dict[tuple[str, str], set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable, time_key: Hashable) -> bool | None:
+        """读取缓存的求值结果
+
+        Args:
+            key: 条件键
+            time_key: 当前的时间键，不读取时间的条件为None
+
+        Returns:
+            缓存的结果，不存在或时间已变化时返回None
+        """
+        entry = self._values.get(key)
+        if entry is None or entry[0] != time_key:
+            return None
+        return entry[1]
+
+    def put(
+        self,
+        key: Hashable,
+        reads: Iterable[tuple[str, str]],
+        time_key: Hashable,
+        value: bool,
+    ) -> None:
+        """缓存求值结果
+
+        Args:
+            key: 条件键
+            reads: 求值时读取的变量
+            time_key: 求值时的时间键
+            value: 求值结果
+        """
+        if len(self._values) >= CONDITION_CACHE_SIZE:
+            self.clear()
+        self._values[key] = (time_key, value)
+        for var in reads:
+            dependents = self._dependents.get(var)
+            if dependents is None:
+                dependents = self._dependents[var] = set()
+            dependents.add(key)
+
+    def invalidate(self, var: tuple[str, str]) -> None:
+        """变量被写入，使读取该变量的结果失效"""
+        dependents = self._dependents.pop(var, None)
+        if dependents:
+            for key in dependents:
+                self._values.pop(key, None)
+
+    def clear(self) -> None:
+        """清空所有结果"""
+        self._values.clear()
+        self._dependents.clear()
@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from astrbot.api import logger
+
+# 缓冲的记录数达到该值时写入文件
+FLUSH_EVERY = 100
+
+
+class TraceRecorder:
+    """消息轨迹记录器，用于离线回放与性能分析
+
+    轨迹为gzip压缩的JSON Lines，每行一个事件：
+    {"t": 时间戳, "type": "message"|"llm_req"|"llm_res", "session": 会话哈希,
+    "sender": 发送者哈希, "text": 规范化后的文本}。
+    会话与发送者以随机盐哈希，同一次运行内保持一致，不同运行之间无法关联。
+    在事件循环中记录时，压缩与写入在工作线程中依次进行，不阻塞事件循环。
+    """
+
+    __slots__ = ("path", "_salt", "_buffer", "_writing")
+
+    def __init__(self, path: str):
+        """初始化记录器
+
+        Args:
+            path: 轨迹文件路径，已存在时追加
+        """
+        self.path = path
+        self._salt = secrets.token_bytes(16)
+        self._buffer: list[str] = []
+        # 最近一次后台写入，后续写入等待其完成以保持记录顺序
+        self._writing: asyncio.Task | None = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _hash(self, value: str) -> str:
+        return hashlib.blake2b(
+            value.encode(), digest_size=8, key=self._salt
+        ).hexdigest()
+
+    def _record(self, type: str, session: str, sender: str, text: str) -> None:
+        event = {
+            "t": time.time(),
+            "type": type,
+            "session": self._hash(session),
+            "sender": self._hash(sender),
+            "text": " ".join(text.split()),
+        }
+        self._buffer.append(json.dumps(event, ensure_ascii=False))
+        if len(self._buffer) >= FLUSH_EVERY:
+            self._flush_background()
+
+    def message(self, session: str, sender: str, text: str) -> None:
+        """记录一条用户消息"""
+        self._record("message", session, sender, text)
+
+    def llm_request(self, session: str, sender: str) -> None:
+        """记录一次LLM请求"""
+        self._record("llm_req", session, sender, "")
+
+    def llm_response(self, session: str, sender: str, text: str) -> None:
+        """记录一次LLM回复"""
+        self._record("llm_res", session, sender, text)
+
+    def flush(self) -> None:
+        """将缓冲的记录写入文件，每次写入为一个gzip成员"""
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    async def close(self) -> None:
+        """写入剩余的记录，并等待后台写入完成"""
+        if self._buffer:
+            self._flush_background()
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+
+    def _flush_background(self) -> None:
+        """在工作线程中写入缓冲的记录，没有运行中的事件循环时直接写入"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        lines, self._buffer = self._buffer, []
+        self._writing = asyncio.ensure_future(
+            self._write_after(self._writing, lines)
+        )
+
+    async def _write_after(
+        self, previous: asyncio.Task | None, lines: list[str]
+    ) -> None:
+        """等待上一次写入完成后写入记录"""
+        if previous is not None:
+            await previous
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            logger.warning(f"lorebook | 写入轨迹文件失败: {e}")
+
+    def _write(self, lines: list[str]) -> None:
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def read_trace(path: str) -> Iterator[dict[str, Any]]:
+    """读取轨迹文件
+
+    Args:
+        path: 轨迹文件路径
+
+    Yields:
+        事件字典，按记录顺序
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
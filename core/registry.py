@@ -0,0 +1,114 @@
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .parser import LoreParser
+    from .template import Call, Template
+
+# 读取时间的伪变量引用，FunctionSpec.reads 只返回这些引用时，表示非纯函数只读取当前时间
+WORLD_TIME_REF = "@world_time"
+REAL_TIME_REF = "@real_time"
+TIME_REFS = frozenset((WORLD_TIME_REF, REAL_TIME_REF))
+
+# 处理函数签名：(解析器, 占位符调用, 参数列表) -> 结果字符串，返回None表示保持占位符原样
+Handler = Callable[["LoreParser", "Call", list], Any]
+
+
+@dataclass(slots=True, frozen=True)
+class FunctionSpec:
+    """占位符函数的注册信息"""
+
+    handler: Handler
+    # 最早执行阶段，1: 基础内置函数；2: 变量设置与存档；3: 其他函数
+    phase: int = 3
+    # 纯函数的结果只取决于参数和读取的变量，没有副作用
+    pure: bool = True
+    # 惰性函数的参数以 LazyArg 形式传入，由处理器按需渲染
+    lazy: bool = False
+    # 编译期预处理，接收参数模板，返回值保存在 Call.data 中
+    prepare: Callable[[tuple["Template", ...]], Any] | None = None
+    # 编译期提取读取的变量，接收参数模板，返回"scope.name"形式的变量引用，无法确定时返回None
+    reads: Callable[[tuple["Template", ...]], Iterable[str] | None] | None = None
+
+
+# 注册表，键为(命名空间, 函数名)，函数名为"*"时匹配该命名空间下的所有函数
+_REGISTRY: dict[tuple[str, str], FunctionSpec] = {}
+
+
+def register_function(
+    namespace: str,
+    function: str,
+    handler: Handler | None = None,
+    *,
+    phase: int = 3,
+    pure: bool = True,
+    lazy: bool = False,
+    prepare: Callable[[tuple["Template", ...]], Any] | None = None,
+    reads: Callable[[tuple["Template", ...]], Iterable[str] | None] | None = None,
+):
+    """注册占位符函数，可作为装饰器使用
+
+    建议在lorebook加载前注册，已编译的模板会在渲染时补充查找新注册的函数，
+    但执行阶段仍按未知函数（阶段3）处理。
+
+    Args:
+        namespace: 命名空间，如"weather"
+        function: 函数名，"*"表示匹配该命名空间下的所有函数
+        handler: 处理函数，签名为 (parser, call, args) -> str
+        phase: 最早执行阶段(1-3)
+        pure: 是否为纯函数
+        lazy: 是否惰性求值参数
+        prepare: 编译期预处理函数
+        reads: 编译期提取读取变量的函数
+
+    Returns:
+        作为装饰器使用时返回装饰器，否则返回处理函数本身
+    """
+
+    def decorator(func: Handler) -> Handler:
+        _REGISTRY[(namespace, function)] = FunctionSpec(
+            handler=func,
+            phase=phase,
+            pure=pure,
+            lazy=lazy,
+            prepare=prepare,
+            reads=reads,
+        )
+        # 清除模板缓存，使新注册的函数在之后的编译中生效
+        from .template import compile_template  # type: ignore
+
+        compile_template.cache_clear()
+        return func
+
+    if handler is None:
+        return decorator
+    return decorator(handler)
+
+
+def unregister_function(namespace: str, function: str) -> None:
+    """注销占位符函数
+
+    Args:
+        namespace: 命名空间
+        function: 函数名
+    """
+    if _REGISTRY.pop((namespace, function), None) is None:
+        return
+    # 清除模板缓存，避免之后的编译仍绑定已注销的函数
+    from .template import compile_template  # type: ignore
+
+    compile_template.cache_clear()
+
+
+def get_function(namespace: str, function: str) -> FunctionSpec | None:
+    """查找占位符函数
+
+    Args:
+        namespace: 命名空间
+        function: 函数名
+
+    Returns:
+        注册信息，未注册时返回None
+    """
+    return _REGISTRY.get((namespace, function)) or _REGISTRY.get((namespace, "*"))
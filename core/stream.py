@@ -0,0 +1,99 @@
+from collections import deque
+from collections.abc import Iterable
+
+
+class StreamAutomaton:
+    """可增量扫描的 Aho-Corasick 自动机
+
+    扫描状态为一个节点编号，可以在分段到达的文本之间保存，
+    跨越分段边界的关键词同样能被找到。
+    """
+
+    __slots__ = ("terms", "_goto", "_fail", "_out")
+
+    def __init__(self, terms: Iterable[str]):
+        """构建自动机
+
+        Args:
+            terms: 关键词，重复与空串会被忽略
+        """
+        self.terms: list[str] = list(dict.fromkeys(term for term in terms if term))
+        goto: list[dict[str, int]] = [{}]
+        out: list[tuple[int, ...]] = [()]
+        for term_id, term in enumerate(self.terms):
+            node = 0
+            for char in term:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = goto[node][char] = len(goto)
+                    goto.append({})
+                    out.append(())
+                node = next_node
+            out[node] += (term_id,)
+
+        # 按层次计算失配链接，并合并失配节点的输出
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                out[child] += out[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def step(self, state: int, text: str, seen: set[int]) -> int:
+        """从给定状态继续扫描文本
+
+        Args:
+            state: 上次扫描结束时的状态，初始为0
+            text: 新到达的文本
+            seen: 已找到的关键词编号，扫描时原地更新
+
+        Returns:
+            扫描结束时的状态
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                seen.update(out[state])
+        return state
+
+
+def parse_expression(
+    expression: str, use_logic: bool
+) -> tuple[tuple[str, ...], tuple[tuple[str, ...], ...]]:
+    """解析关键词逻辑表达式
+
+    "A&B~C&D~E" 表示同时包含A与B，且不同时包含C与D，也不包含E。
+
+    Args:
+        expression: 逻辑表达式
+        use_logic: 是否启用逻辑表达式，不启用时整个表达式为一个关键词
+
+    Returns:
+        (必须全部出现的关键词, 排除组)，任一排除组的关键词全部出现时不匹配；
+            没有必须出现的关键词时表达式无效
+    """
+    if not use_logic:
+        return ((expression,) if expression else ()), ()
+    positive, *negative = expression.split("~")
+    return (
+        tuple(term for term in positive.split("&") if term),
+        tuple(
+            group
+            for group in (
+                tuple(term for term in part.split("&") if term) for part in negative
+            )
+            if group
+        ),
+    )
@@ -0,0 +1,281 @@
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from .registry import FunctionSpec, get_function  # type: ignore
+
+# 匹配占位符头部 {namespace::function
+CALL_HEAD = re.compile(r"\{([a-zA-Z0-9_]+)::([a-zA-Z0-9_]+)")
+
+# 最大嵌套深度，超出部分按普通文本处理
+MAX_NESTING_DEPTH = 25
+
+
+@dataclass(slots=True, eq=False)
+class Call:
+    """模板中的一个占位符调用"""
+
+    namespace: str
+    function: str
+    args: tuple["Template", ...] | None  # None 表示没有括号
+    spec: FunctionSpec | None  # 编译时解析的函数注册信息，未知函数为None
+    phase: int
+    lazy: bool
+    data: Any = None  # 编译期预处理结果，见 FunctionSpec.prepare
+
+    def fallback(self, args: list[str]) -> str:
+        """无法处理时保持占位符原样（内部占位符已替换）"""
+        if self.args is None:
+            return f"{{{self.namespace}::{self.function}}}"
+        return f"{{{self.namespace}::{self.function}({','.join(args)})}}"
+
+
+@dataclass(slots=True, eq=False)
+class Template:
+    """编译后的模板
+
+    parts 为文本与调用交替组成的序列；plan 为本模板内需要直接执行的调用，
+    按(阶段, 由内到外、从左到右)排序。惰性调用的参数是独立的子模板，不计入 plan。
+    """
+
+    source: str
+    parts: tuple[str | Call, ...]
+    plan: tuple[Call, ...]
+    # 是否只使用纯函数（包括惰性参数中的调用），纯模板的渲染结果可以缓存
+    pure: bool = True
+    # 读取的变量引用("scope.name")，存在无法静态确定的读取时为None
+    reads: frozenset[str] | None = frozenset()
+
+    @property
+    def literal(self) -> str | None:
+        """不含占位符时返回去除首尾空白的文本，否则返回None"""
+        if any(type(part) is Call for part in self.parts):
+            return None
+        return "".join(self.parts).strip()  # type: ignore[arg-type]
+
+    def join(self, values: dict[Call, str]) -> str:
+        """用已求得的调用结果拼接模板"""
+        return "".join(
+            values[part] if type(part) is Call else part  # type: ignore[index]
+            for part in self.parts
+        )
+
+
+class LazyArg:
+    """惰性参数，首次调用时渲染并缓存结果"""
+
+    __slots__ = ("_template", "_render", "_value")
+
+    def __init__(self, template: Template, render: Callable[[Template], str]):
+        self._template = template
+        self._render = render
+        self._value: str | None = None
+
+    def __call__(self) -> str:
+        if self._value is None:
+            self._value = self._render(self._template).strip()
+        return self._value
+
+    def __str__(self) -> str:
+        return self()
+
+
+def _scan_call(text: str, start: int, depth: int) -> int:
+    """检查 start 处是否为合法占位符
+
+    参数列表中不得出现半角括号，大括号只能用于嵌套占位符。
+
+    Returns:
+        占位符结束位置（不含），不合法时返回-1
+    """
+    head = CALL_HEAD.match(text, start)
+    if head is None:
+        return -1
+    i = head.end()
+    n = len(text)
+    if i < n and text[i] == "}":
+        return i + 1
+    if i >= n or text[i] != "(":
+        return -1
+    i += 1
+    while i < n:
+        c = text[i]
+        if c == ")":
+            return i + 2 if i + 1 < n and text[i + 1] == "}" else -1
+        if c in "(}":
+            return -1
+        if c == "{":
+            if depth >= MAX_NESTING_DEPTH:
+                return -1
+            i = _scan_call(text, i, depth + 1)
+            if i < 0:
+                return -1
+            continue
+        i += 1
+    return -1
+
+
+def _split_call_args(args_str: str) -> list[str]:
+    """切分参数字符串，支持引号保护，嵌套占位符内部的逗号不参与切分
+
+    Args:
+        args_str: 参数字符串，如 'a, "b,c", {var::get(d)}'
+
+    Returns:
+        参数源文本列表（未去除首尾空白）
+    """
+    args_str = args_str.strip()
+    if args_str.startswith("[") and args_str.endswith("]"):
+        args_str = args_str[1:-1]
+
+    args = []
+    current: list[str] = []
+    depth = 0
+    quote_char = None
+    for c in args_str:
+        if depth == 0:
+            if quote_char is None and c in "\"'":
+                quote_char = c
+                continue
+            if c == quote_char:
+                quote_char = None
+                continue
+            if c == "," and quote_char is None:
+                args.append("".join(current))
+                current = []
+                continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        current.append(c)
+
+    # 确保添加最后一个参数
+    if current:
+        args.append("".join(current))
+    return args
+
+
+def _build_call(source: str, depth: int) -> Call:
+    head = CALL_HEAD.match(source)
+    assert head is not None
+    namespace, function = head.group(1), head.group(2)
+    rest = source[head.end() :]
+
+    args = None
+    if rest != "}":
+        # 去掉 "(" 与 ")}"
+        args = tuple(
+            _compile(arg, depth + 1) for arg in _split_call_args(rest[1:-2])
+        )
+
+    spec = get_function(namespace, function)
+    if spec is None:
+        return Call(namespace, function, args, spec=None, phase=3, lazy=False)
+    return Call(
+        namespace=namespace,
+        function=function,
+        args=args,
+        spec=spec,
+        phase=spec.phase,
+        lazy=spec.lazy,
+        data=spec.prepare(args) if spec.prepare and args else None,
+    )
+
+
+def _build_plan(parts: tuple[str | Call, ...]) -> tuple[Call, ...]:
+    """计算模板的执行计划
+
+    调用的实际执行阶段不早于其非惰性参数中任一调用的阶段。
+    """
+    order: list[tuple[int, int, Call]] = []
+
+    def visit(call: Call) -> int:
+        phase = call.phase
+        if call.args and not call.lazy:
+            for arg in call.args:
+                for part in arg.parts:
+                    if type(part) is Call:
+                        phase = max(phase, visit(part))  # type: ignore[arg-type]
+        order.append((phase, len(order), call))
+        return phase
+
+    for part in parts:
+        if type(part) is Call:
+            visit(part)  # type: ignore[arg-type]
+    order.sort(key=lambda item: (item[0], item[1]))
+    return tuple(call for _, _, call in order)
+
+
+def _compile(text: str, depth: int = 1) -> Template:
+    parts: list[str | Call] = []
+    literal_start = 0
+    i = text.find("{")
+    while i >= 0:
+        end = _scan_call(text, i, depth)
+        if end < 0:
+            i = text.find("{", i + 1)
+            continue
+        if i > literal_start:
+            parts.append(text[literal_start:i])
+        parts.append(_build_call(text[i:end], depth))
+        literal_start = end
+        i = text.find("{", end)
+    if literal_start < len(text):
+        parts.append(text[literal_start:])
+
+    parts_t = tuple(parts)
+    template = Template(source=text, parts=parts_t, plan=_build_plan(parts_t))
+    _analyze(template)
+    return template
+
+
+def _analyze(template: Template) -> None:
+    """分析模板是否为纯模板，并提取读取的变量"""
+    reads: set[str] | None = set()
+    for part in template.parts:
+        if type(part) is not Call:
+            continue
+        call: Call = part  # type: ignore[assignment]
+        # 未知函数可能在之后被注册为非纯函数，按非纯处理
+        if call.spec is None or not call.spec.pure:
+            template.pure = False
+        if reads is not None and call.spec is not None and call.spec.reads:
+            refs = call.spec.reads(call.args or ())
+            reads = None if refs is None else reads | set(refs)
+        for arg in call.args or ():
+            template.pure = template.pure and arg.pure
+            if reads is not None:
+                reads = None if arg.reads is None else reads | arg.reads
+    template.reads = None if reads is None else frozenset(reads)
+
+
+def iter_calls(template: Template):
+    """遍历模板中的所有调用，包括惰性参数中的调用
+
+    Args:
+        template: 编译后的模板
+
+    Yields:
+        占位符调用
+    """
+    for part in template.parts:
+        if type(part) is Call:
+            yield part
+            for arg in part.args or ():  # type: ignore[union-attr]
+                yield from iter_calls(arg)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> Template:
+    """将含占位符的文本编译为模板
+
+    Args:
+        text: 包含占位符的文本
+
+    Returns:
+        编译后的模板对象
+    """
+    return _compile(text)
@@ -0,0 +1,189 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .debug import clip  # type: ignore
+
+if TYPE_CHECKING:
+    from .parser import LoreParser
+
+# 记录参数时每个参数的最大长度
+MAX_TRACE_ARG_LENGTH = 40
+
+
+@dataclass(slots=True)
+class TraceNode:
+    """展开树中的一次占位符调用，时间单位为秒"""
+
+    name: str
+    phase: int = 0  # 实际执行阶段，不早于其参数中调用的阶段
+    args: list[str] = field(default_factory=list)
+    output_size: int = 0
+    elapsed: float = 0.0  # 包含子调用的总耗时
+    children: list["TraceNode"] = field(default_factory=list)
+
+    @property
+    def self_time(self) -> float:
+        return max(0.0, self.elapsed - sum(child.elapsed for child in self.children))
+
+
+class RenderTracer:
+    """模板展开追踪器
+
+    赋值给 LoreParser.tracer 后，之后的渲染会记录每个调用的阶段、渲染后的参数、
+    输出大小与耗时。非惰性参数中的调用作为外层调用的子节点，
+    惰性参数、模板变量值等在处理函数内部渲染的调用也作为该处理函数的子节点。
+    """
+
+    __slots__ = ("root", "stack", "phase_calls")
+
+    def __init__(self):
+        self.root = TraceNode("<root>")
+        # 正在执行的调用，新渲染的顶层调用挂在栈顶节点下
+        self.stack: list[TraceNode] = [self.root]
+        # 各阶段执行的调用数
+        self.phase_calls: dict[int, int] = {}
+
+    def begin(self, name: str) -> TraceNode:
+        """开始记录一次调用"""
+        node = TraceNode(name)
+        self.stack.append(node)
+        node.elapsed = time.perf_counter()
+        return node
+
+    def end(
+        self,
+        node: TraceNode,
+        phase: int,
+        args: list,
+        output: str,
+        eager_children: list[TraceNode],
+    ) -> None:
+        """结束记录一次调用
+
+        Args:
+            node: begin 返回的节点
+            phase: 调用自身的阶段
+            args: 传入处理函数的参数，惰性参数未被求值时显示为"<未求值>"
+            output: 调用结果
+            eager_children: 非惰性参数中的调用节点
+        """
+        node.elapsed = time.perf_counter() - node.elapsed
+        self.stack.pop()
+        node.args = [_format_arg(arg) for arg in args]
+        node.output_size = len(output)
+        if eager_children:
+            # 参数中的调用先于本调用执行，耗时计入本调用
+            node.children[:0] = eager_children
+            node.elapsed += sum(child.elapsed for child in eager_children)
+            phase = max(phase, max(child.phase for child in eager_children))
+        node.phase = phase
+        self.phase_calls[phase] = self.phase_calls.get(phase, 0) + 1
+
+    def attach(self, nodes: list[TraceNode]) -> None:
+        """将一次渲染的顶层调用挂到当前节点下"""
+        parent = self.stack[-1]
+        parent.children.extend(nodes)
+        if parent is self.root:
+            parent.elapsed += sum(node.elapsed for node in nodes)
+
+    def format_tree(self, max_lines: int = 50) -> str:
+        """以缩进文本显示展开树
+
+        Args:
+            max_lines: 最多显示的行数
+
+        Returns:
+            展开树文本
+        """
+        lines: list[str] = []
+
+        def walk(node: TraceNode, depth: int) -> None:
+            if len(lines) >= max_lines:
+                return
+            args = ", ".join(node.args)
+            lines.append(
+                f"{'  ' * depth}{node.name}({args}) 阶段{node.phase} "
+                f"输出{node.output_size}字 {node.elapsed * 1000:.3f}ms"
+            )
+            for child in node.children:
+                walk(child, depth + 1)
+
+        for child in self.root.children:
+            walk(child, 0)
+        total = self.call_count()
+        if total > len(lines):
+            lines.append(f"……共{total}个调用")
+        return "\n".join(lines)
+
+    def call_count(self) -> int:
+        """记录的调用总数"""
+        return sum(self.phase_calls.values())
+
+    def format_phases(self) -> str:
+        """各阶段的调用数"""
+        return " ".join(
+            f"阶段{phase}: {count}次" for phase, count in sorted(self.phase_calls.items())
+        )
+
+    def to_collapsed(self) -> str:
+        """导出为火焰图工具使用的折叠栈格式，数值为自身耗时（微秒）
+
+        Returns:
+            每行为"调用;子调用;... 耗时"的文本，可直接用于 flamegraph.pl 或 speedscope
+        """
+        lines: list[str] = []
+
+        def walk(node: TraceNode, prefix: str) -> None:
+            path = f"{prefix};{node.name}" if prefix else node.name
+            lines.append(f"{path} {round(node.self_time * 1_000_000)}")
+            for child in node.children:
+                walk(child, path)
+
+        for child in self.root.children:
+            walk(child, "")
+        return "\n".join(lines) + "\n"
+
+    def write_collapsed(self, path: str) -> None:
+        """将折叠栈写入文件
+
+        Args:
+            path: 文件路径
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_collapsed())
+
+
+def _format_arg(arg) -> str:
+    # 惰性参数未被处理函数使用时不强制求值
+    value = getattr(arg, "_value", arg)
+    if value is None:
+        return "<未求值>"
+    return clip(str(value), MAX_TRACE_ARG_LENGTH)
+
+
+def explain_template(
+    parser: "LoreParser", text: str
+) -> tuple[str, RenderTracer]:
+    """在会话状态的副本上试运行模板并记录展开过程
+
+    变量、时间与随机数状态均在副本上修改，存档操作不会写入文件。
+    渲染与处理消息时使用同一渲染过程，同样受单条消息的处理预算限制。
+
+    Args:
+        parser: 会话解析器
+        text: 包含占位符的文本
+
+    Returns:
+        (渲染结果, 追踪器)
+    """
+    sandbox = parser.sandbox()
+    tracer = RenderTracer()
+    sandbox.tracer = tracer
+    # 与处理消息时一样受预算限制
+    if sandbox.budget is not None:
+        sandbox.budget.start()
+    output = sandbox.parse_placeholder(text)
+    return output, tracer
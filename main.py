@@ -1,5 +1,7 @@
+import asyncio
 import os
 import shutil
+import time
 from collections import deque
 
 import yaml  # type: ignore
@@ -12,7 +14,26 @@ from astrbot.core.provider.entities import LLMResponse, ProviderRequest
 from astrbot.core.star.filter.event_message_type import EventMessageType
 
 from .core._types import LoreResult  # type: ignore
-from .core.parser import LoreParser  # type: ignore
+from .core.batch import MatchBatcher  # type: ignore
+from .core.budget import Budget, CircuitBreaker  # type: ignore
+from .core.debug import debug  # type: ignore
+from .core.dice import set_dice_limits  # type: ignore
+from .core.lorebook import Lorebook  # type: ignore
+from .core.metrics import TriggerMetrics  # type: ignore
+from .core.parser import LoreParser, derive_seed  # type: ignore
+from .core.prometheus import (  # type: ignore
+    COMPILE_SECONDS,
+    HOOK_SECONDS,
+    INJECTED_BYTES,
+    PENDING_RESULTS,
+    REGISTRY,
+    SESSIONS,
+)
+from .core.recorder import TraceRecorder  # type: ignore
+from .core.tracer import explain_template  # type: ignore
+
+# 指标文件的写入间隔（秒）
+METRICS_EXPORT_INTERVAL = 15
 
 
 @register("astrbot_plugin_lorebook_lite", "Raven95676", "lorebook插件", "0.1.8")
@@ -26,6 +47,29 @@ class LorePlugin(Star):
         self.lore_sessions: dict[str, LoreParser] = {}
         # 存储每个会话的Lore处理结果
         self.res_map: dict[str, deque[LoreResult]] = {}
+        # 所有会话共享的触发器统计
+        self.metrics = TriggerMetrics(self.config.get("metrics_sample_every", 10))
+        # 所有会话共享的触发器熔断器，阈值为0时关闭
+        cost_threshold = self.config.get("trigger_cost_threshold", 100)
+        self.breaker = (
+            CircuitBreaker(cost_threshold / 1000) if cost_threshold > 0 else None
+        )
+        # Prometheus指标导出任务与端点
+        self._metrics_path = ""
+        self._metrics_task: asyncio.Task | None = None
+        self._metrics_server: asyncio.Server | None = None
+        # 跨会话的批量匹配，配置 batch_matching 时启用
+        self.batcher = (
+            MatchBatcher(
+                self.config.get("batch_max_size", 256),
+                self.config.get("batch_delay", 0) / 1000,
+            )
+            if self.config.get("batch_matching", False)
+            else None
+        )
+        # 消息轨迹记录器，配置 trace_file 时启用
+        trace_file = self.config.get("trace_file", "")
+        self.recorder = TraceRecorder(trace_file) if trace_file else None
         # 备份原始人格配置
         self.persona_bak = {}
         for persona in self.context.provider_manager.personas:
@@ -42,6 +86,12 @@ class LorePlugin(Star):
             self.scan_depth = self.scan_depth * 2
         logger.info(f"lorebook | 扫描深度: {self.scan_depth}")
 
+        # 设置骰子表达式上限
+        set_dice_limits(
+            self.config.get("dice_max_count", 1000),
+            self.config.get("dice_max_faces", 1000000),
+        )
+
         # 创建lorebooks存储目录
         lorebook_path = os.path.join(os.getcwd(), "data", "lorebooks")
         os.makedirs(lorebook_path, exist_ok=True)
@@ -70,14 +120,77 @@ class LorePlugin(Star):
                 "r",
                 encoding="utf-8",
             ) as f:
-                # 使用yaml解析器加载lorebook配置
-                self.lorebook = yaml.safe_load(f)
-                logger.info("lorebook | 已加载lorebook配置")
+                # 使用yaml解析器加载lorebook配置，编译后由所有会话共享
+                data = yaml.safe_load(f)
+            start = time.perf_counter()
+            self.lorebook = Lorebook(data) if data else None
+            COMPILE_SECONDS.set(time.perf_counter() - start)
+            logger.info("lorebook | 已加载lorebook配置")
         except Exception as e:
             # 如果加载失败，记录错误并将lorebook设为None
             logger.error(f"无法加载lorebook配置: {e!s}")
             self.lorebook = None
 
+        # Prometheus指标导出
+        SESSIONS.set_function(lambda: len(self.lore_sessions))
+        PENDING_RESULTS.set_function(
+            lambda: sum(len(results) for results in self.res_map.values())
+        )
+        self._metrics_path = self.config.get("prometheus_file", "")
+        if self._metrics_path:
+            self._metrics_task = asyncio.create_task(self._export_metrics())
+        metrics_port = self.config.get("prometheus_port", 0)
+        if metrics_port:
+            try:
+                self._metrics_server = await REGISTRY.serve(metrics_port)
+                logger.info(f"lorebook | 指标端点: http://127.0.0.1:{metrics_port}/")
+            except OSError as e:
+                logger.error(f"lorebook | 无法启动指标端点: {e!s}")
+
+    async def _export_metrics(self):
+        """定期将指标写入文件"""
+        while True:
+            try:
+                REGISTRY.write(self._metrics_path)
+            except OSError as e:
+                logger.warning(f"lorebook | 写入指标文件失败: {e!s}")
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+
+    async def terminate(self):
+        """停止指标导出"""
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+            try:
+                REGISTRY.write(self._metrics_path)
+            except OSError:
+                pass
+        if self._metrics_server:
+            self._metrics_server.close()
+            self._metrics_server = None
+        if self.recorder:
+            await self.recorder.close()
+
+    def _new_parser(self, session_key: str) -> LoreParser:
+        """按插件配置为会话创建解析器"""
+        master_seed = self.config.get("random_seed", "")
+        seed = derive_seed(master_seed, session_key) if master_seed else None
+        parser = LoreParser(
+            self.lorebook,
+            self.scan_depth,
+            seed=seed,
+            metrics=self.metrics,
+            budget=Budget(
+                self.config.get("message_step_budget", 10000),
+                self.config.get("message_time_budget", 0) / 1000,
+            ),
+            breaker=self.breaker,
+            world_rate=self.config.get("world_time_rate", 0.0),
+        )
+        parser.session = session_key
+        debug(lambda: f"lorebook | {session_key} | 随机数种子: {parser.seed}")
+        return parser
+
     def _get_session_key(self, umo: str, persona_id: str | None) -> str:
         """生成会话隔离的键值"""
         return f"{umo}:{persona_id if persona_id else 'default'}"
@@ -116,13 +229,13 @@ class LorePlugin(Star):
                 if p["name"] == persona_id:
                     p["prompt"] = self.persona_bak[persona_id]["prompt"]
                     break
-            logger.debug(f"lorebook | {umo} | 还原人格 {persona_id}")
+            debug(lambda: f"lorebook | {umo} | 还原人格 {persona_id}")
 
     def _clear_session_results(self, session_key: str):
         """清理会话结果缓存"""
         if session_key in self.res_map:
             self.res_map[session_key].clear()
-            logger.debug(f"lorebook | {session_key} | 清除lorebook缓存")
+            debug(lambda: f"lorebook | {session_key} | 清除lorebook缓存")
 
     @filter.command("reset")
     async def reset(self, event: AstrMessageEvent):
@@ -138,99 +251,225 @@ class LorePlugin(Star):
         self._clear_session_results(session_key)
         await self._restore_persona(umo)
 
-    @filter.event_message_type(EventMessageType.ALL)
-    async def on_message(self, event: AstrMessageEvent):
-        """处理所有消息事件，计算Lore规则匹配结果"""
+    @filter.command_group("lorebook")
+    def lorebook_group(self):
+        """lorebook插件管理"""
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @lorebook_group.command("stats")
+    async def stats(self, event: AstrMessageEvent, action: str = ""):
+        """查看触发器统计，action可为json(导出)或reset(清空)"""
+        match action:
+            case "json":
+                path = os.path.join(os.getcwd(), "data", "lorebook_lite_metrics.json")
+                self.metrics.dump_json(path)
+                yield event.plain_result(f"触发器统计已导出到: {path}")
+            case "reset":
+                self.metrics.reset()
+                yield event.plain_result("触发器统计已清空")
+            case _:
+                yield event.plain_result(self.metrics.summary())
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @lorebook_group.command("explain")
+    async def explain(self, event: AstrMessageEvent):
+        """在当前会话的副本上试运行模板，显示占位符展开过程"""
         if not self.lorebook:
+            yield event.plain_result("未加载lorebook")
+            return
+        # 指令参数按空格切分，直接从原始消息中取出完整模板
+        msg = str(event.get_message_str())
+        text = msg.split("explain", 1)[1].strip() if "explain" in msg else ""
+        if not text:
+            yield event.plain_result("用法: /lorebook explain <模板>")
             return
 
         umo = str(event.unified_msg_origin)
         persona_id, _ = await self._get_curr_persona(umo)
         session_key = self._get_session_key(umo, persona_id)
+        # 会话尚未处理过消息时，按处理消息时的参数创建解析器，只在副本上试运行
+        parser = self.lore_sessions.get(session_key) or self._new_parser(session_key)
+        output, tracer = explain_template(parser, text)
+
+        path = os.path.join(os.getcwd(), "data", "lorebook_lite_explain.folded")
+        tracer.write_collapsed(path)
+        yield event.plain_result(
+            f"结果: {output}\n"
+            f"调用{tracer.call_count()}次，耗时{tracer.root.elapsed * 1000:.3f}ms "
+            f"({tracer.format_phases()})\n"
+            f"{tracer.format_tree()}\n"
+            f"火焰图数据已导出到: {path}"
+        )
 
-        # 为每个会话创建一个独立的解析器
-        if session_key not in self.lore_sessions:
-            self.lore_sessions[session_key] = LoreParser(self.lorebook, self.scan_depth)
-
-        # 设置解析器的基本信息
-        parser = self.lore_sessions[session_key]
-        parser.sender = str(event.get_sender_id())
-        parser.sender_name = str(event.get_sender_name()) or str(event.get_sender_id())
-        parser.session = session_key
+    @filter.event_message_type(EventMessageType.ALL)
+    async def on_message(self, event: AstrMessageEvent):
+        """处理所有消息事件，计算Lore规则匹配结果"""
+        if not self.lorebook:
+            return
 
-        # 处理消息文本
-        msg = str(event.get_message_str())
-        msg_clean = " ".join(msg.split())
-        parser.messages.append(msg_clean)
+        with HOOK_SECONDS.time("on_message"):
+            umo = str(event.unified_msg_origin)
+            persona_id, _ = await self._get_curr_persona(umo)
+            session_key = self._get_session_key(umo, persona_id)
 
-        # 处理聊天内容，获取匹配结果
-        res = parser.process_chat()
+            # 为每个会话创建一个独立的解析器
+            if session_key not in self.lore_sessions:
+                self.lore_sessions[session_key] = self._new_parser(session_key)
 
-        # 初始化结果队列（如果不存在）
-        if session_key not in self.res_map:
-            self.res_map[session_key] = deque()
-        self.res_map[session_key].append(res)
+            parser = self.lore_sessions[session_key]
+            sender = str(event.get_sender_id())
 
-        logger.debug(str(parser))
+            # 处理消息文本
+            msg = str(event.get_message_str())
+            msg_clean = " ".join(msg.split())
+            parser.add_message(msg_clean)
+            if self.recorder:
+                self.recorder.message(session_key, sender, msg_clean)
+
+            # 批量匹配时与其他会话的消息一起扫描
+            window = tuple(parser.messages)
+            candidates = (
+                await self.batcher.candidates(parser.index, window)
+                if self.batcher
+                else None
+            )
+
+            # 设置解析器的基本信息，等待扫描期间同一会话的其他消息可能已修改
+            parser.sender = sender
+            parser.sender_name = str(event.get_sender_name()) or sender
+            parser.session = session_key
+
+            # 处理聊天内容，获取匹配结果
+            res = parser.process_chat(candidates, window)
+
+            # 初始化结果队列（如果不存在）
+            if session_key not in self.res_map:
+                self.res_map[session_key] = deque()
+            self.res_map[session_key].append(res)
+
+            debug(
+                lambda: f"lorebook | {session_key} | "
+                f"{parser.summary()} | {res.summary()}"
+            )
 
     @filter.on_llm_request(priority=1)
     async def on_llm_req(self, event: AstrMessageEvent, request: ProviderRequest):
         """在LLM请求前处理，插入Lore规则匹配结果"""
-        umo = str(event.unified_msg_origin)
-        persona_id, persona = await self._get_curr_persona(umo)
-        session_key = self._get_session_key(umo, persona_id)
-
-        if session_key not in self.res_map:
-            return
-
-        # 获取当前会话的所有处理结果
-        results = list(self.res_map[session_key])
-        logger.debug(f"lorebook | {session_key} | {results}")
-
-        # 合并所有结果中的提示内容
-        sys_start_lines = []
-        user_start_lines = []
-        sys_end_lines = []
-        user_end_lines = []
-
-        for res in results:
-            sys_start_lines.extend(res.sys_start)
-            user_start_lines.extend(res.user_start)
-            sys_end_lines.extend(res.sys_end)
-            user_end_lines.extend(res.user_end)
-
-        sys_start = "\n".join(sys_start_lines)
-        user_start = "\n".join(user_start_lines)
-        sys_end = "\n".join(sys_end_lines)
-        user_end = "\n".join(user_end_lines)
-
-        # 将处理结果插入到LLM请求中
-        if sys_start and persona:
-            persona["prompt"] = f"{sys_start}\n{persona['prompt']}"
-        if user_start:
-            request.prompt = f"{user_start}\n{request.prompt}"
-        if sys_end and persona:
-            persona["prompt"] = f"{persona['prompt']}\n{sys_end}"
-        if user_end:
-            request.prompt = f"{request.prompt}\n{user_end}"
+        with HOOK_SECONDS.time("on_llm_req"):
+            umo = str(event.unified_msg_origin)
+            persona_id, persona = await self._get_curr_persona(umo)
+            session_key = self._get_session_key(umo, persona_id)
+
+            if self.recorder:
+                self.recorder.llm_request(session_key, str(event.get_sender_id()))
+
+            if session_key not in self.res_map:
+                return
+
+            # 获取当前会话的所有处理结果
+            results = list(self.res_map[session_key])
+            debug(
+                lambda: f"lorebook | {session_key} | 注入{len(results)}条结果: "
+                + " / ".join(res.summary() for res in results)
+            )
+
+            # 合并所有结果中的提示内容
+            sys_start_lines = []
+            user_start_lines = []
+            sys_end_lines = []
+            user_end_lines = []
+
+            for res in results:
+                sys_start_lines.extend(res.sys_start)
+                user_start_lines.extend(res.user_start)
+                sys_end_lines.extend(res.sys_end)
+                user_end_lines.extend(res.user_end)
+
+            sys_start = "\n".join(sys_start_lines)
+            user_start = "\n".join(user_start_lines)
+            sys_end = "\n".join(sys_end_lines)
+            user_end = "\n".join(user_end_lines)
+
+            # 记录各位置注入的提示词大小
+            for position, text in (
+                ("sys_start", sys_start),
+                ("user_start", user_start),
+                ("sys_end", sys_end),
+                ("user_end", user_end),
+            ):
+                if text:
+                    INJECTED_BYTES.observe(len(text.encode()), position)
+
+            # 将处理结果插入到LLM请求中
+            if sys_start and persona:
+                persona["prompt"] = f"{sys_start}\n{persona['prompt']}"
+            if user_start:
+                request.prompt = f"{user_start}\n{request.prompt}"
+            if sys_end and persona:
+                persona["prompt"] = f"{persona['prompt']}\n{sys_end}"
+            if user_end:
+                request.prompt = f"{request.prompt}\n{user_end}"
+
+    def _apply_response(
+        self,
+        event: AstrMessageEvent,
+        response: LLMResponse,
+        parser: LoreParser,
+        session_key: str,
+        text: str,
+        candidates: set[int],
+    ):
+        """处理回复触发器，结果插入到回复的开头与结尾"""
+        parser.sender = str(event.get_sender_id())
+        parser.sender_name = str(event.get_sender_name()) or parser.sender
+        parser.session = session_key
+        res = parser.process_response(candidates)
+        res_start = "\n".join(res.res_start)
+        res_end = "\n".join(res.res_end)
+        for position, part in (("res_start", res_start), ("res_end", res_end)):
+            if part:
+                INJECTED_BYTES.observe(len(part.encode()), position)
+        if res_start or res_end:
+            response.completion_text = "\n".join(
+                part for part in (res_start, text, res_end) if part
+            )
+            debug(lambda: f"lorebook | {session_key} | 回复 | {res.summary()}")
 
     @filter.on_llm_response()
     async def on_llm_res(self, event: AstrMessageEvent, response: LLMResponse):
         """在LLM响应后处理"""
-        umo = str(event.unified_msg_origin)
-        persona_id, _ = await self._get_curr_persona(umo)
-        session_key = self._get_session_key(umo, persona_id)
-
-        # 添加Bot回复到消息历史
-        if session_key in self.lore_sessions and self.config.get("include_ai", False):
-            msg = str(response.completion_text)
-            msg_clean = " ".join(msg.split())
-            self.lore_sessions[session_key].messages.append(msg_clean)
-
-        # 重置触发器计数器
-        if session_key in self.lore_sessions:
-            self.lore_sessions[session_key].reset_trigger_count()
-
-        # 清除结果缓存并还原人格
-        self._clear_session_results(session_key)
-        await self._restore_persona(umo)
+        with HOOK_SECONDS.time("on_llm_res"):
+            umo = str(event.unified_msg_origin)
+            persona_id, _ = await self._get_curr_persona(umo)
+            session_key = self._get_session_key(umo, persona_id)
+
+            if self.recorder:
+                self.recorder.llm_response(
+                    session_key,
+                    str(event.get_sender_id()),
+                    str(response.completion_text),
+                )
+
+            parser = self.lore_sessions.get(session_key)
+            if parser is not None:
+                include_ai = self.config.get("include_ai", False)
+                if parser.responds or include_ai:
+                    # 钩子只提供完整的回复，作为一个分段扫描
+                    text = str(response.completion_text)
+                    scanner = parser.scan_response()
+                    scanner.feed(text)
+                    message, candidates = scanner.finish()
+                    if parser.responds:
+                        self._apply_response(
+                            event, response, parser, session_key, text, candidates
+                        )
+                    # 添加Bot回复到消息历史，复用扫描回复得到的消息记录
+                    if include_ai:
+                        parser.add_message(message)
+
+                # 重置触发器计数器
+                parser.reset_trigger_count()
+
+            # 清除结果缓存并还原人格
+            self._clear_session_results(session_key)
+            await self._restore_persona(umo)
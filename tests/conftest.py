@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 以插件根目录作为导入路径，未安装 AstrBot 时使用基准测试的替身模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import setup_path  # noqa: E402
+
+setup_path()
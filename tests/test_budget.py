@@ -0,0 +1,97 @@
+from core.budget import Budget, CircuitBreaker
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+
+def make_parser(triggers: list[dict], budget: Budget) -> LoreParser:
+    parser = LoreParser(Lorebook({"trigger": triggers}), 1, seed=0, budget=budget)
+    parser.sender = parser.sender_name = "user"
+    return parser
+
+
+def test_unmatched_triggers_do_not_spend_budget():
+    # 5000 个未匹配的触发器排在唯一匹配的触发器之前
+    triggers = [
+        {"name": f"T{i}", "match": f"word{i}", "content": f"T{i}", "priority": 1}
+        for i in range(5000)
+    ]
+    triggers.append({"name": "hit", "match": "hello", "content": "hit"})
+    parser = make_parser(triggers, Budget(max_steps=10))
+    parser.add_message("hello")
+    assert parser.process_chat().sys_start == ["hit"]
+
+
+def test_exhausted_budget_skips_remaining_triggers():
+    triggers = [
+        {"name": f"T{i}", "match": "go", "content": f"T{i}", "priority": -i}
+        for i in range(10)
+    ]
+    parser = make_parser(triggers, Budget(max_steps=6))
+    parser.add_message("go")
+    # 每个匹配的触发器在筛选与处理时各计一步，超出预算后剩余的触发器被跳过
+    assert parser.process_chat().sys_start == ["T0", "T1", "T2"]
+    assert parser.budget.exhausted
+
+    # 下一条消息重新计算预算
+    parser.add_message("go")
+    assert parser.process_chat().sys_start == ["T0", "T1", "T2"]
+
+
+def test_exhausted_budget_renders_remaining_placeholders_empty():
+    parser = make_parser([], Budget(max_steps=2))
+    parser.budget.start()
+    text = "{buildin::sender}-{buildin::sender}-{buildin::sender}"
+    assert parser.parse_placeholder(text) == "user-user-"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(0.1, base_backoff=30, max_backoff=60, clock=clock)
+    # 记录次数不足 min_samples 时不熔断
+    for _ in range(4):
+        breaker.record("slow", 1.0)
+    assert breaker.allow("slow")
+    breaker.record("slow", 1.0)
+    assert not breaker.allow("slow")
+    assert breaker.disabled() == ["slow"]
+
+    # 停用到期后重新启用
+    clock.now = 30
+    assert breaker.allow("slow")
+    assert breaker.disabled() == []
+
+    # 仍然很慢时再次停用，停用时长翻倍，不超过上限
+    breaker.record("slow", 1.0)
+    assert not breaker.allow("slow")
+    clock.now = 30 + 59
+    assert not breaker.allow("slow")
+    clock.now = 30 + 60
+    assert breaker.allow("slow")
+
+    # 耗时恢复正常后不再停用
+    for _ in range(50):
+        breaker.record("slow", 0.0)
+    assert breaker.allow("slow")
+
+
+def test_parser_skips_disabled_triggers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(0.1, min_samples=1, clock=clock)
+    triggers = [{"name": "T", "match": "go", "content": "T"}]
+    parser = LoreParser(
+        Lorebook({"trigger": triggers}), 1, seed=0, breaker=breaker
+    )
+    breaker.record("T", 1.0)
+    parser.add_message("go")
+    assert parser.process_chat().sys_start == []
+    clock.now = 30
+    parser.add_message("go")
+    assert parser.process_chat().sys_start == ["T"]
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from core.clock import FrozenClock
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+
+def make_parser(clock: FrozenClock, world_rate: float) -> LoreParser:
+    lorebook = Lorebook({"world_state": {"world_time": "2024-01-01 00:00"}})
+    parser = LoreParser(lorebook, 1, seed=0, clock=clock, world_rate=world_rate)
+    parser.sender = "user"
+    parser.sender_name = "user"
+    return parser
+
+
+def test_world_time_follows_clock():
+    clock = FrozenClock(datetime(2000, 1, 1))
+    parser = make_parser(clock, 60)
+    clock.advance(timedelta(minutes=1))
+    parser.add_message("hello")
+    parser.process_chat()
+    assert parser.parse_placeholder("{buildin::time}") == "2024-01-01 01:00"
+
+
+def test_world_time_static_by_default():
+    clock = FrozenClock(datetime(2000, 1, 1))
+    parser = make_parser(clock, 0)
+    clock.advance(timedelta(hours=5))
+    parser.add_message("hello")
+    parser.process_chat()
+    assert parser.parse_placeholder("{buildin::time}") == "2024-01-01 00:00"
@@ -0,0 +1,59 @@
+import re
+
+import pytest
+
+from core.condition import compile_cond
+
+
+def evaluate(condition: str, **values: str) -> bool:
+    """将 {t::name} 形式的占位符替换为 values 中的值后求值"""
+
+    def render(text: str) -> str:
+        return re.sub(r"\{t::(\w+)\}", lambda m: values[m.group(1)], text)
+
+    return compile_cond(condition).evaluate(render)
+
+
+@pytest.mark.parametrize(
+    "condition, expected",
+    [
+        ("3 <= 3", True),
+        ("4 <= 3", False),
+        ("3 >= 3", True),
+        ("2 >= 3", False),
+        ("2 < 3", True),
+        ("3 > 3", False),
+        ("2 != 3", True),
+    ],
+)
+def test_two_character_operators_before_single(condition, expected):
+    assert compile_cond(condition).evaluate() is expected
+
+
+@pytest.mark.parametrize(
+    "condition, expected",
+    [
+        # ! 只作用于紧随其后的比较
+        ("!1 == 2", True),
+        ("!1 == 1", False),
+        # ! 比 && 结合得更紧：(!0) && 0
+        ("!0 && 0", False),
+        ("!0 && 1", True),
+        # && 比 || 结合得更紧
+        ("1 || 0 && 0", True),
+        ("0 && 1 || 1", True),
+        ("0 || 1 && 0", False),
+        ("1 == 1 && 2 <= 1 || 3 >= 3", True),
+    ],
+)
+def test_logical_precedence(condition, expected):
+    assert compile_cond(condition).evaluate() is expected
+
+
+def test_operators_in_placeholders_do_not_split():
+    # 渲染结果中的运算符不参与切分
+    assert evaluate("{t::a} == {t::b}", a="x&&y", b="x&&y")
+    assert not evaluate("{t::a} == {t::b}", a="x||1", b="x")
+    # 单独作为条件的占位符，渲染结果按条件表达式求值
+    assert evaluate("{t::a}", a="2 >= 1")
+    assert not evaluate("!{t::a}", a="1 <= 2")
@@ -0,0 +1,80 @@
+import random
+import time
+
+import pytest
+
+from core import dice
+from core.dice import dice_distribution
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    """分别使用 numpy 与纯Python实现计算分布"""
+    if request.param == "python":
+        monkeypatch.setattr(dice, "np", None)
+    elif dice.np is None:
+        pytest.skip("未安装 numpy")
+    dice_distribution.cache_clear()
+    yield request.param
+    dice_distribution.cache_clear()
+
+
+@pytest.mark.parametrize("notation", ["1d50r2", "1d200r2", "1d1000r2", "1d100r1"])
+def test_large_exploding_die_fails_fast(backend, notation):
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        dice_distribution(notation)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_exploding_die_distribution(backend):
+    # 1d6r6 的期望为 3.5 / (1 - 1/6) = 4.2
+    distribution = dice_distribution("1d6r6")
+    assert sum(distribution.probs) == pytest.approx(1.0)
+    assert distribution.mean == pytest.approx(4.2)
+    # 6 总是继续累加，不可能作为结果出现
+    assert distribution.prob("==", 6) == pytest.approx(0.0)
+    assert distribution.prob("==", 7) == pytest.approx(1 / 36)
+
+
+@pytest.mark.parametrize(
+    "notation",
+    ["100d6", "100d6k10", "100d20l5", "80d6r5", "70d6t2", "64d20adv", "90d6u4"],
+)
+def test_bulk_rolls_match_python_rolls(monkeypatch, notation):
+    if dice.np is None:
+        pytest.skip("未安装 numpy")
+    plan = dice.compile_dice(notation)
+    bulk = [dice.roll_dice(plan, random.Random(seed)) for seed in range(20)]
+    monkeypatch.setattr(dice, "np", None)
+    plain = [dice.roll_dice(plan, random.Random(seed)) for seed in range(20)]
+    assert bulk == plain
+
+
+@pytest.mark.parametrize(
+    "notation",
+    ["3d6", "20d6+3d8-2d4", "10d10t3", "6d6u4", "4d20b5", "1d6r6", "2d20adv"],
+)
+def test_python_distribution_matches_numpy(monkeypatch, notation):
+    if dice.np is None:
+        pytest.skip("未安装 numpy")
+    dice_distribution.cache_clear()
+    expected = dice_distribution(notation)
+    monkeypatch.setattr(dice, "np", None)
+    dice_distribution.cache_clear()
+    actual = dice_distribution(notation)
+    dice_distribution.cache_clear()
+    assert actual.offset == expected.offset
+    assert actual.probs == pytest.approx(expected.probs, abs=1e-12)
+    assert actual.mean == pytest.approx(expected.mean)
+
+
+@pytest.mark.parametrize("notation", ["1000d6", "100d100", "10d1000", "500d20t5"])
+def test_python_convolution_fails_fast(monkeypatch, notation):
+    monkeypatch.setattr(dice, "np", None)
+    dice_distribution.cache_clear()
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        dice_distribution(notation)
+    dice_distribution.cache_clear()
+    assert time.perf_counter() - start < 1.0
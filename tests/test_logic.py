@@ -0,0 +1,30 @@
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+
+def make_parser(data: dict | None = None) -> LoreParser:
+    parser = LoreParser(Lorebook({"world_state": {"x": 0}, **(data or {})}), 1, seed=0)
+    parser.sender = parser.sender_name = "user"
+    return parser
+
+
+def test_if_skips_branch_not_taken():
+    parser = make_parser()
+    template = "{logic::if(1 == 1, yes, {var::set(x, 1)})}"
+    assert parser.parse_placeholder(template) == "yes"
+    assert parser.parse_placeholder("{var::get(x)}") == "0"
+
+    template = "{logic::if(1 == 2, {var::set(x, 2)}, {var::set(x, 3)})}"
+    assert parser.parse_placeholder(template) == "3"
+    assert parser.parse_placeholder("{var::get(x)}") == "3"
+
+
+def test_and_or_stop_once_decided():
+    parser = make_parser()
+    assert parser.parse_placeholder("{logic::and(0, {var::set(x, 1)})}") == "false"
+    assert parser.parse_placeholder("{logic::or(1, {var::set(x, 2)})}") == "true"
+    assert parser.parse_placeholder("{var::get(x)}") == "0"
+
+    # 结果未确定时继续渲染后续条件
+    assert parser.parse_placeholder("{logic::and(1, {var::set(x, 4)})}") == "true"
+    assert parser.parse_placeholder("{var::get(x)}") == "4"
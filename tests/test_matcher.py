@@ -0,0 +1,136 @@
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+
+def fired(lorebook: Lorebook, *messages: str) -> set[str]:
+    """返回处理消息后触发的触发器名称"""
+    parser = LoreParser(lorebook, len(messages), seed=0)
+    for message in messages:
+        parser.add_message(message)
+    return set(parser.process_chat().sys_start)
+
+
+def keyword_lorebook(*pairs: tuple[str, str], **options) -> Lorebook:
+    """每个触发器的内容为其名称，便于从结果中读出触发的触发器"""
+    return Lorebook(
+        {
+            "trigger": [
+                {"name": name, "match": match, "content": name, **options}
+                for name, match in pairs
+            ]
+        }
+    )
+
+
+def test_overlapping_keywords_of_different_triggers():
+    lorebook = keyword_lorebook(("T1", "a"), ("T2", "ab"))
+    assert fired(lorebook, "abc") == {"T1", "T2"}
+
+    lorebook = keyword_lorebook(("T3", "魔法"), ("T4", "魔法森林"))
+    assert fired(lorebook, "进入魔法森林") == {"T3", "T4"}
+    assert fired(lorebook, "学习魔法") == {"T3"}
+
+
+def test_overlapping_terms_in_logic_expressions():
+    lorebook = keyword_lorebook(("X", "a~bde&a~d"), ("Y", "ab"), ("Z", "bc&cd"))
+    assert fired(lorebook, "b abccc") == {"X", "Y"}
+    assert fired(lorebook, "abcd") == {"Y", "Z"}
+    assert fired(lorebook, "a d") == set()
+
+
+def test_keywords_without_logic():
+    lorebook = keyword_lorebook(("L", "a&b"), ("M", "a"), use_logic=False)
+    assert fired(lorebook, "xa&by") == {"L", "M"}
+    assert fired(lorebook, "a b") == {"M"}
+
+
+def test_invalid_expression_disables_only_its_trigger():
+    lorebook = keyword_lorebook(("BAD", "~a,b"), ("OK", "b"))
+    assert fired(lorebook, "ab") == {"OK"}
+
+
+def test_listener_fires_only_with_messages():
+    lorebook = Lorebook(
+        {"trigger": [{"name": "L", "type": "listener", "content": "L"}]}
+    )
+    assert fired(lorebook, "anything") == {"L"}
+    assert fired(lorebook) == set()
+
+
+def scan_reply(parser: LoreParser, *chunks: str):
+    """分段扫描一条回复，返回(回复的消息记录, 回复结果)"""
+    scanner = parser.scan_response()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    message, candidates = scanner.finish()
+    return message, parser.process_response(candidates)
+
+
+def test_response_triggers_match_across_chunks():
+    lorebook = Lorebook(
+        {
+            "trigger": [
+                {
+                    "name": "R",
+                    "match": "dragon~peace",
+                    "position": "res_end",
+                    "content": "R",
+                },
+                {
+                    "name": "S",
+                    "type": "listener",
+                    "position": "res_start",
+                    "content": "S",
+                },
+                {"name": "M", "match": "dragon", "content": "M"},
+            ]
+        }
+    )
+    assert lorebook.responds
+    parser = LoreParser(lorebook, 2, seed=0)
+    message, result = scan_reply(parser, "A drag", "on   appears\n", "  here ")
+    assert message.text == "A dragon appears here"
+    assert (result.res_start, result.res_end) == (["S"], ["R"])
+
+    # 回复作为消息加入窗口时复用扫描结果
+    parser.add_message(message)
+    assert parser.process_chat().sys_start == ["M"]
+
+    _, result = scan_reply(parser, "dragon and peace")
+    assert result.res_end == []
+
+
+def test_lorebook_without_response_triggers_skips_replies():
+    lorebook = keyword_lorebook(("T", "a"))
+    assert not lorebook.responds
+    parser = LoreParser(lorebook, 1, seed=0)
+    message, result = scan_reply(parser, "a")
+    assert message.candidates == {0}
+    assert result == type(result)()
+
+
+def test_cross_phase_actions_are_skipped():
+    lorebook = Lorebook(
+        {
+            "trigger": [
+                {"name": "M", "match": "a", "content": "M", "actions": ["R"]},
+                {"name": "R", "position": "res_end", "content": "R"},
+            ]
+        }
+    )
+    parser = LoreParser(lorebook, 1, seed=0)
+    parser.add_message("a")
+    result = parser.process_chat()
+    assert result.sys_start == ["M"]
+    assert result.res_end == []
+
+
+def test_stale_batched_candidates_are_rescanned():
+    lorebook = keyword_lorebook(("A", "apple"), ("B", "banana"))
+    parser = LoreParser(lorebook, 1, seed=0)
+    parser.add_message("apple")
+    window = tuple(parser.messages)
+    (candidates,) = lorebook.index.candidates_batch([window])
+    # 等待批量扫描期间同一会话又收到了新消息
+    parser.add_message("banana")
+    assert set(parser.process_chat(candidates, window).sys_start) == {"B"}
@@ -0,0 +1,64 @@
+from core.lorebook import Lorebook
+from core.metrics import TriggerMetrics
+from core.parser import LoreParser
+
+LOREBOOK = {
+    "trigger": [
+        {"name": "A", "match": "a", "content": "A"},
+        {"name": "B", "match": "a", "content": "B", "probability": 0},
+        {"name": "C", "match": "a", "content": "C", "conditional": "1 == 2"},
+        {"name": "D", "match": "zzz", "content": "D"},
+        {"name": "E", "match": "a", "content": "E", "max_trig": 1},
+    ]
+}
+
+
+def run(metrics: TriggerMetrics, count: int) -> None:
+    parser = LoreParser(Lorebook(LOREBOOK), 1, seed=0, metrics=metrics)
+    for _ in range(count):
+        parser.add_message("a")
+        parser.process_chat()
+
+
+def test_sampling_counts_every_nth_message():
+    metrics = TriggerMetrics(3)
+    assert [metrics.sample() for _ in range(6)] == [False, False, True] * 2
+    assert (metrics.messages, metrics.sampled_messages) == (6, 2)
+
+    metrics = TriggerMetrics(0)
+    assert not any(metrics.sample() for _ in range(3))
+    assert metrics.messages == 0
+    assert metrics.summary() == "触发器统计未开启"
+
+
+def test_counters_for_each_stage():
+    metrics = TriggerMetrics(1)
+    run(metrics, 2)
+    stats = metrics.stats
+    a = stats["A"]
+    assert (a.evaluations, a.match_hits, a.fires) == (2, 2, 2)
+    assert a.injected_bytes == {"sys_start": 2}
+    assert (stats["B"].probability_skips, stats["B"].fires) == (2, 0)
+    assert (stats["C"].condition_rejects, stats["C"].fires) == (2, 0)
+    # 未匹配的触发器不产生单独的统计
+    assert "D" not in stats
+    assert stats["E"].fires == 1
+    assert metrics.stages == {
+        "max_trig": 1,
+        "match": 2,
+        "probability": 2,
+        "condition": 2,
+        "passed": 3,
+    }
+
+
+def test_unsampled_messages_are_not_counted():
+    metrics = TriggerMetrics(2)
+    run(metrics, 4)
+    assert (metrics.messages, metrics.sampled_messages) == (4, 2)
+    assert metrics.stats["A"].fires == 2
+    assert metrics.stages["match"] == 2
+
+    metrics.reset()
+    assert metrics.stats == {} and metrics.messages == 0
+    assert set(metrics.stages.values()) == {0}
@@ -0,0 +1,58 @@
+import pytest
+
+from core import normalize
+from core.lorebook import Lorebook
+from core.normalize import Message, fold
+from core.parser import LoreParser
+
+
+def fired(lorebook: Lorebook, text: str) -> set[str]:
+    parser = LoreParser(lorebook, 1, seed=0)
+    parser.add_message(text)
+    return set(parser.process_chat().sys_start)
+
+
+def form_lorebook(match: str) -> Lorebook:
+    return Lorebook(
+        {
+            "trigger": [
+                {"name": form, "match": match, "content": form, "match_on": form}
+                for form in normalize.MATCH_FORMS
+            ]
+        }
+    )
+
+
+@pytest.fixture
+def t2s(monkeypatch):
+    """替代 opencc 的繁转简，只转换测试用到的字"""
+    monkeypatch.setattr(normalize, "_t2s", lambda text: text.replace("龍", "龙"))
+
+
+def test_fold():
+    assert fold("ＨＥＬＬＯ　Ｗｏｒｌｄ１２３") == "hello world123"
+    assert fold("ｶﾀｶﾅ") == "カタカナ"
+    assert fold("Straße") == "strasse"
+
+
+def test_message_record():
+    message = Message.create("ＡＢＣ")
+    assert (message.text, message.folded, message.simplified) == ("ＡＢＣ", "abc", None)
+    assert message.form("text") == "ＡＢＣ"
+    # 未计算繁转简形式时按折叠形式匹配
+    assert message.form("simplified") == "abc"
+
+
+def test_match_on_forms(t2s):
+    lorebook = form_lorebook("Dragon")
+    assert fired(lorebook, "a Dragon") == {"text", "fold", "simplified"}
+    assert fired(lorebook, "a dragon") == {"fold", "simplified"}
+    assert fired(lorebook, "ａ ＤＲＡＧＯＮ") == {"fold", "simplified"}
+
+
+def test_match_on_simplified(t2s):
+    lorebook = form_lorebook("龙")
+    assert fired(lorebook, "龍") == {"simplified"}
+    assert fired(lorebook, "龙") == {"text", "fold", "simplified"}
+    # 关键词本身也按触发器的匹配形式转换
+    assert fired(form_lorebook("龍"), "龙") == {"simplified"}
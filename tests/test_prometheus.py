@@ -0,0 +1,63 @@
+import asyncio
+
+from core.prometheus import MetricsRegistry
+
+
+def test_histogram_text_format():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("t_seconds", "耗时", ("hook",), buckets=(0.1, 1))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(2, "a")
+    assert registry.render() == (
+        "# HELP t_seconds 耗时\n"
+        "# TYPE t_seconds histogram\n"
+        't_seconds_bucket{hook="a",le="0.1"} 1\n'
+        't_seconds_bucket{hook="a",le="1"} 2\n'
+        't_seconds_bucket{hook="a",le="+Inf"} 3\n'
+        't_seconds_sum{hook="a"} 2.55\n'
+        't_seconds_count{hook="a"} 3\n'
+    )
+
+
+def test_gauge_text_format():
+    registry = MetricsRegistry()
+    registry.gauge("sessions", "会话数").set_function(lambda: 3)
+    labelled = registry.gauge("size", "大小", ("name",))
+    labelled.set(1.5, 'a"b\\c\nd')
+    assert registry.render() == (
+        "# HELP sessions 会话数\n"
+        "# TYPE sessions gauge\n"
+        "sessions 3\n"
+        "# HELP size 大小\n"
+        "# TYPE size gauge\n"
+        'size{name="a\\"b\\\\c\\nd"} 1.5\n'
+    )
+
+
+def test_write_and_serve(tmp_path):
+    registry = MetricsRegistry()
+    registry.gauge("up", "运行中").set(1)
+    path = tmp_path / "metrics.prom"
+    registry.write(str(path))
+    assert path.read_text(encoding="utf-8") == registry.render()
+
+    async def fetch() -> bytes:
+        server = await registry.serve(0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    response = asyncio.run(fetch())
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"text/plain; version=0.0.4" in head
+    assert body.decode() == registry.render()
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from core.clock import FrozenClock
+from core.lorebook import Lorebook
+from core.metrics import TriggerMetrics
+from core.parser import LoreParser
+
+
+def make_parser(trigger: dict, **kwargs) -> LoreParser:
+    lorebook = Lorebook(
+        {
+            "world_state": {"hp": 10, "gold": 0, "world_time": "2024-01-01 00:00"},
+            "trigger": [{"name": "L", "type": "listener", "content": "L", **trigger}],
+        }
+    )
+    parser = LoreParser(lorebook, 1, seed=0, metrics=TriggerMetrics(1), **kwargs)
+    parser.sender = parser.sender_name = "user"
+    return parser
+
+
+def chat(parser: LoreParser) -> list[str]:
+    parser.add_message("msg")
+    return parser.process_chat().sys_start
+
+
+def hits(parser: LoreParser) -> int:
+    return parser.metrics.stats["L"].condition_hits
+
+
+def test_condition_reevaluated_only_when_inputs_change():
+    parser = make_parser({"conditional": "{var::get(hp)} < 5"})
+    assert chat(parser) == []
+    assert hits(parser) == 0
+    assert chat(parser) == []
+    assert hits(parser) == 1
+
+    # 写入无关变量不影响缓存
+    parser.parse_placeholder("{var::set(gold, 3)}")
+    chat(parser)
+    assert hits(parser) == 2
+
+    parser.parse_placeholder("{var::set(hp, 1)}")
+    assert chat(parser) == ["L"]
+    assert hits(parser) == 2
+
+
+def test_time_dependent_condition_follows_world_time():
+    clock = FrozenClock(datetime(2000, 1, 1))
+    parser = make_parser(
+        {"conditional": "{buildin::time(hour)} == 01"}, clock=clock, world_rate=60
+    )
+    assert chat(parser) == []
+    assert chat(parser) == []
+    assert hits(parser) == 1
+
+    clock.advance(timedelta(minutes=1))
+    assert chat(parser) == ["L"]
+    assert hits(parser) == 1
+
+
+def test_impure_condition_is_never_cached():
+    parser = make_parser({"conditional": "{buildin::random(1,2)} > 0"})
+    for _ in range(3):
+        assert chat(parser) == ["L"]
+    assert hits(parser) == 0
+    assert parser._lorebook.triggers[0].cond_reads is None
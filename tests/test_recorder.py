@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+from core import recorder
+from core.recorder import TraceRecorder, read_trace
+
+
+def test_writes_off_the_event_loop_in_order(tmp_path, monkeypatch):
+    path = str(tmp_path / "trace.jsonl.gz")
+    trace = TraceRecorder(path)
+    writers: set[int] = set()
+    write = TraceRecorder._write
+
+    def tracked_write(self, lines):
+        writers.add(threading.get_ident())
+        write(self, lines)
+
+    monkeypatch.setattr(TraceRecorder, "_write", tracked_write)
+
+    async def run():
+        for i in range(recorder.FLUSH_EVERY * 3 + 5):
+            trace.message("session", "user", str(i))
+        await trace.close()
+
+    asyncio.run(run())
+    assert threading.get_ident() not in writers
+    texts = [event["text"] for event in read_trace(path)]
+    assert texts == [str(i) for i in range(recorder.FLUSH_EVERY * 3 + 5)]
@@ -0,0 +1,12 @@
+from core.registry import register_function, unregister_function
+from core.template import compile_template
+
+
+def test_unregister_clears_compiled_templates():
+    register_function("test", "hello", lambda parser, call, args: "hi")
+    try:
+        template = compile_template("{test::hello}")
+        assert compile_template("{test::hello}") is template
+    finally:
+        unregister_function("test", "hello")
+    assert compile_template("{test::hello}") is not template
@@ -0,0 +1,43 @@
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+LOREBOOK = {
+    "world_state": {"hp": 10, "status": "HP {var::get(hp)}"},
+    "trigger": [
+        {"name": "look", "match": "look", "content": "{var::get(status)}"},
+        {"name": "roll", "match": "roll", "content": "{buildin::random(1,1000000)}"},
+    ],
+}
+
+
+def make_parser() -> LoreParser:
+    parser = LoreParser(Lorebook(LOREBOOK), 1, seed=0)
+    parser.sender = parser.sender_name = "user"
+    return parser
+
+
+def chat(parser: LoreParser, text: str) -> list[str]:
+    parser.add_message(text)
+    return parser.process_chat().sys_start
+
+
+def test_pure_render_is_cached_until_a_read_variable_changes():
+    parser = make_parser()
+    assert chat(parser, "look") == ["HP 10"]
+    assert len(parser._render_cache) == 1
+    assert chat(parser, "look") == ["HP 10"]
+
+    # status 间接读取 hp，写入 hp 后重新渲染
+    parser.parse_placeholder("{var::set(hp, 5)}")
+    assert chat(parser, "look") == ["HP 5"]
+
+    # 覆盖 status 本身同样使缓存失效
+    parser.parse_placeholder("{var::set(status, 满血)}")
+    assert chat(parser, "look") == ["满血"]
+
+
+def test_impure_render_is_not_cached():
+    parser = make_parser()
+    outputs = {chat(parser, "roll")[0] for _ in range(5)}
+    assert len(outputs) > 1
+    assert not parser._render_cache
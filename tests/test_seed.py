@@ -0,0 +1,62 @@
+from dataclasses import asdict
+
+import pytest
+
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+ROLLS = "{buildin::random(1d1000000)}"
+LOREBOOK = {
+    "trigger": [
+        {"name": "roll", "match": "roll", "content": ROLLS, "probability": 0.7},
+        {"name": "pick", "match": "pick", "content": "{buildin::random(a,b,c,d)}"},
+    ]
+}
+TRANSCRIPT = ["roll", "pick", "roll pick", "roll", "pick", "roll"] * 5
+
+
+@pytest.fixture(autouse=True)
+def saves_dir(tmp_path, monkeypatch):
+    """存档写入临时目录"""
+    monkeypatch.chdir(tmp_path)
+
+
+def make_parser(seed: int) -> LoreParser:
+    parser = LoreParser(Lorebook(LOREBOOK), 1, seed=seed)
+    parser.sender = parser.sender_name = "user"
+    parser.session = "session"
+    return parser
+
+
+def run(parser: LoreParser) -> list[dict]:
+    outputs = []
+    for text in TRANSCRIPT:
+        parser.add_message(text)
+        outputs.append(asdict(parser.process_chat()))
+        parser.reset_trigger_count()
+    return outputs
+
+
+def test_same_seed_gives_same_transcript():
+    assert run(make_parser(7)) == run(make_parser(7))
+    assert run(make_parser(7)) != run(make_parser(8))
+
+
+def test_loading_does_not_replay_rolls():
+    parser = make_parser(7)
+    parser.parse_placeholder("{buildin::save(world)}")
+    parser.parse_placeholder("{buildin::load(world)}")
+    first = parser.parse_placeholder(ROLLS)
+    parser.parse_placeholder("{buildin::load(world)}")
+    assert parser.parse_placeholder(ROLLS) != first
+    # 随机数状态不写入世界变量
+    assert "__rng__" not in parser._vars["world"]
+
+
+def test_replay_from_saved_seed():
+    parser = make_parser(1234)
+    outputs = run(parser)
+    parser.parse_placeholder("{buildin::save(world)}")
+    seed = make_parser(0)._save_handler.load_seed()
+    assert seed == 1234
+    assert run(make_parser(seed)) == outputs
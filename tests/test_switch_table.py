@@ -0,0 +1,53 @@
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+
+TABLES = {
+    "weather": {"sunny": "晴", "rain": "雨，{var::set(wet, 1)}"},
+}
+
+
+def make_parser() -> LoreParser:
+    parser = LoreParser(
+        Lorebook({"tables": TABLES, "world_state": {"wet": 0}}), 1, seed=0
+    )
+    parser.sender = parser.sender_name = "user"
+    return parser
+
+
+def test_switch_selects_matching_case():
+    parser = make_parser()
+    template = "{logic::switch(%s, a, A, b, B, other)}"
+    assert parser.parse_placeholder(template % "a") == "A"
+    assert parser.parse_placeholder(template % "b") == "B"
+    assert parser.parse_placeholder(template % "c") == "other"
+    # 没有默认值时返回空文本
+    assert parser.parse_placeholder("{logic::switch(c, a, A, b, B)}") == ""
+
+
+def test_switch_with_dynamic_cases():
+    parser = make_parser()
+    template = "{logic::switch(0, {var::get(wet)}, dry, 1, wet)}"
+    assert parser.parse_placeholder(template) == "dry"
+
+
+def test_switch_renders_only_selected_output():
+    parser = make_parser()
+    template = "{logic::switch(a, a, A, b, {var::set(wet, 1)})}"
+    assert parser.parse_placeholder(template) == "A"
+    assert parser.parse_placeholder("{var::get(wet)}") == "0"
+
+
+def test_table_lookup():
+    parser = make_parser()
+    assert parser.parse_placeholder("{table::weather(sunny)}") == "晴"
+    assert parser.parse_placeholder("{table::weather(snow, 未知)}") == "未知"
+    assert parser.parse_placeholder("{table::weather(snow)}") == ""
+    assert parser.parse_placeholder("{table::season(spring)}") == "未知查找表"
+
+
+def test_table_renders_only_selected_entry():
+    parser = make_parser()
+    parser.parse_placeholder("{table::weather(sunny)}")
+    assert parser.parse_placeholder("{var::get(wet)}") == "0"
+    assert parser.parse_placeholder("{table::weather(rain)}") == "雨，1"
+    assert parser.parse_placeholder("{var::get(wet)}") == "1"
@@ -0,0 +1,41 @@
+from core.budget import Budget
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+from core.tracer import explain_template
+
+TEMPLATE = "{var::set(x, 1)}{var::get(x)}{var::get(x)}{var::get(x)}"
+
+
+def make_parser(budget: Budget | None = None) -> LoreParser:
+    parser = LoreParser(
+        Lorebook({"world_state": {"x": 0}}), 1, seed=0, budget=budget
+    )
+    parser.sender = "user"
+    parser.sender_name = "user"
+    return parser
+
+
+def test_traced_render_matches_untraced():
+    parser = make_parser()
+    output, tracer = explain_template(parser, TEMPLATE)
+    assert output == make_parser().parse_placeholder(TEMPLATE)
+    assert len(tracer.root.children) == 4
+
+
+def test_explain_runs_on_a_copy():
+    parser = make_parser()
+    output, _ = explain_template(parser, TEMPLATE)
+    assert output == "1111"
+    # 试运行中的 var::set 不影响会话本身
+    assert parser.parse_placeholder("{var::get(x)}") == "0"
+
+
+def test_traced_render_respects_budget():
+    budget = Budget(max_steps=2)
+    output, tracer = explain_template(make_parser(budget), TEMPLATE)
+    budget = Budget(max_steps=2)
+    budget.start()
+    assert output == make_parser(budget).parse_placeholder(TEMPLATE)
+    assert output != make_parser().parse_placeholder(TEMPLATE)
+    # 超出预算的调用同样记录在展开树中
+    assert len(tracer.root.children) == 4
@@ -0,0 +1,78 @@
+from core._types import TemplateValue, flag_value
+from core.handlers.var_handler import VarRef, _parse_ref
+from core.lorebook import Lorebook
+from core.parser import LoreParser
+from core.template import compile_template
+
+
+def make_parser() -> LoreParser:
+    lorebook = Lorebook({"world_state": {"base": 2, "x": "{var::get(base)}"}})
+    parser = LoreParser(lorebook, 1, seed=0)
+    parser.sender = "user"
+    parser.sender_name = "user"
+    return parser
+
+
+def test_inc_renders_template_value():
+    parser = make_parser()
+    assert parser.parse_placeholder("{var::get(x)}") == "2"
+    assert parser.parse_placeholder("{var::inc(x)}") == "3"
+    assert parser.parse_placeholder("{var::inc(x, 2)}") == "5"
+    # 自增后保存为数字，不再跟随模板
+    assert parser.parse_placeholder("{var::set(base, 10)}{var::get(x)}") == "105"
+
+
+def test_values_are_flagged_on_write():
+    assert flag_value("plain") == "plain"
+    assert flag_value("{not a placeholder}") == "{not a placeholder}"
+    assert flag_value(3) == 3
+    assert type(flag_value("{var::get(base)}")) is TemplateValue
+
+    parser = make_parser()
+    world = parser._vars["world"]
+    assert world["base"] == 2
+    assert type(world["x"]) is TemplateValue
+    # 写入的值是参数渲染后的结果，按普通值保存，读取时不再渲染
+    parser.parse_placeholder("{var::set(y, {var::get(x)})}")
+    assert world["y"] == 2
+    parser.parse_placeholder("{var::set(base, 10)}")
+    assert parser.parse_placeholder("{var::get(y)}") == "2"
+    assert parser.parse_placeholder("{var::get(x)}") == "10"
+
+
+def test_constant_refs_are_resolved_at_compile_time():
+    assert _parse_ref(compile_template("world.hp")) == VarRef("world", "hp")
+    assert _parse_ref(compile_template("hp")) == VarRef(None, "hp")
+    assert _parse_ref(compile_template("5")) == 5
+    assert _parse_ref(compile_template("{var::get(name)}")) is None
+
+
+def test_condition_cache_follows_template_values():
+    lorebook = Lorebook(
+        {
+            "world_state": {
+                "hp": 3,
+                "status": "{logic::if({var::get(hp)} > 0, alive, dead)}",
+            },
+            "trigger": [
+                {
+                    "name": "alive",
+                    "match": "look",
+                    "conditional": "{var::get(status)} == alive",
+                    "content": "alive",
+                }
+            ],
+        }
+    )
+    parser = LoreParser(lorebook, 1, seed=0)
+    parser.sender = parser.sender_name = "user"
+    parser.add_message("look")
+    assert parser.process_chat().sys_start == ["alive"]
+    # 条件经由 status 的模板间接读取 hp，hp 的反向索引指向该条件
+    assert ("world", "hp") in parser._conditions._dependents
+    assert len(parser._conditions) == 1
+
+    parser.parse_placeholder("{var::set(hp, 0)}")
+    assert len(parser._conditions) == 0
+    parser.add_message("look")
+    assert parser.process_chat().sys_start == []